@@ -0,0 +1,29 @@
+"""
+Traffic shape and latency helpers shared by core-api's and the worker's benchmarks
+(core-api/benchmarks/load_test.py, worker/benchmarks/stream_throughput.py).
+
+The services are built and mounted separately, so this directory is mounted at /benchmarks in both
+containers (docker-compose.yml): /app/benchmarks/../../benchmarks there, ../benchmarks from a checkout.
+"""
+import bisect
+import random
+
+
+class Zipf:
+    """Ranks 0..n-1 drawn with probability proportional to 1 / (rank + 1) ** s."""
+
+    def __init__(self, n: int, s: float):
+        total = 0.0
+        self.cumulative = []
+        for rank in range(n):
+            total += 1 / (rank + 1) ** s
+            self.cumulative.append(total)
+
+    def sample(self, rng: random.Random) -> int:
+        return bisect.bisect_left(self.cumulative, rng.random() * self.cumulative[-1])
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
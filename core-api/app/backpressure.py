@@ -0,0 +1,114 @@
+import asyncio
+import random
+from .config import settings, logger
+from .database import redis_client
+from .breaker import RedisUnavailable, redis_guard
+from . import keys
+
+
+class ClickBackpressure:
+    """
+    Watches the analytics consumer lag and degrades click tracking when the worker falls behind.
+
+    Normal mode:   every click is one XADD.
+    Degraded mode: clicks are buffered per link in memory (or sampled) and sent later
+                   as weighted events ("w" field), so Redis stops growing while the worker catches up.
+    """
+
+    def __init__(self):
+        self.lag = 0
+        self.degraded = False
+        # short_id -> [click_count, last event (ip and raw headers)]
+        self._buffer: dict[str, list] = {}
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stops the lag monitor and flushes whatever is still buffered."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.check_lag()
+                # Buffered clicks wait while Redis sheds load: a failed flush would lose them
+                if not self.degraded and self._buffer and redis_guard.admits_clicks():
+                    await self.flush()
+            except RedisUnavailable:
+                pass
+            await asyncio.sleep(settings.BACKPRESSURE_CHECK_INTERVAL_SECONDS)
+
+    async def check_lag(self):
+        # Summed over the stream's shards (STREAM_SHARDS)
+        lag = 0
+        for stream_name in keys.streams(settings.ANALYTICS_STREAM_NAME):
+            shard_lag = await redis_client.get_consumer_lag(stream_name, settings.ANALYTICS_CONSUMER_GROUP)
+            if shard_lag is None:
+                return
+            lag += shard_lag
+        self.lag = lag
+
+        # Hysteresis: switch off only once the lag is well below the threshold
+        if not self.degraded and lag > settings.BACKPRESSURE_LAG_THRESHOLD:
+            self.degraded = True
+            logger.warning(f"Analytics lag {lag} > {settings.BACKPRESSURE_LAG_THRESHOLD}: "
+                           f"click tracking switched to '{settings.BACKPRESSURE_MODE}' mode.")
+        elif self.degraded and lag < settings.BACKPRESSURE_RESUME_LAG:
+            self.degraded = False
+            logger.info(f"Analytics lag {lag} recovered: click tracking back to normal.")
+
+    def absorb(self, event_data: dict) -> dict | None:
+        """
+        Handles a click while degraded.
+        Returns a (weighted) event to send now, or None if it was buffered or dropped.
+        """
+        short_id = event_data["short_id"]
+
+        if settings.BACKPRESSURE_MODE == "buffer":
+            entry = self._buffer.get(short_id)
+            if entry is not None:
+                entry[0] += 1
+                entry[1] = event_data
+                return None
+            if len(self._buffer) < settings.CLICK_BUFFER_MAX_LINKS:
+                self._buffer[short_id] = [1, event_data]
+                return None
+            # Buffer full: fall through to sampling
+
+        if random.random() >= settings.BACKPRESSURE_SAMPLE_RATE:
+            return None
+        weighted = dict(event_data)
+        weighted["w"] = str(round(1 / settings.BACKPRESSURE_SAMPLE_RATE))
+        return weighted
+
+    async def flush(self):
+        """
+        Sends buffered clicks as one weighted event per link (pipelined).
+        The last click's IP and headers stand for the whole aggregate.
+        """
+        if not self._buffer:
+            return
+        buffered, self._buffer = self._buffer, {}
+
+        by_stream: dict[str, list] = {}
+        for short_id, (count, last_event) in buffered.items():
+            event = dict(last_event)
+            event["w"] = str(count)
+            by_stream.setdefault(keys.stream(settings.ANALYTICS_STREAM_NAME, short_id), []).append(event)
+
+        for stream_name, events in by_stream.items():
+            await redis_client.add_stream_events(stream_name, events, maxlen=settings.ANALYTICS_STREAM_MAXLEN)
+        logger.info(f"Flushed {len(buffered)} buffered click aggregates.")
+
+
+click_backpressure = ClickBackpressure()
@@ -0,0 +1,74 @@
+"""
+The Bloom filter of existing short_ids (BLOOM_FILTER_KEY), checked before every link lookup.
+With BLOOM_SHARDS > 1 it is split into one filter per shard (keys.bloom_filter) sharing BLOOM_CAPACITY.
+
+New IDs are inserted with the link itself (same MULTI, or same pipeline on a cluster),
+so a link never 404s on the filter.
+The worker rebuilds the filter from the live links (python -m app.bloom rebuild in the worker):
+while it does, the filter being built exists under the ":next" suffix and new IDs go into it too.
+"""
+import redis.asyncio as redis
+from redis.exceptions import ResponseError
+from .config import settings, logger
+from . import keys
+
+# Must match the worker (worker/app/bloom.py)
+REBUILD_TARGET_SUFFIX = ":next"
+
+
+def shard_capacity() -> int:
+    return -(-settings.BLOOM_CAPACITY // settings.BLOOM_SHARDS)
+
+
+def queue_add(pipe, short_id: str):
+    """
+    Adds the two inserts to a pipeline; they must be its last two commands.
+    The second fails (NOCREATE) unless a rebuild is running, and that error is expected.
+    """
+    key = keys.bloom_filter(short_id)
+    # Created with the configured sizing if it doesn't exist yet
+    pipe.execute_command(
+        "BF.INSERT", key,
+        "CAPACITY", shard_capacity(), "ERROR", settings.BLOOM_ERROR_RATE,
+        "EXPANSION", settings.BLOOM_EXPANSION,
+        "ITEMS", short_id
+    )
+    pipe.execute_command("BF.INSERT", f"{key}{REBUILD_TARGET_SUFFIX}", "NOCREATE", "ITEMS", short_id)
+
+
+async def ensure_bloom_filter(db: redis.Redis):
+    """
+    Startup: reserves the filter (BF.RESERVE) with the configured capacity, error rate and expansion.
+    An existing filter is kept; if it was sized differently or has outgrown its capacity, a warning
+    says to rebuild it (each expansion adds a sub-filter, and the false positive rate compounds).
+    """
+    for key in keys.bloom_filters():
+        await _ensure_filter(db, key)
+
+
+async def _ensure_filter(db: redis.Redis, key: str):
+    try:
+        await db.bf().create(key, settings.BLOOM_ERROR_RATE, shard_capacity(),
+                             expansion=settings.BLOOM_EXPANSION)
+        logger.info(f"Bloom filter '{key}' reserved: capacity {shard_capacity()}, "
+                    f"error rate {settings.BLOOM_ERROR_RATE}, expansion {settings.BLOOM_EXPANSION}.")
+        return
+    except ResponseError as e:
+        if "exists" not in str(e).lower():
+            logger.error(f"Could not reserve Bloom filter '{key}': {e}")
+            return
+
+    try:
+        info = await db.bf().info(key)
+    except Exception as e:
+        logger.warning(f"Could not read Bloom filter '{key}' info: {e}")
+        return
+
+    if info.insertedNum > info.capacity or info.filterNum > 1:
+        logger.warning(
+            f"Bloom filter '{key}' holds {info.insertedNum} items in {info.filterNum} sub-filters "
+            f"(capacity {info.capacity}): rebuild it with the worker's 'python -m app.bloom rebuild'."
+        )
+    elif info.capacity != shard_capacity():
+        logger.info(f"Bloom filter '{key}' has capacity {info.capacity}, not {shard_capacity()}: "
+                    f"the next rebuild applies the new sizing.")
@@ -0,0 +1,174 @@
+"""
+Load shedding in front of the Redis primary (REDIS_BREAKER_* / REDIS_LIMIT_* settings), per process.
+
+- Adaptive concurrency limit (AIMD): at most `limit` commands and pipelines in flight. One that completes
+  within REDIS_LATENCY_TARGET_MS while the limit is in use raises it by 1/limit (about +1 per round trip);
+  a slower one, a timeout or a connection error multiplies it by REDIS_LIMIT_BACKOFF, at most once per
+  round trip. Beyond the limit a command fails at once (RedisUnavailable) instead of queueing behind Redis.
+- Circuit breaker: REDIS_BREAKER_FAILURES timeouts or connection errors in a row open it. While open every
+  command, and reconnecting (RedisClient.get_client), fails at once for REDIS_BREAKER_OPEN_SECONDS; then a
+  single probe goes through (half-open): its success closes the breaker, its failure opens it again.
+  Error replies (WRONGTYPE, no such key...) come from a healthy Redis and count as successes.
+
+What that means per endpoint: redirects are answered from the hot link cache and the snapshot, clicks are
+dropped, the rest answers 503 with Retry-After (main.py). Clicks give way first under load too: they are
+only sent while less than REDIS_LIMIT_CLICK_SHARE of the limit is in use.
+"""
+import asyncio
+import math
+import time
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+from .config import settings, logger
+from . import metrics
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+# Gauge values (core_api_redis_breaker_state)
+STATES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class RedisUnavailable(Exception):
+    """Redis wasn't asked: the breaker is open, the concurrency limit is reached or it can't be reached."""
+
+    def __init__(self, message: str, retry_after: float = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_failure(error: BaseException) -> bool:
+    """Whether an error says Redis is unhealthy (no answer in time, no connection), not just the command."""
+    return isinstance(error, (RedisConnectionError, RedisTimeoutError, OSError))
+
+
+class RedisGuard:
+    def __init__(self, failures: int, open_seconds: float, initial_limit: int, min_limit: int, max_limit: int,
+                 target_ms: float, backoff: float, click_share: float):
+        self.failures = failures
+        self.open_seconds = open_seconds
+        self.min_limit = max(1, min_limit)
+        # 0: no concurrency limit
+        self.max_limit = max_limit
+        self.target = target_ms / 1000
+        self.backoff = backoff
+        self.click_share = click_share
+        self.state = CLOSED
+        self.inflight = 0
+        self.limit = float(min(max(initial_limit, self.min_limit), max_limit or initial_limit))
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._last_decrease = float("-inf")
+        metrics.REDIS_BREAKER_STATE.set(STATES[CLOSED])
+        metrics.REDIS_CONCURRENCY_LIMIT.set(self.limit if max_limit else 0)
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker lets a probe through (1 while closed or half-open)."""
+        if self.state != OPEN:
+            return 1
+        return max(1, math.ceil(self._opened_at + self.open_seconds - time.monotonic()))
+
+    def rejecting(self) -> bool:
+        """Open and not due for a probe yet: nothing should even try Redis."""
+        return self.state == OPEN and time.monotonic() - self._opened_at < self.open_seconds
+
+    def admit(self) -> bool:
+        """
+        Takes a slot for one command or pipeline, or raises RedisUnavailable.
+        Returns whether it is the half-open probe; pass that on to release() once it completed.
+        """
+        probe = False
+        if self.state != CLOSED:
+            if self.rejecting() or self._probing:
+                metrics.REDIS_SHED.labels(reason="open").inc()
+                raise RedisUnavailable("Redis circuit breaker is open", self.retry_after())
+            self._set_state(HALF_OPEN)
+            self._probing = probe = True
+        elif self.max_limit and self.inflight >= self.limit:
+            metrics.REDIS_SHED.labels(reason="limit").inc()
+            raise RedisUnavailable("Too many Redis calls in flight")
+        self.inflight += 1
+        metrics.REDIS_INFLIGHT.inc()
+        return probe
+
+    def release(self, probe: bool, seconds: float, failed: bool | None):
+        """
+        Frees the slot of a completed command: `seconds` it took, `failed` per is_failure
+        (None when it was cancelled, which says nothing about Redis).
+        """
+        self.inflight -= 1
+        metrics.REDIS_INFLIGHT.dec()
+        if probe:
+            self._probing = False
+        if failed is None:
+            return
+
+        if failed:
+            self._consecutive_failures += 1
+            if probe or (self.state == CLOSED and self.failures and self._consecutive_failures >= self.failures):
+                self._open()
+        else:
+            self._consecutive_failures = 0
+            if probe:
+                self._set_state(CLOSED)
+                logger.info("Redis answered again: circuit breaker closed.")
+        if self.max_limit and self.state == CLOSED:
+            self._adjust_limit(seconds, failed)
+
+    def _adjust_limit(self, seconds: float, failed: bool):
+        now = time.monotonic()
+        if failed or seconds > self.target:
+            # Concurrent calls slowed by the same congestion count once: one decrease per round trip
+            if now - self._last_decrease >= seconds:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._last_decrease = now
+                metrics.REDIS_CONCURRENCY_LIMIT.set(self.limit)
+        elif self.inflight + 1 >= self.limit / 2:
+            # Only grows while at least half of it is used, so a quiet process doesn't drift to the maximum
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            metrics.REDIS_CONCURRENCY_LIMIT.set(self.limit)
+
+    def _open(self):
+        if self.state != OPEN:
+            logger.warning(f"Redis failing ({self._consecutive_failures} errors in a row): circuit breaker open, "
+                           f"shedding Redis calls for {self.open_seconds:g}s.")
+        self._opened_at = time.monotonic()
+        self._set_state(OPEN)
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            self.state = state
+            metrics.REDIS_BREAKER_STATE.set(STATES[state])
+            metrics.REDIS_BREAKER_TRANSITIONS.labels(state=state).inc()
+
+    def admits_clicks(self) -> bool:
+        """Whether click tracking may use Redis now: breaker closed and below its share of the limit."""
+        if self.state != CLOSED:
+            return False
+        return not self.max_limit or self.inflight < self.limit * self.click_share
+
+    async def call(self, send):
+        """Runs send() (a Redis command or pipeline, as a coroutine function) in a slot: admit / release."""
+        probe = self.admit()
+        started = time.perf_counter()
+        failed = False
+        try:
+            return await send()
+        except asyncio.CancelledError:
+            failed = None
+            raise
+        except Exception as e:
+            failed = is_failure(e)
+            raise
+        finally:
+            self.release(probe, time.perf_counter() - started, failed)
+
+
+redis_guard = RedisGuard(
+    settings.REDIS_BREAKER_FAILURES,
+    settings.REDIS_BREAKER_OPEN_SECONDS,
+    settings.REDIS_LIMIT_INITIAL,
+    settings.REDIS_LIMIT_MIN,
+    settings.REDIS_LIMIT_MAX,
+    settings.REDIS_LATENCY_TARGET_MS,
+    settings.REDIS_LIMIT_BACKOFF,
+    settings.REDIS_LIMIT_CLICK_SHARE
+)
@@ -7,14 +7,188 @@ class Settings(BaseSettings):
     REDIS_PORT: int = 6379
     BASE_URL: str = "http://localhost"
 
+    # --- Redis Cluster (see keys.py; must match the worker) ---
+    # REDIS_HOST/REDIS_PORT is then any node of the cluster, and per-link keys get {short_id} hash tags
+    REDIS_CLUSTER: bool = False
+    # Global structures split into shards over the cluster; 1 = one plain key
+    LEADERBOARD_KEY: str = "leaderboard:top_links"
+    LEADERBOARD_SHARDS: int = 1
+    BLOOM_SHARDS: int = 1
+    STREAM_SHARDS: int = 1
+
+    # --- Read replicas (see database.py) ---
+    # Comma-separated host:port list. Redirects and stats reads go to them, round robin over the healthy ones
+    # (not used with REDIS_CLUSTER, whose replicas belong to the cluster)
+    REDIS_REPLICAS: str = ""
+    REPLICA_HEALTH_CHECK_INTERVAL_SECONDS: float = 2.0
+    # A replica read taking longer than this fails over to the primary
+    REPLICA_TIMEOUT_SECONDS: float = 0.25
+    # A replica is skipped while its link to the primary is down or it is this far behind (replication offset)
+    REPLICA_MAX_LAG_BYTES: int = 1048576
+    # Read-your-writes: links this process created in the last N seconds are read from the primary,
+    # and a link a replica doesn't have (yet) is looked up again on the primary. 0 disables both
+    READ_YOUR_WRITES_SECONDS: int = 5
+
+    # --- Redis load shedding (see breaker.py) ---
+    # A primary command (or connect) taking longer than this fails, and counts against the breaker
+    REDIS_SOCKET_TIMEOUT_SECONDS: float = 2.0
+    REDIS_CONNECT_TIMEOUT_SECONDS: float = 1.0
+    # Timeouts / connection errors in a row that open the circuit breaker (0 = never opens),
+    # and how long it then fails every call before letting one probe through
+    REDIS_BREAKER_FAILURES: int = 5
+    REDIS_BREAKER_OPEN_SECONDS: float = 5.0
+    # Adaptive (AIMD) limit of commands and pipelines in flight per process; REDIS_LIMIT_MAX=0 = no limit
+    REDIS_LIMIT_INITIAL: int = 64
+    REDIS_LIMIT_MIN: int = 8
+    REDIS_LIMIT_MAX: int = 512
+    # Calls slower than this shrink the limit by REDIS_LIMIT_BACKOFF; faster ones grow it by ~1 per round trip
+    REDIS_LATENCY_TARGET_MS: float = 50
+    REDIS_LIMIT_BACKOFF: float = 0.9
+    # Clicks are only tracked while less than this share of the limit is in use (redirects come first)
+    REDIS_LIMIT_CLICK_SHARE: float = 0.5
+
     QR_CODE_JOBS_STREAM: str = "qr_code_jobs"
 
     DATA_HASH_KEY_PREFIX: str = "data"
     ANALYTICS_STREAM_NAME: str = "analytics_jobs"
+    ANALYTICS_CONSUMER_GROUP: str = "analytics_processors"
+
+    # --- Stream caps (approximate MAXLEN on every XADD) ---
+    # Hard backstop only: the worker trims acknowledged history much earlier
+    QR_CODE_STREAM_MAXLEN: int = 100000
+    ANALYTICS_STREAM_MAXLEN: int = 1000000
+
+    # --- Click tracking backpressure ---
+    # When the analytics consumer group lags by more than this many entries,
+    # click tracking switches to a degraded mode until the lag drops below the resume level
+    BACKPRESSURE_LAG_THRESHOLD: int = 100000
+    BACKPRESSURE_RESUME_LAG: int = 20000
+    BACKPRESSURE_CHECK_INTERVAL_SECONDS: float = 2.0
+    # "buffer" -> aggregate clicks per link in memory and flush weighted events later
+    # "sample" -> send 1 in N clicks with weight N
+    BACKPRESSURE_MODE: str = "buffer"
+    BACKPRESSURE_SAMPLE_RATE: float = 0.1
+    # Max distinct links held in the local buffer; beyond this new links are sampled
+    CLICK_BUFFER_MAX_LINKS: int = 50000
+
+    # --- Windowed unique visitors (time-bucketed HLLs written by the worker) ---
+    # Oldest window that can be answered (the worker keeps daily buckets a bit longer)
+    UV_MAX_WINDOW_DAYS: int = 90
+    # Hourly buckets exist (worker UV_HOURLY_BUCKETS) for windows up to 48h
+    UV_HOURLY_BUCKETS: bool = True
+    # Windows spanning more buckets than this are answered from a cached PFMERGE
+    UV_MERGE_CACHE_MIN_KEYS: int = 8
+    UV_MERGE_CACHE_TTL: int = 300
+
+    # --- Click breakdowns (referrer / country / device, per day, written by the worker) ---
+    BREAKDOWN_MAX_DAYS: int = 90
+    # Raw Referer / User-Agent / Accept-Language are forwarded as-is, cut to this length
+    CLICK_HEADER_MAX_LENGTH: int = 256
+
+    # --- Link storage layout (see storage.py) ---
+    # "string" -> one link:{id} key per link; "bucketed" -> links packed into lb:{prefix} hashes
+    LINK_STORAGE: str = "string"
+    # Buckets = 64 ** prefix length (2 -> 4096, 3 -> 262144). Size it for the expected link count:
+    # the savings grow with links per bucket, up to hash-max-listpack-entries
+    LINK_BUCKET_PREFIX_LENGTH: int = 3
+    # URLs longer than Redis's hash-max-listpack-value turn a bucket into a regular hash
+    LINK_BUCKET_MIN_LISTPACK_VALUE: int = 1024
+    # While migrating (python -m app.link_migration), reads fall back to the other layout.
+    # Off otherwise: every miss (unknown link, Bloom filter false positive) would cost a second lookup
+    LINK_STORAGE_FALLBACK: bool = False
+
+    # --- Bloom filter of existing short_ids (see bloom.py) ---
+    BLOOM_FILTER_KEY: str = "bf:short_links"
+    # Reserved with these at startup; the worker's rebuild uses the same ones
+    BLOOM_CAPACITY: int = 1000000
+    BLOOM_ERROR_RATE: float = 0.001
+    # Each time the capacity is exceeded a sub-filter this many times larger is added
+    BLOOM_EXPANSION: int = 2
+
+    # --- Long URL compression (see url_codec.py) ---
+    # "none", "zlib" or "zstd"; applies to new links, stored values of any kind stay readable
+    LINK_COMPRESSION: str = "none"
+    # Shorter URLs are stored as-is
+    LINK_COMPRESSION_MIN_LENGTH: int = 512
+    # Trained dictionaries (python -m app.url_codec train): id -> base64, plus the current id
+    LINK_COMPRESSION_DICTS_KEY: str = "codec:url_dicts"
+
+    # --- Link expiration ---
+    # Optional per-link TTL (expires_in at creation); the worker sweeps expired links' keys
+    LINK_MAX_TTL_SECONDS: int = 365 * 24 * 3600
+    # Sorted set of expiring links (score = expiry, epoch seconds)
+    LINK_EXPIRY_ZSET: str = "links:expiry"
+
     JWT_SECRET_KEY: str
     JWT_ALGORITHM: str = "HS256"
     MEDIA_PATH: str = "/app/media"
 
+    # QR Code generation mode:
+    # "eager" -> a job is sent to the worker for every new link (original pipeline)
+    # "lazy"  -> the QR image is rendered on the first request to /{short_id}/qr (or first stats view)
+    QR_MODE: str = "eager"
+    # Cache-Control max-age (seconds) for served QR images
+    QR_CACHE_MAX_AGE: int = 86400
+    # How long a replica holds the cross-process render lock (ms)
+    QR_RENDER_LOCK_MS: int = 10000
+
+    # --- Serving (python -m app.serve) ---
+    # Worker processes; 0 = one per CPU
+    WEB_CONCURRENCY: int = 0
+    # Each process has its own Redis pools; this many connections per endpoint are opened during warmup
+    REDIS_WARM_CONNECTIONS: int = 10
+    # On SIGTERM, in-flight requests get this long before buffered clicks are flushed
+    GRACEFUL_SHUTDOWN_SECONDS: int = 30
+    # In-process cache of hot links for redirects (see hot_cache.py); 0 = off
+    HOT_LINK_CACHE_SIZE: int = 0
+    HOT_LINK_CACHE_TTL_SECONDS: float = 10.0
+    # Top links of the leaderboard loaded into it at startup
+    HOT_LINK_CACHE_PREFILL: int = 1000
+    # Snapshot file of the hottest links (see snapshot.py): startup warmup and redirects while Redis is down.
+    # Empty = off. Every process maps it; one rewrites it every interval
+    SNAPSHOT_PATH: str = ""
+    SNAPSHOT_LINKS: int = 10000
+    SNAPSHOT_INTERVAL_SECONDS: int = 300
+    # Sorted set where every process adds its hot cache hits each interval, for the next snapshot to include
+    SNAPSHOT_SERVED_KEY: str = "links:served"
+
+    # --- Tracing (see tracing.py) ---
+    # Empty: tracing is off and costs nothing (no provider, no instrumentation)
+    OTEL_EXPORTER_OTLP_ENDPOINT: str = ""
+    # Head sampling of new traces (parent-based: requests carrying a trace context follow its decision)
+    TRACE_SAMPLE_RATIO: float = 1.0
+    # Per-route overrides, "route=ratio,..." matched against http.route (or the span name)
+    TRACE_ROUTE_SAMPLE_RATIOS: str = "/{short_id}=0.001"
+    # Unsampled requests are still exported when they fail (5xx) or take at least this long (0 = off)
+    TRACE_KEEP_ERRORS: bool = True
+    TRACE_SLOW_REQUEST_MS: float = 500
+    # False: no span per Redis command, the request span gets redis.commands / redis.seconds instead
+    TRACE_REDIS_COMMANDS: bool = False
+    # Comma-separated URL regexes without request spans
+    TRACE_EXCLUDED_URLS: str = "/metrics,/health"
+    # Spans waiting for export; beyond this they are dropped
+    TRACE_EXPORT_QUEUE_SIZE: int = 2048
+    TRACE_EXPORT_BATCH_SIZE: int = 512
+    TRACE_EXPORT_TIMEOUT_MS: int = 10000
+
+    # --- Event loop monitor (see loopmon.py) ---
+    LOOP_MONITOR_ENABLED: bool = True
+    # How often the loop's lag is sampled
+    LOOP_MONITOR_INTERVAL_SECONDS: float = 0.25
+    # A loop that hasn't come back for this long is stalled: its running stack gets logged
+    LOOP_STALL_THRESHOLD_SECONDS: float = 0.1
+    # At most one stack per this many seconds (every stall is still counted)
+    LOOP_STALL_LOG_INTERVAL_SECONDS: float = 60
+
+    # --- Profiler endpoint (see profiler.py) ---
+    # Bearer token for the profiling endpoint; empty = the endpoint is disabled (404)
+    PROFILER_TOKEN: str = ""
+    PROFILER_MAX_SECONDS: float = 60
+    # One profile at a time per process, and at least this long between two
+    PROFILER_COOLDOWN_SECONDS: float = 60
+    # Default sampling interval
+    PROFILER_INTERVAL_MS: float = 10
+
 
 settings = Settings()
 
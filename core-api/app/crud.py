@@ -1,61 +1,206 @@
+import asyncio
 import redis.asyncio as redis
 from nanoid import generate
 import json  # <-- 1. Import json for serialization
+import time
+from datetime import datetime, timedelta, timezone
 from .config import settings
 from .database import redis_client  # We need our custom wrapper
-from . import schemas
+from . import schemas, qr, metrics
+from .backpressure import click_backpressure
+from .breaker import CLOSED, redis_guard
+from .storage import link_store
+from . import bloom, keys
+from .url_codec import url_codec
+from .hot_cache import hot_links
+from .snapshot import link_snapshot
 
 
-async def create_short_link(db: redis.Redis, long_url: str) -> str:
+async def create_short_link(db: redis.Redis, long_url: str, expires_in: int | None = None) -> str:
     """
     Creates a short link, saves it (String), and sends a job to worker (Stream).
+    With expires_in (seconds) the link expires on its own and is registered for the worker's sweeper.
     """
     # 1. Generate ID
     short_id = generate(size=6)
-    redis_key = f"link:{short_id}"
 
-    # 2. Save String
-    await db.set(redis_key, str(long_url))  # It saves it here!
-    # 3. Send to Worker
-    job_data = {
-        "short_id": str(short_id),
-        "long_url": str(long_url)
-    }
-    await db.xadd(settings.QR_CODE_JOBS_STREAM, job_data)
+    # 2. Save the URL (link:{id} string or a bucket hash, see storage.py) and add it to the Bloom filter.
+    # On a cluster these keys live in different slots: the pipeline is sent per node, without MULTI.
+    with metrics.redis_call("create_short_link"):
+        async with db.pipeline(transaction=not settings.REDIS_CLUSTER) as pipe:
+            link_store.queue_set(pipe, short_id, str(long_url), expires_in)
+            if expires_in:
+                now = int(time.time())
+                pipe.zadd(settings.LINK_EXPIRY_ZSET, {short_id: now + expires_in})
+                # The sweeper uses these to find every time bucket the link may have written
+                pipe.hset(keys.data(short_id), mapping={
+                    "created_at": now,
+                    "expires_at": now + expires_in
+                })
+            bloom.queue_add(pipe, short_id)
+            results = await pipe.execute(raise_on_error=False)
+    # The last reply is the insert into a filter being rebuilt, which fails when there is none
+    for result in results[:-1]:
+        if isinstance(result, Exception):
+            raise result
+    # Replicas may not have it yet: this process reads it from the primary for a few seconds
+    redis_client.note_write(short_id)
+    # 3. Send to Worker (eager mode only; in lazy mode the QR is rendered on first view)
+    if settings.QR_MODE == "eager":
+        job_data = {
+            "short_id": str(short_id),
+            # Compressed like the stored value (the worker decodes it)
+            "long_url": url_codec.encode(str(long_url))
+        }
+        await db.xadd(
+            keys.stream(settings.QR_CODE_JOBS_STREAM, short_id),
+            job_data,
+            maxlen=settings.QR_CODE_STREAM_MAXLEN,
+            approximate=True
+        )
 
     # 4. Return ID
     return short_id
 
 
 async def get_long_url(db: redis.Redis, short_id: str) -> str | None:
+    """The long URL of a link, None if it doesn't exist (see resolve_long_url)."""
+    long_url, _ = await resolve_long_url(db, short_id)
+    return long_url
+
+
+async def resolve_long_url(db: redis.Redis, short_id: str) -> tuple[str | None, str]:
     """
-    Gets the long URL from Redis String.
+    Gets the long URL from Redis String, and where it came from: "hot_cache", "redis" or "snapshot".
     Uses Bloom Filter to avoid unnecessary DB lookups (Cache Penetration).
+    Served by a read replica when there are any; a link the replica doesn't have yet is
+    looked up on the primary too (read-your-writes, see RedisClient.read).
+    Hot links may be answered from this process's memory (HOT_LINK_CACHE_SIZE).
+    While Redis is unreachable, links in the snapshot file (SNAPSHOT_PATH) still resolve.
+    """
+    if hot_links.size > 0:
+        long_url = hot_links.get(short_id)
+        metrics.CACHE_LOOKUPS.labels(cache="hot_links", result="miss" if long_url is None else "hit").inc()
+        if long_url is not None:
+            return long_url, "hot_cache"
+
+    try:
+        with metrics.redis_call("get_long_url"):
+            long_url = await redis_client.read(
+                "get_long_url",
+                lambda client: _find_long_url(client, short_id),
+                short_id=short_id,
+                miss_on_primary=True
+            )
+    except Exception:
+        long_url = link_snapshot.get(short_id)
+        metrics.SNAPSHOT_FALLBACKS.labels(result="miss" if long_url is None else "hit").inc()
+        if long_url is None:
+            raise
+        return long_url, "snapshot"
+    if long_url is not None:
+        hot_links.put(short_id, long_url)
+    return long_url, "redis"
+
+
+async def prefill_hot_links(db: redis.Redis, count: int) -> int:
     """
+    Loads the top `count` links into the hot link cache: from the snapshot file when there is one
+    (no Redis round trips), else from the leaderboard. Returns how many were found.
+    """
+    if hot_links.size <= 0 or count <= 0:
+        return 0
+    snapshotted = link_snapshot.hottest(min(count, hot_links.size))
+    if snapshotted:
+        # Hottest last, so they are the last to be evicted
+        for short_id, long_url in reversed(snapshotted):
+            hot_links.put(short_id, long_url)
+        return len(snapshotted)
+    short_ids = [item["short_id"] for item in await get_leaderboard(db, min(count, hot_links.size))]
+    loaded = 0
+    step = max(1, settings.REDIS_WARM_CONNECTIONS)
+    for start in range(0, len(short_ids), step):
+        urls = await asyncio.gather(*(get_long_url(db, short_id) for short_id in short_ids[start:start + step]))
+        loaded += sum(url is not None for url in urls)
+    return loaded
+
+
+async def _find_long_url(client: redis.Redis, short_id: str) -> str | None:
     # 1. Check Bloom Filter first
-    bf_key = "bf:short_links"
+    bf_key = keys.bloom_filter(short_id)
 
     # We use our wrapper 'redis_client' to call the custom method
-    exists_in_filter = await redis_client.check_bloom_filter(bf_key, short_id)
+    exists_in_filter = await redis_client.check_bloom_filter(bf_key, short_id, client)
 
     # If Bloom Filter says it DEFINITELY does not exist, return None immediately.
     if not exists_in_filter:
         return None
 
-    # 2. If it MIGHT exist, proceed to check the actual database (String)
-    redis_key = f"link:{short_id}"
-    return await db.get(redis_key)
+    # 2. If it MIGHT exist, proceed to check the actual database
+    long_url = await link_store.get(client, short_id)
+    if long_url is None:
+        # A false positive, an expired or deleted link, or (replicas) a link the replica hasn't received yet
+        metrics.BLOOM_PASS_MISSES.inc()
+    return long_url
 
 
 # VVV --- Updated Function with Caching --- VVV
-async def get_link_stats(db: redis.Redis, short_id: str) -> schemas.LinkStats | None:
+def window_to_hours(window: str) -> int:
+    """
+    Parses a stats window like '24h' or '7d' into hours.
+    Raises ValueError if it is malformed or longer than the buckets we keep.
+    """
+    amount, unit = int(window[:-1]), window[-1]
+    if unit not in ("h", "d") or amount <= 0:
+        raise ValueError(f"Invalid window '{window}'")
+    hours = amount if unit == "h" else amount * 24
+    if hours > settings.UV_MAX_WINDOW_DAYS * 24:
+        raise ValueError(f"Window is limited to {settings.UV_MAX_WINDOW_DAYS} days")
+    return hours
+
+
+def uv_window_keys(short_id: str, window: str) -> list[str]:
+    """
+    Time-bucketed HLL keys (written by the worker) covering the window, newest first.
+    The window is rounded up to whole buckets: hourly up to 48h, daily beyond.
+    """
+    hours = window_to_hours(window)
+    now = datetime.now(timezone.utc)
+
+    if settings.UV_HOURLY_BUCKETS and hours <= 48:
+        return [keys.unique_visitors_hour(short_id, f"{now - timedelta(hours=i):%Y%m%d%H}") for i in range(hours)]
+
+    days = -(-hours // 24)
+    return [keys.unique_visitors_day(short_id, f"{now - timedelta(days=i):%Y%m%d}") for i in range(days)]
+
+
+async def count_unique_visitors(short_id: str, window: str) -> int:
+    """
+    Unique visitors of a link in the last `window` (e.g. '24h', '7d').
+    A few buckets are counted with one multi-key PFCOUNT; long windows use a cached PFMERGE.
+    """
+    bucket_keys = uv_window_keys(short_id, window)
+
+    if len(bucket_keys) > settings.UV_MERGE_CACHE_MIN_KEYS:
+        # Keyed by the newest bucket, so the merge is rebuilt when a new bucket starts
+        newest_bucket = bucket_keys[0].rsplit(":", 1)[1]
+        merged_key = keys.merged_unique_visitors_cache(short_id, window, newest_bucket)
+        return await redis_client.count_hyperloglog_merged(merged_key, bucket_keys, settings.UV_MERGE_CACHE_TTL)
+
+    return await redis_client.count_hyperloglog(*bucket_keys)
+
+
+async def get_link_stats(db: redis.Redis, short_id: str, window: str | None = None) -> schemas.LinkStats | None:
     """
     Gets full stats with Caching (Look-aside pattern).
     1. Try Cache -> 2. If Miss, Get from DB -> 3. Set Cache -> 4. Return
+    With a window (e.g. '24h'), unique visitors in that window are included too.
     """
 
     # 1. Try Cache
-    cache_key = f"cache:stats:{short_id}"
+    cache_key = keys.stats_cache(short_id)
+    if window:
+        cache_key = f"{cache_key}:{window}"
     # Use our wrapper method to get cache
     cached_data = await redis_client.get_cache(cache_key)
 
@@ -70,58 +215,100 @@ async def get_link_stats(db: redis.Redis, short_id: str) -> schemas.LinkStats |
     if not long_url:
         return None
 
-    hash_key = f"{settings.DATA_HASH_KEY_PREFIX}:{short_id}"
-    hash_data = await redis_client.get_hash_all(hash_key)
+    hash_key = keys.data(short_id)
+    hash_data = await redis_client.get_hash_all(hash_key, short_id)
 
     qr_code_url = None
     if "qr_code_path" in hash_data:
         qr_code_url = f"{settings.BASE_URL}{hash_data['qr_code_path']}"
+    elif settings.QR_MODE == "lazy":
+        # First stats view renders the QR code on demand
+        await qr.ensure_qr_code(short_id, long_url)
+        qr_code_url = f"{settings.BASE_URL}{qr.qr_web_path(short_id)}"
 
     short_link = f"{settings.BASE_URL}/{short_id}"
 
-    uv_key = f"uv:{short_id}"
+    expires_at = None
+    cache_ttl = 30
+    if "expires_at" in hash_data:
+        expires_at = datetime.fromtimestamp(int(hash_data["expires_at"]), tz=timezone.utc)
+        # Never serve cached stats for a link that has already expired
+        cache_ttl = max(1, min(cache_ttl, int(hash_data["expires_at"]) - int(time.time())))
+
+    uv_key = keys.unique_visitors(short_id)
     unique_clicks = await redis_client.count_hyperloglog(uv_key)
     # ^^^ --- End of new logic --- ^^^
 
+    window_unique_clicks = None
+    if window:
+        window_unique_clicks = await count_unique_visitors(short_id, window)
+
     # Create the object with unique_clicks
     stats_obj = schemas.LinkStats(
         short_link=short_link,
         long_url=long_url,
         qr_code_url=qr_code_url,
-        unique_clicks=unique_clicks # <--- Pass the count here
+        unique_clicks=unique_clicks, # <--- Pass the count here
+        window=window,
+        window_unique_clicks=window_unique_clicks,
+        expires_at=expires_at
     )
 
-    # 3. Set Cache (TTL: 30 seconds)
+    # 3. Set Cache (TTL: 30 seconds, or less for a link about to expire)
     # Serialize the Pydantic model to JSON string
     # We use model_dump() (Pydantic v2) or dict() and then dumps
     await redis_client.set_cache(
         cache_key,
         json.dumps(stats_obj.model_dump(mode='json')),
-        ttl=30
+        ttl=cache_ttl
     )
     return stats_obj
 
 
 # ^^^ --- End Updated Function --- ^^^
 
-async def track_link_click(db: redis.Redis, short_id: str):
-    """
-    Sends a 'click' event to the analytics stream.
-    """
-    event_data = {
-        "short_id": str(short_id)
-    }
+# Dimensions the worker keeps per link and day: bd:{short_id}:{dimension}:YYYYMMDD
+BREAKDOWN_DIMENSIONS = ("referrer", "country", "device")
 
-    await db.xadd(settings.ANALYTICS_STREAM_NAME, event_data)
 
+async def get_link_breakdown(short_id: str, days: int, dimensions: tuple = BREAKDOWN_DIMENSIONS) -> schemas.LinkBreakdown:
+    """
+    Clicks per referrer / country / device over the last `days` days (UTC, today included).
+    One pipelined HGETALL per dimension and day: the cost follows the number of distinct values,
+    never the number of clicks.
+    """
+    now = datetime.now(timezone.utc)
+    days_keys = [f"{now - timedelta(days=i):%Y%m%d}" for i in range(days)]
+    hash_keys = [keys.breakdown(short_id, name, day) for name in dimensions for day in days_keys]
+    hashes = await redis_client.get_hashes(hash_keys)
+
+    breakdown = {name: {} for name in dimensions}
+    for key, counts in zip(hash_keys, hashes):
+        totals = breakdown[key.split(":")[2]]
+        for value, count in counts.items():
+            totals[value] = totals.get(value, 0) + int(count)
+
+    # Every click lands in exactly one value per dimension
+    total_clicks = sum(breakdown[dimensions[0]].values()) if dimensions else 0
+    return schemas.LinkBreakdown(
+        short_id=short_id,
+        days=days,
+        total_clicks=total_clicks,
+        dimensions={
+            name: dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+            for name, totals in breakdown.items()
+        }
+    )
 
 async def get_leaderboard(db: redis.Redis, limit: int = 10):
     """
     Retrieves the top links leaderboard from Redis Sorted Set.
+    A sharded leaderboard (LEADERBOARD_SHARDS) is merged from the top `limit` of every shard.
     """
-    leaderboard_key = "leaderboard:top_links"
-
-    top_items = await redis_client.get_top_members(leaderboard_key, limit)
+    top_items = []
+    for leaderboard_key in keys.leaderboards():
+        top_items.extend(await redis_client.get_top_members(leaderboard_key, limit))
+    top_items = sorted(top_items, key=lambda item: item[1], reverse=True)[:limit]
 
     result = []
     for member, score in top_items:
@@ -139,7 +326,7 @@ async def get_link_clicks_history(db: redis.Redis, short_id: str):
     Retrieves the click history from Redis TimeSeries.
     """
     # Key format: ts:clicks:{short_id}
-    ts_key = f"ts:clicks:{short_id}"
+    ts_key = keys.clicks_timeseries(short_id)
 
     # Get raw data points [(timestamp, value), ...]
     # We use '-' and '+' to get ALL available history
@@ -156,14 +343,37 @@ async def get_link_clicks_history(db: redis.Redis, short_id: str):
     return history
 
 
-async def track_link_click(db: redis.Redis, short_id: str, ip: str):
+async def track_link_click(db: redis.Redis, short_id: str, ip: str,
+                           referrer: str = "", user_agent: str = "", language: str = ""):
     """
     Sends a 'click' event to the analytics stream, including the user's IP.
+    Referer / User-Agent / Accept-Language are passed through raw; the worker classifies them.
     """
     event_data = {
         "short_id": str(short_id),
         "ip": str(ip)  # <-- New Field: Client IP Address
     }
-
-    # Send the event to the Redis Stream defined in settings
-    await db.xadd(settings.ANALYTICS_STREAM_NAME, event_data)
\ No newline at end of file
+    max_length = settings.CLICK_HEADER_MAX_LENGTH
+    for field, value in (("ref", referrer), ("ua", user_agent), ("lang", language)):
+        if value:
+            event_data[field] = value[:max_length]
+
+    # Redis is shedding load (breaker.py): clicks are the first thing to give way, redirects go on
+    if not redis_guard.admits_clicks():
+        metrics.CLICKS_SHED.labels(reason="load" if redis_guard.state == CLOSED else "open").inc()
+        return
+
+    # Worker is falling behind: buffer or sample instead of growing the stream
+    if click_backpressure.degraded:
+        event_data = click_backpressure.absorb(event_data)
+        if event_data is None:
+            return
+
+    # Send the event to the Redis Stream defined in settings (capped, approximate trim)
+    with metrics.redis_call("track_link_click"):
+        await db.xadd(
+            keys.stream(settings.ANALYTICS_STREAM_NAME, short_id),
+            event_data,
+            maxlen=settings.ANALYTICS_STREAM_MAXLEN,
+            approximate=True
+        )
@@ -1,64 +1,477 @@
+import asyncio
+import functools
+import time
+from collections import OrderedDict
 import redis.asyncio as aioredis
+from redis.asyncio.client import Pipeline
+from redis.asyncio.cluster import ClusterPipeline
+from redis.asyncio.retry import Retry
+from redis.backoff import NoBackoff
 from redis.exceptions import ResponseError
 from .config import settings, logger
+from .breaker import RedisGuard, RedisUnavailable, redis_guard
+from . import metrics, tracing
 
 
-class RedisClient:
+def parse_endpoints(value: str) -> list[tuple[str, int]]:
+    """'replica-1:6379,replica-2' -> [("replica-1", 6379), ("replica-2", 6379)]"""
+    endpoints = []
+    for item in value.split(","):
+        host, _, port = item.strip().partition(":")
+        if host:
+            endpoints.append((host, int(port or 6379)))
+    return endpoints
+
+
+def _stream_id(entry_id: str) -> tuple[int, int]:
+    milliseconds, _, sequence = entry_id.partition("-")
+    return int(milliseconds), int(sequence or 0)
+
+
+def record_command(command, seconds: float):
+    """Latency of a command sent outside a pipeline: per command name, and on the request span (tracing.py)."""
+    name = command.decode() if isinstance(command, bytes) else str(command)
+    metrics.REDIS_COMMAND_SECONDS.labels(command=name.upper()).observe(seconds)
+    tracing.record_redis_command(seconds)
+
+
+async def _timed_command(execute, *args, **options):
+    started = time.perf_counter()
+    try:
+        return await execute(*args, **options)
+    finally:
+        record_command(args[0], time.perf_counter() - started)
+
+
+class GuardedPipeline(Pipeline):
+    guard: RedisGuard | None = None
+
+    async def execute(self, raise_on_error: bool = True):
+        if self.guard is None:
+            return await super().execute(raise_on_error)
+        return await self.guard.call(functools.partial(super().execute, raise_on_error))
+
+
+class GuardedClusterPipeline(ClusterPipeline):
+    guard: RedisGuard | None = None
+
+    async def execute(self, raise_on_error: bool = True, allow_redirections: bool = True):
+        if self.guard is None:
+            return await super().execute(raise_on_error, allow_redirections)
+        return await self.guard.call(functools.partial(super().execute, raise_on_error, allow_redirections))
+
+
+class InstrumentedRedis(aioredis.Redis):
+    # The primary's load shedding (breaker.py), set once it is connected; replicas have none
+    guard: RedisGuard | None = None
+
+    async def execute_command(self, *args, **options):
+        if self.guard is None:
+            return await _timed_command(super().execute_command, *args, **options)
+        return await self.guard.call(functools.partial(_timed_command, super().execute_command, *args, **options))
+
+    def pipeline(self, transaction: bool = True, shard_hint: str | None = None) -> GuardedPipeline:
+        pipe = GuardedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+        pipe.guard = self.guard
+        return pipe
+
+
+class InstrumentedRedisCluster(aioredis.RedisCluster):
+    guard: RedisGuard | None = None
+
+    async def execute_command(self, *args, **options):
+        if self.guard is None:
+            return await _timed_command(super().execute_command, *args, **options)
+        return await self.guard.call(functools.partial(_timed_command, super().execute_command, *args, **options))
+
+    def pipeline(self, transaction: bool | None = None, shard_hint: str | None = None) -> GuardedClusterPipeline:
+        if shard_hint:
+            # What RedisCluster.pipeline() raises
+            return super().pipeline(transaction, shard_hint)
+        pipe = GuardedClusterPipeline(self, transaction)
+        pipe.guard = self.guard
+        return pipe
+
+
+def timed_call(method):
+    """Records the latency of a RedisClient method under its name (REDIS_CALL_SECONDS)."""
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        with metrics.redis_call(method.__name__):
+            return await method(self, *args, **kwargs)
+    return wrapper
+
+
+class Replica:
+    """A read replica and whether it currently receives reads."""
+
     def __init__(self, host: str, port: int, db: int):
+        self.name = f"{host}:{port}"
+        # Fail fast, no retries: the read is repeated on the primary instead
+        self.client = InstrumentedRedis(
+            host=host,
+            port=port,
+            db=db,
+            decode_responses=True,
+            socket_timeout=settings.REPLICA_TIMEOUT_SECONDS,
+            socket_connect_timeout=settings.REPLICA_TIMEOUT_SECONDS,
+            retry=Retry(NoBackoff(), 0)
+        )
+        self.healthy = False
+
+    def set_healthy(self, healthy: bool, reason: str = ""):
+        if healthy != self.healthy:
+            if healthy:
+                logger.info(f"Redis replica {self.name} is back in the read rotation.")
+            else:
+                logger.warning(f"Redis replica {self.name} taken out of the read rotation: {reason}")
+        self.healthy = healthy
+        metrics.REPLICA_HEALTHY.labels(endpoint=self.name).set(int(healthy))
+
+
+class RedisClient:
+    """
+    The connection(s) and the commands core-api sends. Methods log Redis errors and return a neutral value,
+    except RedisUnavailable (breaker.py): it propagates, Redis wasn't even asked, and main.py answers 503.
+    """
+
+    def __init__(self, host: str, port: int, db: int, replicas: list[tuple[str, int]] | None = None,
+                 guard: RedisGuard | None = None):
         self.host = host
         self.port = port
         self.db = db
         self.client = None
+        # Load shedding for the primary (breaker.py): commands, pipelines and reconnects
+        self.guard = guard
+        # Read replicas (host, port): connected in connect(), health-checked in the background
+        self.replica_endpoints = replicas or []
+        self.replicas: list[Replica] = []
+        self._next_replica = 0
+        self._health_task: asyncio.Task | None = None
+        # short_id -> when this process created it, oldest first (read-your-writes)
+        self._recent_writes: OrderedDict[str, float] = OrderedDict()
 
     async def connect(self):
         """Connects to Redis on startup."""
         try:
-            self.client = aioredis.Redis(
-                host=self.host,
-                port=self.port,
-                db=self.db,
-                decode_responses=True
-            )
+            if settings.REDIS_CLUSTER:
+                # Any node will do: the client discovers the others and sends each key to its slot's node
+                self.client = InstrumentedRedisCluster(
+                    host=self.host,
+                    port=self.port,
+                    decode_responses=True,
+                    socket_timeout=settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+                    socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT_SECONDS
+                )
+            else:
+                # Bounded waits and a single retry (a stale pooled connection): a slow or unreachable Redis
+                # shows up as errors the circuit breaker counts, instead of requests piling up behind it
+                self.client = InstrumentedRedis(
+                    host=self.host,
+                    port=self.port,
+                    db=self.db,
+                    decode_responses=True,
+                    socket_timeout=settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+                    socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT_SECONDS,
+                    retry=Retry(NoBackoff(), 1)
+                )
             await self.client.ping()
+            self.client.guard = self.guard
             logger.info(f"Core-API successfully connected to Redis at {self.host}")
         except Exception as e:
             logger.error(f"--- CORE-API FAILED TO CONNECT TO REDIS: {e} ---")
             self.client = None
+            return
+
+        if self.replica_endpoints and not self.replicas:
+            if settings.REDIS_CLUSTER:
+                logger.warning("REDIS_REPLICAS is ignored with REDIS_CLUSTER.")
+                return
+            self.replicas = [Replica(host, port, self.db) for host, port in self.replica_endpoints]
+            await self.check_replicas()
 
     async def disconnect(self):
         """Closes connection on shutdown."""
+        if self._health_task:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        for replica in self.replicas:
+            await replica.client.close()
+        self.replicas = []
         if self.client:
             await self.client.close()
             logger.info("Core-API Redis connection closed.")
 
+    async def warm_up(self, connections: int):
+        """Opens pooled connections ahead of traffic: concurrent PINGs to the primary and every replica."""
+        clients = [self.client, *(replica.client for replica in self.replicas)]
+        results = await asyncio.gather(
+            *(client.ping() for client in clients if client for _ in range(connections)),
+            return_exceptions=True
+        )
+        failed = sum(isinstance(result, Exception) for result in results)
+        if failed:
+            logger.warning(f"{failed} of {len(results)} warmup connections to Redis failed.")
+
+    # --- Read replicas ---
+
+    async def start_replica_health_checks(self):
+        if self.replicas and self._health_task is None:
+            self._health_task = asyncio.create_task(self._run_health_checks())
+
+    async def _run_health_checks(self):
+        while True:
+            await asyncio.sleep(settings.REPLICA_HEALTH_CHECK_INTERVAL_SECONDS)
+            await self.check_replicas()
+
+    async def check_replicas(self):
+        """
+        A replica receives reads while its link to the primary is up and its replication offset
+        is at most REPLICA_MAX_LAG_BYTES behind the primary's (INFO replication on both).
+        """
+        try:
+            primary_offset = (await self.client.info("replication")).get("master_repl_offset")
+        except RedisUnavailable:
+            # Shed: the breaker has logged why already
+            primary_offset = None
+        except Exception as e:
+            logger.error(f"Error reading the primary's replication offset: {e}")
+            primary_offset = None
+
+        for replica in self.replicas:
+            try:
+                info = await replica.client.info("replication")
+            except Exception as e:
+                replica.set_healthy(False, str(e))
+                continue
+            lag = max(0, primary_offset - info.get("slave_repl_offset", 0)) if primary_offset is not None else 0
+            metrics.REPLICA_LAG_BYTES.labels(endpoint=replica.name).set(lag)
+            if info.get("role") != "slave" or info.get("master_link_status") != "up":
+                replica.set_healthy(False, f"role {info.get('role')}, link {info.get('master_link_status')}")
+            elif lag > settings.REPLICA_MAX_LAG_BYTES:
+                replica.set_healthy(False, f"{lag} bytes behind the primary")
+            else:
+                replica.set_healthy(True)
+
+    def note_write(self, short_id: str):
+        """Remembers a link this process just created: it is read from the primary for READ_YOUR_WRITES_SECONDS."""
+        if not (self.replicas and settings.READ_YOUR_WRITES_SECONDS):
+            return
+        now = time.monotonic()
+        self._recent_writes[short_id] = now
+        while self._recent_writes:
+            _, written_at = next(iter(self._recent_writes.items()))
+            if now - written_at <= settings.READ_YOUR_WRITES_SECONDS:
+                break
+            self._recent_writes.popitem(last=False)
+
+    def _pick_replica(self, short_id: str | None) -> Replica | None:
+        """The next healthy replica (round robin), or None to read from the primary."""
+        if not self.replicas:
+            return None
+        written_at = self._recent_writes.get(short_id) if short_id else None
+        if written_at is not None and time.monotonic() - written_at <= settings.READ_YOUR_WRITES_SECONDS:
+            return None
+        for _ in range(len(self.replicas)):
+            replica = self.replicas[self._next_replica % len(self.replicas)]
+            self._next_replica += 1
+            if replica.healthy:
+                return replica
+        return None
+
+    async def read(self, command: str, call, short_id: str | None = None, miss_on_primary: bool = False):
+        """
+        Runs a read-only call(client) on a healthy replica if there are any (REDIS_REPLICAS), else on the primary.
+        A replica that fails is taken out of the rotation and the read is repeated on the primary.
+        short_id: a link this process created a moment ago is read from the primary (read-your-writes).
+        miss_on_primary: a None from a replica is checked on the primary too (a link it hasn't received yet).
+        Latency is recorded per endpoint and command. Errors from the primary are raised.
+        """
+        replica = self._pick_replica(short_id)
+        if replica is not None:
+            try:
+                result = await self._timed(replica.name, command, call(replica.client))
+            except Exception as e:
+                metrics.REDIS_READ_ERRORS.labels(endpoint=replica.name).inc()
+                metrics.PRIMARY_FALLBACKS.labels(reason="error").inc()
+                replica.set_healthy(False, str(e))
+            else:
+                if result is not None or not (miss_on_primary and settings.READ_YOUR_WRITES_SECONDS):
+                    return result
+                metrics.PRIMARY_FALLBACKS.labels(reason="miss").inc()
+
+        client = await self.get_client()
+        try:
+            return await self._timed("primary", command, call(client))
+        except RedisUnavailable:
+            raise
+        except Exception:
+            metrics.REDIS_READ_ERRORS.labels(endpoint="primary").inc()
+            raise
+
+    @staticmethod
+    async def _timed(endpoint: str, command: str, awaitable):
+        started = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            metrics.REDIS_READ_SECONDS.labels(endpoint=endpoint, command=command).observe(time.perf_counter() - started)
+
     async def get_client(self):
-        """Returns the raw Redis client."""
+        """
+        Returns the raw Redis client. Raises RedisUnavailable while the circuit breaker is open
+        (breaker.py) or when Redis can't be reached; reconnecting is then left to one caller at a time.
+        """
+        guard = self.guard
+        if guard is not None and guard.rejecting():
+            raise RedisUnavailable("Redis circuit breaker is open", guard.retry_after())
         if self.client is None:
-            await self.connect()
+            if guard is None:
+                await self.connect()
+            else:
+                # A reconnect is a call like any other: limited, and the probe while half-open
+                probe = guard.admit()
+                started = time.perf_counter()
+                try:
+                    await self.connect()
+                finally:
+                    guard.release(probe, time.perf_counter() - started, self.client is None)
 
         if self.client is None:
-            raise Exception("Core-API could not connect to Redis")
+            raise RedisUnavailable("Core-API could not connect to Redis")
         return self.client
 
-    async def get_hash_all(self, hash_key: str) -> dict:
-        client = await self.get_client()
+    @timed_call
+    async def get_hash_all(self, hash_key: str, short_id: str | None = None) -> dict:
+        """HGETALL, from a replica when there are any (short_id: see read())."""
         try:
-            result = await client.hgetall(hash_key)
+            result = await self.read("HGETALL", lambda client: client.hgetall(hash_key), short_id)
             logger.info(f"Read hash '{hash_key}'.")
             return result
+        except RedisUnavailable:
+            raise
         except Exception as e:
             logger.error(f"Error reading hash '{hash_key}': {e}")
             return {}
 
-    async def get_top_members(self, set_key: str, count: int = 10) -> list:
+    @timed_call
+    async def set_hash_field(self, hash_key: str, field: str, value: str):
+        client = await self.get_client()
+        try:
+            await client.hset(hash_key, field, value)
+            logger.info(f"Set field '{field}' in hash '{hash_key}'.")
+        except RedisUnavailable:
+            raise
+        except Exception as e:
+            logger.error(f"Error setting hash field '{field}' for key '{hash_key}': {e}")
+
+    @timed_call
+    async def acquire_lock(self, key: str, ttl_ms: int) -> bool:
+        """
+        Simple cross-process lock (SET key 1 NX PX ttl).
+        Returns True if this caller now holds the lock.
+        """
+        client = await self.get_client()
+        try:
+            return bool(await client.set(key, "1", nx=True, px=ttl_ms))
+        except RedisUnavailable:
+            raise
+        except Exception as e:
+            logger.error(f"Error acquiring lock '{key}': {e}")
+            # Fail open: the caller proceeds as if it held the lock
+            return True
+
+    @timed_call
+    async def release_lock(self, key: str):
+        client = await self.get_client()
+        try:
+            await client.delete(key)
+        except RedisUnavailable:
+            raise
+        except Exception as e:
+            logger.error(f"Error releasing lock '{key}': {e}")
+
+    @timed_call
+    async def add_stream_events(self, stream_name: str, events: list[dict], maxlen: int):
+        """Appends many entries to a stream in one round trip (pipelined XADD ... MAXLEN ~)."""
+        client = await self.get_client()
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                for event in events:
+                    pipe.xadd(stream_name, event, maxlen=maxlen, approximate=True)
+                await pipe.execute()
+        except RedisUnavailable:
+            raise
+        except Exception as e:
+            logger.error(f"Error adding {len(events)} events to stream '{stream_name}': {e}")
+
+    @timed_call
+    async def get_consumer_lag(self, stream_name: str, group_name: str) -> int | None:
+        """
+        Returns how many stream entries the consumer group has not read yet (XINFO GROUPS).
+        Redis can't tell after entries were deleted past the group's position (XDEL): then it is the
+        stream length if the group is behind every entry left, else None (unknown, not 0).
+        """
         client = await self.get_client()
         try:
-            top_list = await client.zrevrange(set_key, 0, count - 1, withscores=True)
+            for group in await client.xinfo_groups(stream_name):
+                if group["name"] == group_name:
+                    if group.get("lag") is not None:
+                        return group["lag"]
+                    first = await client.xrange(stream_name, count=1)
+                    if not first:
+                        return 0
+                    if _stream_id(first[0][0]) > _stream_id(group["last-delivered-id"]):
+                        return await client.xlen(stream_name)
+                    return None
+            return 0
+        except ResponseError as e:
+            # Stream not created yet: nothing to lag behind
+            if "no such key" in str(e):
+                return 0
+            logger.error(f"Error reading consumer lag for '{stream_name}': {e}")
+            return None
+        except RedisUnavailable:
+            raise
+        except Exception as e:
+            logger.error(f"Error reading consumer lag for '{stream_name}': {e}")
+            return None
+
+    @timed_call
+    async def get_hashes(self, hash_keys: list) -> list[dict]:
+        """Reads many hashes in one round trip (pipelined HGETALL). Missing hashes come back empty."""
+        async def read_hashes(client):
+            async with client.pipeline(transaction=False) as pipe:
+                for hash_key in hash_keys:
+                    pipe.hgetall(hash_key)
+                return await pipe.execute()
+
+        try:
+            return await self.read("HGETALL", read_hashes)
+        except RedisUnavailable:
+            raise
+        except Exception as e:
+            logger.error(f"Error reading {len(hash_keys)} hashes: {e}")
+            return [{} for _ in hash_keys]
+
+    @timed_call
+    async def get_top_members(self, set_key: str, count: int = 10) -> list:
+        try:
+            top_list = await self.read(
+                "ZREVRANGE", lambda client: client.zrevrange(set_key, 0, count - 1, withscores=True)
+            )
             return top_list
+        except RedisUnavailable:
+            raise
         except Exception as e:
             logger.error(f"Error reading leaderboard '{set_key}': {e}")
             return []
 
+    @timed_call
     async def is_rate_limited(self, key: str, limit: int, window: int) -> bool:
         client = await self.get_client()
         try:
@@ -68,85 +481,148 @@ class RedisClient:
 
             if current_count > limit:
                 logger.warning(f"Rate limit exceeded for {key}: {current_count}/{limit}")
+                metrics.RATE_LIMIT_REJECTIONS.inc()
                 return True
 
             return False
+        except RedisUnavailable:
+            raise
         except Exception as e:
             logger.error(f"Error checking rate limit for '{key}': {e}")
             return False
 
-    async def get_cache(self, key: str) -> str | None:
-        client = await self.get_client()
+    @timed_call
+    async def get_cache(self, key: str, cache: str = "stats") -> str | None:
+        """GET, counted as a hit or miss of `cache` (CACHE_LOOKUPS)."""
         try:
-            val = await client.get(key)
+            val = await self.read("GET", lambda client: client.get(key))
             if val:
                 logger.info(f"Cache HIT for key: {key}")
             else:
                 logger.info(f"Cache MISS for key: {key}")
+            metrics.CACHE_LOOKUPS.labels(cache=cache, result="hit" if val else "miss").inc()
             return val
+        except RedisUnavailable:
+            raise
         except Exception as e:
             logger.error(f"Error getting cache for {key}: {e}")
+            metrics.CACHE_LOOKUPS.labels(cache=cache, result="error").inc()
             return None
 
+    @timed_call
     async def set_cache(self, key: str, value: str, ttl: int):
         client = await self.get_client()
         try:
             await client.setex(key, ttl, value)
             logger.info(f"Cache SET for key: {key} (TTL: {ttl}s)")
+        except RedisUnavailable:
+            raise
         except Exception as e:
             logger.error(f"Error setting cache for {key}: {e}")
 
+    @timed_call
     async def get_timeseries_range(self, key: str, start_timestamp: str = "-", end_timestamp: str = "+") -> list:
         """
         Retrieves data points from a TimeSeries (TS.RANGE).
         start_timestamp: '-' means oldest possible.
         end_timestamp: '+' means newest possible.
         """
-        client = await self.get_client()
         try:
             # TS.RANGE key fromTimestamp toTimestamp
             # returns list of tuples: [(timestamp, value), ...]
-            data = await client.ts().range(key, from_time=start_timestamp, to_time=end_timestamp)
+            data = await self.read(
+                "TS.RANGE", lambda client: client.ts().range(key, from_time=start_timestamp, to_time=end_timestamp)
+            )
             return data
+        except RedisUnavailable:
+            raise
         except Exception as e:
             logger.error(f"Error reading TimeSeries '{key}': {e}")
             return []
 
-    async def count_hyperloglog(self, key: str) -> int:
+    @timed_call
+    async def count_hyperloglog(self, *keys: str) -> int:
         """
         Returns the approximated number of unique elements in a HyperLogLog (PFCOUNT).
+        With several keys, returns the cardinality of their union.
+        """
+        try:
+            # PFCOUNT key [key ...]
+            count = await self.read("PFCOUNT", lambda client: client.pfcount(*keys))
+            return count
+        except RedisUnavailable:
+            raise
+        except Exception as e:
+            logger.error(f"Error counting HyperLogLog '{keys[0]}': {e}")
+            return 0
+
+    @timed_call
+    async def count_hyperloglog_merged(self, merged_key: str, keys: list, ttl: int) -> int:
+        """
+        Union cardinality of many HyperLogLogs via a cached PFMERGE.
+        The merged HLL is reused for `ttl` seconds, so repeated queries cost a single PFCOUNT.
         """
         client = await self.get_client()
         try:
-            # PFCOUNT key
-            count = await client.pfcount(key)
+            if await client.exists(merged_key):
+                return await client.pfcount(merged_key)
+
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.pfmerge(merged_key, *keys)
+                pipe.expire(merged_key, ttl)
+                pipe.pfcount(merged_key)
+                _, _, count = await pipe.execute()
             return count
+        except RedisUnavailable:
+            raise
         except Exception as e:
-            logger.error(f"Error counting HyperLogLog '{key}': {e}")
+            logger.error(f"Error merging HyperLogLogs into '{merged_key}': {e}")
             return 0
-    async def check_bloom_filter(self, key: str, item: str) -> bool:
+
+    @timed_call
+    async def check_bloom_filter(self, key: str, item: str, client=None) -> bool:
         """
         Checks if an item exists in a Bloom Filter (BF.EXISTS).
         Returns True if item MIGHT exist.
         Returns False if item DEFINITELY does not exist.
+        client: the replica or primary to ask (default: the primary).
         """
-        client = await self.get_client()
+        client = client or await self.get_client()
         try:
             # BF.EXISTS key item
             exists = await client.bf().exists(key, item)
             # The result is 1 (True) or 0 (False)
             if exists:
                 logger.info(f"BloomFilter: '{item}' MIGHT exist in '{key}'.")
+                metrics.BLOOM_CHECKS.labels(result="positive").inc()
                 return True
             else:
                 logger.info(f"BloomFilter: '{item}' DEFINITELY does not exist in '{key}'.")
+                metrics.BLOOM_CHECKS.labels(result="negative").inc()
                 return False
+        except RedisUnavailable:
+            raise
         except Exception as e:
             logger.error(f"Error checking BloomFilter '{key}': {e}")
+            metrics.BLOOM_CHECKS.labels(result="error").inc()
             # Fail open: If Redis fails, return True to allow DB check (safety fallback)
             return True
-redis_client = RedisClient(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=0)
+redis_client = RedisClient(
+    host=settings.REDIS_HOST,
+    port=settings.REDIS_PORT,
+    db=0,
+    replicas=parse_endpoints(settings.REDIS_REPLICAS),
+    guard=redis_guard
+)
 
 
 async def get_redis_db():
-    return await redis_client.get_client()
\ No newline at end of file
+    return await redis_client.get_client()
+
+
+async def get_redis_db_or_none():
+    """For endpoints that can still answer without Redis (redirects from the hot link cache and the snapshot)."""
+    try:
+        return await redis_client.get_client()
+    except Exception:
+        return None
\ No newline at end of file
@@ -0,0 +1,56 @@
+"""
+Per-process cache of the most requested links (HOT_LINK_CACHE_SIZE, off when 0).
+
+Redirects of popular links are answered from memory for HOT_LINK_CACHE_TTL_SECONDS, so an expired
+link can keep redirecting for up to that long. Prefilled from the leaderboard at startup (main.py).
+"""
+import time
+from collections import Counter, OrderedDict
+from .config import settings
+
+
+class HotLinkCache:
+    """LRU of short_id -> (long URL, cached at)."""
+
+    def __init__(self, size: int, ttl_seconds: float):
+        self.size = size
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        # Hits per short_id since the last snapshot tick, which moves them to Redis (snapshot.py)
+        self._served: Counter[str] = Counter()
+
+    def get(self, short_id: str) -> str | None:
+        entry = self._entries.get(short_id)
+        if entry is None:
+            return None
+        long_url, cached_at = entry
+        if time.monotonic() - cached_at > self.ttl_seconds:
+            del self._entries[short_id]
+            return None
+        self._entries.move_to_end(short_id)
+        self._served[short_id] += 1
+        return long_url
+
+    def put(self, short_id: str, long_url: str):
+        if self.size <= 0:
+            return
+        self._entries[short_id] = (long_url, time.monotonic())
+        self._entries.move_to_end(short_id)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def take_served(self, count: int) -> list[tuple[str, int]]:
+        """The `count` most served links and their hits since the last call; the rest is dropped."""
+        served = self._served.most_common(count)
+        self._served.clear()
+        return served
+
+    def clear(self):
+        self._entries.clear()
+        self._served.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+hot_links = HotLinkCache(settings.HOT_LINK_CACHE_SIZE, settings.HOT_LINK_CACHE_TTL_SECONDS)
@@ -0,0 +1,99 @@
+"""
+Redis key schema, shared with the worker (worker/app/keys.py must build the same names).
+
+Per-link keys embed the short_id. With REDIS_CLUSTER it is wrapped in a hash tag, link:{abc123},
+so every key of a link hashes to the same slot and can share a pipeline, MULTI or Function call.
+
+Global structures (leaderboard, Bloom filter, streams) can be split into shards so they don't
+all land on one node: shard n of a structure is "<name>:{n}" and a link always maps to the same
+shard (crc32 of its ID). With one shard the plain name is used, as before.
+"""
+import zlib
+from .config import settings
+
+
+def tag(short_id: str) -> str:
+    return f"{{{short_id}}}" if settings.REDIS_CLUSTER else short_id
+
+
+def short_id_from_key(key: str) -> str:
+    """link:abc123 or link:{abc123} -> abc123 (the part after the first ':')."""
+    return key.split(":", 1)[1].split(":", 1)[0].strip("{}")
+
+
+# --- Per-link keys ---
+
+def link(short_id: str) -> str:
+    return f"link:{tag(short_id)}"
+
+
+def data(short_id: str) -> str:
+    return f"{settings.DATA_HASH_KEY_PREFIX}:{tag(short_id)}"
+
+
+def unique_visitors(short_id: str) -> str:
+    return f"uv:{tag(short_id)}"
+
+
+def unique_visitors_day(short_id: str, day: str) -> str:
+    """day: YYYYMMDD (UTC)."""
+    return f"uv:{tag(short_id)}:d:{day}"
+
+
+def unique_visitors_hour(short_id: str, hour: str) -> str:
+    """hour: YYYYMMDDHH (UTC)."""
+    return f"uv:{tag(short_id)}:h:{hour}"
+
+
+def clicks_timeseries(short_id: str) -> str:
+    return f"ts:clicks:{tag(short_id)}"
+
+
+def breakdown(short_id: str, dimension: str, day: str) -> str:
+    return f"bd:{tag(short_id)}:{dimension}:{day}"
+
+
+def stats_cache(short_id: str) -> str:
+    return f"cache:stats:{tag(short_id)}"
+
+
+def merged_unique_visitors_cache(short_id: str, window: str, newest_bucket: str) -> str:
+    return f"cache:uv:{tag(short_id)}:{window}:{newest_bucket}"
+
+
+# --- Sharded global structures ---
+
+def shard_index(short_id: str, shards: int) -> int:
+    return zlib.crc32(short_id.encode()) % shards if shards > 1 else 0
+
+
+def shard(name: str, index: int, shards: int) -> str:
+    return f"{name}:{{{index}}}" if shards > 1 else name
+
+
+def shards_of(name: str, shards: int) -> list[str]:
+    return [shard(name, index, shards) for index in range(shards)]
+
+
+def leaderboard(short_id: str) -> str:
+    return shard(settings.LEADERBOARD_KEY, shard_index(short_id, settings.LEADERBOARD_SHARDS), settings.LEADERBOARD_SHARDS)
+
+
+def leaderboards() -> list[str]:
+    return shards_of(settings.LEADERBOARD_KEY, settings.LEADERBOARD_SHARDS)
+
+
+def bloom_filter(short_id: str) -> str:
+    return shard(settings.BLOOM_FILTER_KEY, shard_index(short_id, settings.BLOOM_SHARDS), settings.BLOOM_SHARDS)
+
+
+def bloom_filters() -> list[str]:
+    return shards_of(settings.BLOOM_FILTER_KEY, settings.BLOOM_SHARDS)
+
+
+def stream(name: str, short_id: str) -> str:
+    return shard(name, shard_index(short_id, settings.STREAM_SHARDS), settings.STREAM_SHARDS)
+
+
+def streams(name: str) -> list[str]:
+    return shards_of(name, settings.STREAM_SHARDS)
@@ -0,0 +1,124 @@
+"""
+Moves existing links between storage layouts (see storage.py).
+
+Usage:
+    python -m app.link_migration --to bucketed [--batch 1000] [--dry-run] [--keep-source]
+    python -m app.link_migration --to string   [--batch 1000] [--dry-run] [--keep-source]
+
+Run it with LINK_STORAGE already switched to the target layout (and LINK_STORAGE_FALLBACK on):
+every link is written to its new place before the old copy is removed, so lookups keep
+working while it runs. Remaining TTLs are carried over.
+"""
+import argparse
+import asyncio
+import time
+from .database import redis_client
+from .config import logger
+from .storage import BUCKET_KEY_PREFIX, BucketedLinkStore, get_link_store
+from . import keys
+
+
+async def _used_memory(client) -> int:
+    return (await client.info("memory"))["used_memory"]
+
+
+async def to_bucketed(client, store: BucketedLinkStore, batch: int, dry_run: bool, keep_source: bool) -> int:
+    migrated = 0
+    batch_keys = []
+
+    async def flush():
+        nonlocal migrated
+        async with client.pipeline(transaction=False) as pipe:
+            for key in batch_keys:
+                pipe.get(key)
+                pipe.pttl(key)
+            replies = await pipe.execute()
+
+        async with client.pipeline(transaction=False) as pipe:
+            moved = []
+            for i, key in enumerate(batch_keys):
+                long_url, ttl_ms = replies[2 * i], replies[2 * i + 1]
+                # Expired (or deleted) since SCAN returned it
+                if long_url is None or ttl_ms == -2:
+                    continue
+                bucket, field = store.locate(keys.short_id_from_key(key))
+                pipe.hset(bucket, field, long_url)
+                if ttl_ms > 0:
+                    pipe.execute_command("HPEXPIRE", bucket, ttl_ms, "FIELDS", 1, field)
+                moved.append(key)
+            if not dry_run:
+                await pipe.execute()
+                # Old copies go only after the new ones are written
+                if moved and not keep_source:
+                    await client.unlink(*moved)
+        migrated += len(moved)
+        batch_keys.clear()
+
+    async for key in client.scan_iter(match="link:*", count=batch):
+        batch_keys.append(key)
+        if len(batch_keys) >= batch:
+            await flush()
+            logger.info(f"{migrated} links migrated...")
+    if batch_keys:
+        await flush()
+    return migrated
+
+
+async def to_string(client, store: BucketedLinkStore, batch: int, dry_run: bool, keep_source: bool) -> int:
+    migrated = buckets = 0
+    async for bucket in client.scan_iter(match=f"{BUCKET_KEY_PREFIX}:*", count=batch):
+        buckets += 1
+        links = await client.hgetall(bucket)
+        if not links:
+            continue
+        fields = list(links)
+        # HPTTL key FIELDS numfields field [field ...] -> ms left per field (-1 = no TTL, -2 = gone)
+        ttls = await client.execute_command("HPTTL", bucket, "FIELDS", len(fields), *fields)
+        prefix = bucket.split(":", 1)[1]
+
+        async with client.pipeline(transaction=False) as pipe:
+            moved = []
+            for field, ttl_ms in zip(fields, ttls):
+                if ttl_ms == -2:
+                    continue
+                pipe.set(keys.link(prefix + field), links[field], px=ttl_ms if ttl_ms > 0 else None)
+                moved.append(field)
+            if not dry_run:
+                await pipe.execute()
+                # Only the migrated fields: links created meanwhile stay in the bucket
+                if moved and not keep_source:
+                    await client.hdel(bucket, *moved)
+        migrated += len(moved)
+        if buckets % batch == 0:
+            logger.info(f"{migrated} links migrated ({buckets} buckets)...")
+    return migrated
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Migrate links between the string and bucketed layouts.")
+    parser.add_argument("--to", choices=["bucketed", "string"], required=True)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="Read and count, write nothing")
+    parser.add_argument("--keep-source", action="store_true", help="Leave the old copies in place")
+    args = parser.parse_args()
+
+    await redis_client.connect()
+    client = await redis_client.get_client()
+    # The bucket layout (prefix length) comes from the settings either way
+    store = get_link_store("bucketed")
+    try:
+        memory_before = await _used_memory(client)
+        started = time.monotonic()
+        migrate = to_bucketed if args.to == "bucketed" else to_string
+        migrated = await migrate(client, store, args.batch, args.dry_run, args.keep_source)
+        elapsed = time.monotonic() - started
+        memory_after = await _used_memory(client)
+
+        print(f"{migrated} links {'would be ' if args.dry_run else ''}migrated to '{args.to}' in {elapsed:.1f}s.")
+        print(f"used_memory: {memory_before} -> {memory_after} bytes ({memory_after - memory_before:+d}).")
+    finally:
+        await redis_client.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
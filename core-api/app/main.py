@@ -1,9 +1,18 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from prometheus_fastapi_instrumentator import Instrumentator
 from .database import redis_client
-from .routers import links
-from .config import settings
+from .breaker import RedisUnavailable
+from .backpressure import click_backpressure
+from .storage import check_bucket_encoding
+from .url_codec import load_current_dictionary
+from .bloom import ensure_bloom_filter
+from .routers import admin, links
+from .crud import prefill_hot_links
+from .loopmon import loop_monitor
+from .snapshot import link_snapshot
+from .config import settings, logger
 from .tracing import setup_tracing  # <-- 1. Import tracing setup
 
 app = FastAPI(
@@ -25,18 +34,68 @@ instrumentator = Instrumentator().instrument(app)
 instrumentator.expose(app)
 
 # --- Startup & Shutdown ---
+# Set once this process has warmed up; uvicorn only accepts connections after startup anyway,
+# /health/ready tells load balancers the same (and turns false again while shutting down)
+app.state.ready = False
+
 @app.on_event("startup")
 async def startup_app():
+    # Loop lag histogram and stack dumps of blocking calls (the warmup's included)
+    await loop_monitor.start()
+    # Hottest links from disk: warms the hot link cache and serves redirects while Redis is down
+    if settings.SNAPSHOT_PATH and link_snapshot.load(settings.SNAPSHOT_PATH):
+        logger.info(f"Link snapshot loaded with {link_snapshot.count} links.")
+    # Every process (python -m app.serve runs several) warms up its own pools and caches
     await redis_client.connect()
+    if redis_client.client:
+        await redis_client.warm_up(settings.REDIS_WARM_CONNECTIONS)
+        await check_bucket_encoding(redis_client.client)
+        await load_current_dictionary(redis_client.client)
+        await ensure_bloom_filter(redis_client.client)
+    hot = await prefill_hot_links(redis_client.client, settings.HOT_LINK_CACHE_PREFILL)
+    if hot:
+        logger.info(f"Hot link cache prefilled with {hot} links.")
+    # Keeps lagging or unreachable read replicas (REDIS_REPLICAS) out of the rotation
+    await redis_client.start_replica_health_checks()
+    # Watch analytics consumer lag to degrade click tracking under backpressure
+    await click_backpressure.start()
+    await link_snapshot.start()
+    # Without Redis, a snapshot still lets this process answer the hottest redirects
+    app.state.ready = redis_client.client is not None or link_snapshot.count > 0
 
 @app.on_event("shutdown")
 async def shutdown_app():
+    app.state.ready = False
+    # Flush buffered clicks before the connection goes away
+    await click_backpressure.stop()
+    await link_snapshot.stop()
+    await loop_monitor.stop()
     await redis_client.disconnect()
 
+# Redis calls shed by the circuit breaker or the concurrency limit (breaker.py): fail fast, retry later
+@app.exception_handler(RedisUnavailable)
+async def redis_unavailable_handler(request: Request, exc: RedisUnavailable):
+    return JSONResponse(
+        {"detail": "Service temporarily unavailable, please retry."},
+        status_code=503,
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 # --- Routers & Mounts ---
+app.include_router(admin.router)
 app.include_router(links.router)
 app.mount("/media", StaticFiles(directory=settings.MEDIA_PATH), name="media")
 
 @app.get("/")
 def read_root():
-    return {"message": "Core API (v2) is running!"}
\ No newline at end of file
+    return {"message": "Core API (v2) is running!"}
+
+@app.get("/health/ready")
+def readiness():
+    """
+    200 once this process has warmed up and connected to Redis (or loaded a link snapshot),
+    503 before that and while shutting down.
+    """
+    if not app.state.ready:
+        return JSONResponse({"ready": False}, status_code=503)
+    return {"ready": True}
\ No newline at end of file
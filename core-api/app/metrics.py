@@ -0,0 +1,150 @@
+"""
+Prometheus metrics of core-api besides the HTTP ones (all exposed on /metrics by the Instrumentator).
+"""
+import time
+from contextlib import contextmanager
+from prometheus_client import Counter, Gauge, Histogram
+
+# Redis round trips: from 200µs to a second
+REDIS_BUCKETS = (0.0002, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+# --- Redis latency (database.py) ---
+# Labels stay low-cardinality: command names and call sites are fixed sets, keys are never used.
+# command: every command sent outside a pipeline (GET, BF.EXISTS, XADD, TS.RANGE...)
+REDIS_COMMAND_SECONDS = Histogram(
+    "core_api_redis_command_seconds",
+    "Latency of single Redis commands (pipelines are timed per call site)",
+    ["command"],
+    buckets=REDIS_BUCKETS
+)
+# call_site: a RedisClient method or crud operation, whatever commands and pipelines it uses
+REDIS_CALL_SECONDS = Histogram(
+    "core_api_redis_call_seconds",
+    "Latency of Redis work per call site",
+    ["call_site"],
+    buckets=REDIS_BUCKETS
+)
+# endpoint: "primary" or the replica's host:port
+REDIS_READ_SECONDS = Histogram(
+    "core_api_redis_read_seconds",
+    "Latency of routed Redis reads, per endpoint and command",
+    ["endpoint", "command"],
+    buckets=REDIS_BUCKETS
+)
+REDIS_READ_ERRORS = Counter(
+    "core_api_redis_read_errors_total",
+    "Routed Redis reads that failed, per endpoint",
+    ["endpoint"]
+)
+# reason: "error" (the replica failed) or "miss" (read-your-writes: the replica didn't have the link)
+PRIMARY_FALLBACKS = Counter(
+    "core_api_redis_primary_fallbacks_total",
+    "Replica reads repeated on the primary",
+    ["reason"]
+)
+REPLICA_HEALTHY = Gauge(
+    "core_api_redis_replica_healthy",
+    "1 while the replica receives reads, 0 while it is skipped",
+    ["endpoint"],
+    # With several processes (app.serve): 0 if any of them skips it
+    multiprocess_mode="min"
+)
+REPLICA_LAG_BYTES = Gauge(
+    "core_api_redis_replica_lag_bytes",
+    "How far the replica's replication offset is behind the primary's",
+    ["endpoint"],
+    multiprocess_mode="max"
+)
+
+# --- Load shedding (breaker.py) ---
+REDIS_BREAKER_STATE = Gauge(
+    "core_api_redis_breaker_state",
+    "Circuit breaker in front of the Redis primary: 0 closed, 1 half-open, 2 open",
+    # With several processes: the most open one
+    multiprocess_mode="max"
+)
+# state: the one entered
+REDIS_BREAKER_TRANSITIONS = Counter(
+    "core_api_redis_breaker_transitions_total",
+    "Circuit breaker state changes",
+    ["state"]
+)
+REDIS_CONCURRENCY_LIMIT = Gauge(
+    "core_api_redis_concurrency_limit",
+    "Adaptive limit of Redis commands and pipelines in flight per process (0 = no limit)",
+    multiprocess_mode="min"
+)
+REDIS_INFLIGHT = Gauge(
+    "core_api_redis_inflight",
+    "Redis commands and pipelines in flight",
+    multiprocess_mode="livesum"
+)
+# reason: "open" (circuit breaker) or "limit" (concurrency limit reached)
+REDIS_SHED = Counter(
+    "core_api_redis_shed_total",
+    "Redis calls failed fast instead of being sent",
+    ["reason"]
+)
+# reason: "open" (breaker not closed) or "load" (Redis busy beyond REDIS_LIMIT_CLICK_SHARE)
+CLICKS_SHED = Counter(
+    "core_api_clicks_shed_total",
+    "Clicks not tracked to spare Redis",
+    ["reason"]
+)
+
+# --- Cache and filter efficiency ---
+# cache: "stats" (cache:stats:* in Redis) or "hot_links" (in-process); result: hit, miss or error
+CACHE_LOOKUPS = Counter(
+    "core_api_cache_lookups_total",
+    "Cache lookups by cache and result",
+    ["cache", "result"]
+)
+# result: "negative" (lookup skipped), "positive" or "error" (failed open)
+BLOOM_CHECKS = Counter(
+    "core_api_bloom_checks_total",
+    "Bloom filter checks before link lookups",
+    ["result"]
+)
+# Not only false positives: expired and deleted links stay in the filter, and a replica may lag behind
+BLOOM_PASS_MISSES = Counter(
+    "core_api_bloom_pass_misses_total",
+    "Link lookups the Bloom filter let through that found no link"
+)
+RATE_LIMIT_REJECTIONS = Counter(
+    "core_api_rate_limit_rejections_total",
+    "Requests rejected by the per-IP rate limit"
+)
+
+# --- Hot link snapshot (snapshot.py) ---
+SNAPSHOT_LINKS = Gauge(
+    "core_api_link_snapshot_links",
+    "Links in the mapped snapshot file",
+    # With several processes: the one with the oldest (or no) snapshot
+    multiprocess_mode="min"
+)
+# result: "hit" (redirect served from the snapshot) or "miss" (not in it: the error stands)
+SNAPSHOT_FALLBACKS = Counter(
+    "core_api_link_snapshot_fallbacks_total",
+    "Redirects looked up in the snapshot because Redis failed",
+    ["result"]
+)
+
+# --- Event loop (loopmon.py) ---
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "core_api_event_loop_lag_seconds",
+    "How late the event loop runs a callback that is due",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+EVENT_LOOP_STALLS = Counter(
+    "core_api_event_loop_stalls_total",
+    "Times the event loop was blocked for longer than LOOP_STALL_THRESHOLD_SECONDS"
+)
+
+
+@contextmanager
+def redis_call(call_site: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        REDIS_CALL_SECONDS.labels(call_site=call_site).observe(time.perf_counter() - started)
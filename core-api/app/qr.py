@@ -0,0 +1,78 @@
+import asyncio
+import os
+import qrcode
+from .config import settings, logger
+from .database import redis_client
+from . import keys
+
+# In-flight renders for this process: short_id -> Task
+# Concurrent first requests await the same task instead of rendering again.
+_inflight: dict[str, asyncio.Task] = {}
+
+
+def qr_file_path(short_id: str) -> str:
+    return os.path.join(settings.MEDIA_PATH, f"{short_id}.png")
+
+
+def qr_web_path(short_id: str) -> str:
+    return f"/media/{short_id}.png"
+
+
+def _render_to_disk(short_id: str, long_url: str):
+    """
+    Renders the QR image (CPU bound, runs in a thread).
+    Writes to a temp file and renames it, so readers never see a half-written PNG.
+    """
+    final_path = qr_file_path(short_id)
+    tmp_path = f"{final_path}.{os.getpid()}.tmp"
+
+    img = qrcode.make(long_url)
+    img.save(tmp_path, format="PNG")
+    os.replace(tmp_path, final_path)
+
+
+async def _render(short_id: str, long_url: str) -> str:
+    save_path = qr_file_path(short_id)
+    lock_key = f"lock:qr:{short_id}"
+
+    # 1. Cross-process dedup: only one replica renders, the others wait for the file
+    got_lock = await redis_client.acquire_lock(lock_key, settings.QR_RENDER_LOCK_MS)
+    if not got_lock:
+        deadline = asyncio.get_running_loop().time() + settings.QR_RENDER_LOCK_MS / 1000
+        while asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.05)
+            if os.path.exists(save_path):
+                return save_path
+        # Lock holder died or is too slow: render it ourselves
+        logger.warning(f"QR render lock for {short_id} timed out, rendering locally.")
+
+    try:
+        # 2. Render off the event loop
+        await asyncio.to_thread(_render_to_disk, short_id, long_url)
+
+        # 3. Save path to Redis Hash (same field the worker uses in eager mode)
+        await redis_client.set_hash_field(keys.data(short_id), "qr_code_path", qr_web_path(short_id))
+        logger.info(f"QR code rendered on demand for {short_id}")
+        return save_path
+    finally:
+        if got_lock:
+            await redis_client.release_lock(lock_key)
+
+
+async def ensure_qr_code(short_id: str, long_url: str) -> str:
+    """
+    Returns the on-disk path of the QR image for short_id, rendering it first if needed.
+    Concurrent callers for the same short_id share a single render.
+    """
+    save_path = qr_file_path(short_id)
+    if os.path.exists(save_path):
+        return save_path
+
+    task = _inflight.get(short_id)
+    if task is None:
+        task = asyncio.create_task(_render(short_id, long_url))
+        _inflight[short_id] = task
+        task.add_done_callback(lambda _: _inflight.pop(short_id, None))
+
+    # shield: a cancelled request must not cancel the render other requests wait on
+    return await asyncio.shield(task)
@@ -0,0 +1,36 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response
+
+from .. import profiler
+
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"],
+    include_in_schema=False
+)
+
+
+@router.get("/profile")
+async def profile_endpoint(request: Request):
+    """
+    Samples this server process's stacks for `seconds` and returns them (see profiler.py).
+    Query: seconds, mode (wall|cpu), format (collapsed|speedscope), interval_ms.
+    Needs `Authorization: Bearer <PROFILER_TOKEN>`; without a PROFILER_TOKEN the endpoint doesn't exist.
+    With several server processes (app.serve), the one that accepted the connection is profiled.
+    """
+    if not profiler.authorized(request.headers.get("Authorization")):
+        # Indistinguishable from a missing route unless the caller has the token
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    options, error = profiler.parse_request(dict(request.query_params))
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+    busy = profiler.reserve()
+    if busy:
+        raise HTTPException(status_code=429, detail=busy)
+    try:
+        content_type, body = await profiler.run(**options, name="core-api")
+    finally:
+        profiler.release()
+    return Response(content=body, media_type=content_type)
@@ -1,11 +1,12 @@
 import redis.asyncio as redis
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request
-from fastapi.responses import RedirectResponse
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request, Query
+from fastapi.responses import RedirectResponse, FileResponse
 from typing import List # Import List for response model
+from datetime import datetime, timedelta, timezone
 
-from .. import schemas, crud
+from .. import schemas, crud, qr
 from ..config import settings
-from ..database import get_redis_db, redis_client
+from ..database import get_redis_db, get_redis_db_or_none, redis_client
 from ..auth import get_current_user_id
 
 
@@ -23,6 +24,7 @@ async def create_link_endpoint(
 ):
     """
     Create a new short link.
+    Optional expires_in (seconds): the link stops resolving after it and its data is cleaned up.
     Rate Limited: 5 requests per minute per IP.
     """
 
@@ -42,13 +44,18 @@ async def create_link_endpoint(
     # --- End Rate Limiting ---
 
     # Convert HttpUrl to string for Redis compatibility
-    short_id = await crud.create_short_link(db, str(link_request.long_url))
+    short_id = await crud.create_short_link(db, str(link_request.long_url), link_request.expires_in)
 
     short_link = f"{settings.BASE_URL}/{short_id}"
 
+    expires_at = None
+    if link_request.expires_in:
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=link_request.expires_in)
+
     return schemas.LinkCreateResponse(
         short_link=short_link,
-        long_url=link_request.long_url
+        long_url=link_request.long_url,
+        expires_at=expires_at
     )
 
 
@@ -57,35 +64,75 @@ async def redirect_endpoint(
         request: Request,  # <-- 1. Need Request object to get IP
         short_id: str,
         background_tasks: BackgroundTasks,
-        db: redis.Redis = Depends(get_redis_db)
+        db: redis.Redis | None = Depends(get_redis_db_or_none)
 ):
     """
     Redirect user to the original URL.
     Tracks the click (and IP) in the background.
+    Without Redis, links in the snapshot file still redirect (untracked).
     """
-    long_url = await crud.get_long_url(db, short_id)
+    long_url, source = await crud.resolve_long_url(db, short_id)
 
+    if long_url and (db is None or source == "snapshot"):
+        # Redis just failed us: tracking the click would only pile more work onto it
+        return RedirectResponse(url=long_url, status_code=307)
     if long_url:
         # Get Client IP
         client_ip = request.client.host
 
-        # 2. Pass IP to the tracking function
-        background_tasks.add_task(crud.track_link_click, db, short_id, client_ip)
+        # 2. Pass IP (and raw headers for the worker's breakdowns) to the tracking function
+        background_tasks.add_task(
+            crud.track_link_click, db, short_id, client_ip,
+            request.headers.get("referer", ""),
+            request.headers.get("user-agent", ""),
+            request.headers.get("accept-language", "")
+        )
 
         return RedirectResponse(url=long_url, status_code=307)
     else:
         raise HTTPException(status_code=404, detail="Short link not found")
 
 
+@router.get("/{short_id}/qr")
+async def get_qr_code_endpoint(
+        short_id: str,
+        db: redis.Redis = Depends(get_redis_db)
+):
+    """
+    Serve the QR code image for a link.
+    In lazy mode the image is rendered on the first request and cached on disk.
+    """
+    long_url = await crud.get_long_url(db, short_id)
+    if not long_url:
+        raise HTTPException(status_code=404, detail="Short link not found")
+
+    path = await qr.ensure_qr_code(short_id, long_url)
+
+    # The image for a short_id never changes, so clients and proxies may cache it
+    return FileResponse(
+        path,
+        media_type="image/png",
+        headers={"Cache-Control": f"public, max-age={settings.QR_CACHE_MAX_AGE}, immutable"}
+    )
+
+
 @router.get("/{short_id}/stats", response_model=schemas.LinkStats)
 async def get_link_stats_endpoint(
         short_id: str,
+        window: str | None = Query(default=None, pattern=r"^\d+[hd]$", description="e.g. 24h, 7d"),
         db: redis.Redis = Depends(get_redis_db)
 ):
     """
     Get full statistics for a link (including QR code path).
+    With ?window=24h (or 7d, 30d...) unique visitors in that window are included.
     """
-    stats = await crud.get_link_stats(db, short_id)
+    if window:
+        try:
+            crud.window_to_hours(window)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    stats = await crud.get_link_stats(db, short_id, window)
 
     if not stats:
         raise HTTPException(status_code=404, detail="Link stats not found")
@@ -93,6 +140,28 @@ async def get_link_stats_endpoint(
     return stats
 
 
+@router.get("/{short_id}/stats/breakdown", response_model=schemas.LinkBreakdown)
+async def get_link_breakdown_endpoint(
+        short_id: str,
+        days: int = Query(default=7, ge=1, le=settings.BREAKDOWN_MAX_DAYS),
+        dimension: str | None = Query(default=None, description="referrer, country or device"),
+        db: redis.Redis = Depends(get_redis_db)
+):
+    """
+    Get clicks per referrer, country and device for the last `days` days.
+    Served from per-day counters the worker maintains, so no raw data is scanned.
+    """
+    if dimension is not None and dimension not in crud.BREAKDOWN_DIMENSIONS:
+        raise HTTPException(status_code=400, detail=f"Unknown dimension '{dimension}'")
+
+    long_url = await crud.get_long_url(db, short_id)
+    if not long_url:
+        raise HTTPException(status_code=404, detail="Short link not found")
+
+    dimensions = (dimension,) if dimension else crud.BREAKDOWN_DIMENSIONS
+    return await crud.get_link_breakdown(short_id, days, dimensions)
+
+
 @router.get("/stats/top", response_model=list)
 async def get_top_links_endpoint(
         limit: int = 10,
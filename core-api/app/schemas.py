@@ -1,24 +1,39 @@
+from datetime import datetime
 from pydantic import BaseModel, HttpUrl, Field
+from .config import settings
 
 # --- Link Models ---
 
 # User input for creating a link
 class LinkCreateRequest(BaseModel):
     long_url: HttpUrl
+    # Optional lifetime in seconds; the link (and all its data) is removed after it
+    expires_in: int | None = Field(default=None, gt=0, le=settings.LINK_MAX_TTL_SECONDS)
 
 # Response when a link is created
 class LinkCreateResponse(BaseModel):
     short_link: HttpUrl
     long_url: HttpUrl
+    expires_at: datetime | None = None
 
 # Response for link stats (including QR Code)
 class LinkStats(LinkCreateResponse):
     # Optional field, as worker might not have generated it yet
     qr_code_url: str | None = Field(default=None)
     unique_clicks: int = 0
+    # Set when stats are requested for a time window (e.g. ?window=24h)
+    window: str | None = None
+    window_unique_clicks: int | None = None
 
 # VVV --- Phase 8: New Schema for History --- VVV
 class ClickHistoryItem(BaseModel):
     timestamp: int
     count: int
-# ^^^ --- End of new schema --- ^^^
\ No newline at end of file
+# ^^^ --- End of new schema --- ^^^
+
+# Clicks per referrer / country / device over the last `days` days
+class LinkBreakdown(BaseModel):
+    short_id: str
+    days: int
+    total_clicks: int = 0
+    dimensions: dict[str, dict[str, int]]
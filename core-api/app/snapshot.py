@@ -0,0 +1,227 @@
+"""
+On-disk snapshot of the hottest links (SNAPSHOT_PATH, off when empty).
+
+Every SNAPSHOT_INTERVAL_SECONDS one process (Redis lock) writes the top SNAPSHOT_LINKS links of the
+leaderboard, plus the links the processes' hot caches served most, to a file that every process maps
+read-only. Hot cache hits never reach Redis otherwise, so every process adds its own to SNAPSHOT_SERVED_KEY
+each interval. It is what a new process warms its hot link cache from, and what redirects fall back to
+while Redis is unreachable (crud.get_long_url).
+
+Layout (little endian):
+    header   magic "CAHL", version u16, 2 padding bytes, count u32, created_at u64
+    index    count x (short_id 16 bytes NUL-padded, expires_at u64 (0 = never), offset u32, length u32,
+             rank u32), sorted by short_id for binary search
+    data     the UTF-8 long URLs, at offset (from the start of the file) / length
+"""
+import asyncio
+import mmap
+import os
+import struct
+import time
+from .config import settings, logger
+from .database import redis_client
+from .breaker import RedisUnavailable
+from .hot_cache import hot_links
+from .storage import link_store
+from . import keys, metrics
+
+MAGIC = b"CAHL"
+VERSION = 1
+HEADER = struct.Struct("<4sH2xIQ")
+ENTRY = struct.Struct("<16sQIII")
+ID_SIZE = 16
+LOCK_KEY = "lock:link_snapshot"
+
+
+def encode_snapshot(links: list[tuple[str, str, int]], created_at: int) -> bytes:
+    """links: (short_id, long_url, expires_at) hottest first."""
+    entries = sorted(
+        (short_id.encode(), long_url.encode(), expires_at, rank)
+        for rank, (short_id, long_url, expires_at) in enumerate(links)
+        if len(short_id.encode()) <= ID_SIZE
+    )
+    offset = HEADER.size + ENTRY.size * len(entries)
+    index, data = [], []
+    for short_id, long_url, expires_at, rank in entries:
+        index.append(ENTRY.pack(short_id, expires_at, offset, len(long_url), rank))
+        data.append(long_url)
+        offset += len(long_url)
+    return HEADER.pack(MAGIC, VERSION, len(entries), created_at) + b"".join(index) + b"".join(data)
+
+
+def write_snapshot(path: str, links: list[tuple[str, str, int]]):
+    """Replaces the file atomically: readers keep their mapping of the old one until they reload."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(encode_snapshot(links, int(time.time())))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class LinkSnapshot:
+    """A memory-mapped snapshot file, looked up by binary search over its index."""
+
+    def __init__(self):
+        self._map: mmap.mmap | None = None
+        self._mtime = 0.0
+        self.count = 0
+        self.created_at = 0
+        self._task: asyncio.Task | None = None
+
+    def load(self, path: str) -> bool:
+        """Maps the file at `path` if it is new or changed. False if there is no valid snapshot."""
+        try:
+            mtime = os.stat(path).st_mtime
+            if self._map is not None and mtime == self._mtime:
+                return True
+            with open(path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # Missing or empty: keep serving the mapping we have, if any
+            return self._map is not None
+        magic, version, count, created_at = HEADER.unpack_from(mapped.read(HEADER.size).ljust(HEADER.size, b"\0"))
+        if magic != MAGIC or version != VERSION or len(mapped) < HEADER.size + count * ENTRY.size:
+            logger.warning(f"Ignoring invalid link snapshot '{path}'.")
+            mapped.close()
+            return self._map is not None
+        self.close()
+        self._map, self._mtime, self.count, self.created_at = mapped, mtime, count, created_at
+        metrics.SNAPSHOT_LINKS.set(count)
+        return True
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+            self.count = 0
+
+    def _entry(self, position: int) -> tuple:
+        return ENTRY.unpack_from(self._map, HEADER.size + position * ENTRY.size)
+
+    def get(self, short_id: str) -> str | None:
+        """The snapshotted long URL, None if the link isn't in it or has expired since."""
+        if self._map is None:
+            return None
+        key = short_id.encode().ljust(ID_SIZE, b"\0")
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._map[HEADER.size + middle * ENTRY.size:HEADER.size + middle * ENTRY.size + ID_SIZE] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self.count:
+            return None
+        entry_id, expires_at, offset, length, _ = self._entry(low)
+        if entry_id != key or (expires_at and expires_at <= time.time()):
+            return None
+        return self._map[offset:offset + length].decode()
+
+    def hottest(self, count: int) -> list[tuple[str, str]]:
+        """Up to `count` (short_id, long URL), hottest first, without the expired ones."""
+        if self._map is None:
+            return []
+        now = time.time()
+        entries = sorted((self._entry(position) for position in range(self.count)), key=lambda entry: entry[4])
+        return [
+            (entry_id.rstrip(b"\0").decode(), self._map[offset:offset + length].decode())
+            for entry_id, expires_at, offset, length, _ in entries
+            if not expires_at or expires_at > now
+        ][:count]
+
+    # --- Periodic refresh ---
+
+    async def start(self):
+        if settings.SNAPSHOT_PATH and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        interval = settings.SNAPSHOT_INTERVAL_SECONDS
+        while True:
+            # One writer per interval across processes (lock held for 90% of it); the others pick the new file up
+            try:
+                await report_served(interval)
+                if await redis_client.acquire_lock(LOCK_KEY, int(interval * 900)):
+                    written = await take_snapshot(settings.SNAPSHOT_PATH, settings.SNAPSHOT_LINKS)
+                    if written:
+                        logger.info(f"Link snapshot written with {written} links.")
+            except RedisUnavailable:
+                # Not now: the previous snapshot is what redirects fall back to meanwhile
+                pass
+            except Exception as e:
+                logger.error(f"Error writing the link snapshot: {e}")
+            # Mapping (and validating) the file is disk I/O: off the event loop, like writing it
+            await asyncio.to_thread(self.load, settings.SNAPSHOT_PATH)
+            await asyncio.sleep(interval)
+
+
+async def report_served(interval: float):
+    """Moves this process's hot cache hits to SNAPSHOT_SERVED_KEY (dropped if Redis can't take them)."""
+    served = hot_links.take_served(settings.SNAPSHOT_LINKS)
+    if not served:
+        return
+    db = await redis_client.get_client()
+    async with db.pipeline(transaction=False) as pipe:
+        for short_id, hits in served:
+            pipe.zincrby(settings.SNAPSHOT_SERVED_KEY, hits, short_id)
+        # Outlives a writer that skipped a tick, not a stopped deployment
+        pipe.expire(settings.SNAPSHOT_SERVED_KEY, int(interval * 3))
+        await pipe.execute()
+
+
+async def take_snapshot(path: str, count: int, chunk: int = 100) -> int:
+    """
+    Writes the top `count` links (leaderboard, then the most served hot links of all processes) to `path`.
+    Keeps the previous file when Redis can't be read completely: a partial snapshot would be worse.
+    Returns how many links were written.
+    """
+    top = []
+    for leaderboard_key in keys.leaderboards():
+        top += await redis_client.get_top_members(leaderboard_key, count)
+    short_ids = [member for member, _ in sorted(top, key=lambda item: item[1], reverse=True)[:count]]
+    db = await redis_client.get_client()
+    seen = set(short_ids)
+    served = await db.zrevrange(settings.SNAPSHOT_SERVED_KEY, 0, count - 1)
+    short_ids += [short_id for short_id in served if short_id not in seen]
+    short_ids = short_ids[:count]
+    if not short_ids:
+        return 0
+
+    expires_at = await db.zmscore(settings.LINK_EXPIRY_ZSET, short_ids)
+    urls = []
+    for start in range(0, len(short_ids), chunk):
+        results = await asyncio.gather(
+            *(link_store.get(db, short_id) for short_id in short_ids[start:start + chunk]),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        urls += results
+
+    links = [
+        (short_id, url, int(expiry or 0))
+        for short_id, url, expiry in zip(short_ids, urls, expires_at)
+        if url is not None
+    ]
+    if not links:
+        return 0
+    # Encoding up to SNAPSHOT_LINKS entries and the fsync would stall this process's redirects
+    await asyncio.to_thread(write_snapshot, path, links)
+    # Hits count towards one snapshot: the next one ranks what was served since
+    await db.delete(settings.SNAPSHOT_SERVED_KEY)
+    return len(links)
+
+
+link_snapshot = LinkSnapshot()
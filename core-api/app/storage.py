@@ -0,0 +1,98 @@
+"""
+Where short_id -> long URL mappings live (LINK_STORAGE).
+
+"string"   : one top-level key per link, link:{id} (the original layout, see keys.py).
+"bucketed" : links packed into small hashes keyed by an ID prefix, lb:{prefix} -> {rest of id: url}.
+             Small hashes use Redis's listpack encoding, which saves the ~60-90 bytes of
+             per-key overhead a top-level key costs. Expiry is per field (HEXPIRE, Redis 7.4+).
+
+Either way the stored value goes through url_codec, which compresses long URLs (LINK_COMPRESSION).
+"""
+import redis.asyncio as redis
+from .config import settings, logger
+from .url_codec import url_codec, decode_url
+from . import keys
+
+BUCKET_KEY_PREFIX = "lb"
+
+
+class StringLinkStore:
+    layout = "string"
+
+    def key(self, short_id: str) -> str:
+        return keys.link(short_id)
+
+    def queue_set(self, pipe, short_id: str, long_url: str, expires_in: int | None = None):
+        """Adds the write to a pipeline, so it goes out with the link's other keys."""
+        pipe.set(self.key(short_id), url_codec.encode(long_url), ex=expires_in)
+
+    async def get(self, db: redis.Redis, short_id: str) -> str | None:
+        long_url = await db.get(self.key(short_id))
+        if long_url is None and settings.LINK_STORAGE_FALLBACK:
+            # Not migrated back yet (python -m app.link_migration --to string)
+            bucket, field = BucketedLinkStore(settings.LINK_BUCKET_PREFIX_LENGTH).locate(short_id)
+            long_url = await db.hget(bucket, field)
+        return await decode_url(db, long_url)
+
+
+class BucketedLinkStore:
+    layout = "bucketed"
+
+    def __init__(self, prefix_length: int):
+        self.prefix_length = prefix_length
+
+    def locate(self, short_id: str) -> tuple[str, str]:
+        """short_id -> (bucket hash key, field)."""
+        return f"{BUCKET_KEY_PREFIX}:{short_id[:self.prefix_length]}", short_id[self.prefix_length:]
+
+    def queue_set(self, pipe, short_id: str, long_url: str, expires_in: int | None = None):
+        bucket, field = self.locate(short_id)
+        pipe.hset(bucket, field, url_codec.encode(long_url))
+        if expires_in:
+            # HEXPIRE key seconds FIELDS numfields field
+            pipe.execute_command("HEXPIRE", bucket, expires_in, "FIELDS", 1, field)
+
+    async def get(self, db: redis.Redis, short_id: str) -> str | None:
+        bucket, field = self.locate(short_id)
+        long_url = await db.hget(bucket, field)
+        if long_url is None and settings.LINK_STORAGE_FALLBACK:
+            # Not migrated yet (python -m app.link_migration --to bucketed)
+            long_url = await db.get(keys.link(short_id))
+        return await decode_url(db, long_url)
+
+
+def get_link_store(layout: str | None = None):
+    layout = layout or settings.LINK_STORAGE
+    if layout == "bucketed":
+        return BucketedLinkStore(settings.LINK_BUCKET_PREFIX_LENGTH)
+    if layout == "string":
+        return StringLinkStore()
+    raise ValueError(f"Unknown LINK_STORAGE '{layout}'")
+
+
+link_store = get_link_store()
+
+
+async def check_bucket_encoding(db: redis.Redis):
+    """
+    Warns if Redis would convert link buckets out of listpack encoding
+    (too many fields per bucket, or URLs longer than hash-max-listpack-value).
+    """
+    if link_store.layout != "bucketed":
+        return
+    try:
+        config = await db.config_get("hash-max-listpack-*")
+    except Exception as e:
+        logger.warning(f"Could not read the hash listpack limits: {e}")
+        return
+
+    max_value = int(config.get("hash-max-listpack-value", 0))
+    if max_value < settings.LINK_BUCKET_MIN_LISTPACK_VALUE:
+        logger.warning(
+            f"hash-max-listpack-value is {max_value}: buckets holding longer URLs lose the compact encoding. "
+            f"Raise it to at least {settings.LINK_BUCKET_MIN_LISTPACK_VALUE}."
+        )
+    logger.info(
+        f"Link storage: bucketed ({64 ** settings.LINK_BUCKET_PREFIX_LENGTH} buckets, "
+        f"listpack up to {config.get('hash-max-listpack-entries')} links per bucket)."
+    )
@@ -1,40 +1,217 @@
+"""
+OpenTelemetry tracing, sized for the request rate (TRACE_* settings).
+
+- Off entirely (no provider, no instrumentation) without OTEL_EXPORTER_OTLP_ENDPOINT.
+- Head sampling by trace ID ratio, per route (TRACE_ROUTE_SAMPLE_RATIOS), following the parent's decision.
+- Server spans that lost the draw are still recorded and exported with their children when the request
+  failed (TRACE_KEEP_ERRORS) or was slow (TRACE_SLOW_REQUEST_MS); otherwise they are dropped unexported.
+- TRACE_REDIS_COMMANDS=false: no span per Redis command; the request span gets redis.commands / redis.seconds.
+- Bounded export queue: when the collector falls behind spans are dropped, not buffered without limit.
+"""
+import threading
+from collections import OrderedDict
 from opentelemetry import trace
-from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.context import Context
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor, TracerProvider
 from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+from opentelemetry.sdk.trace.sampling import Decision, Sampler, SamplingResult
 from opentelemetry.sdk.resources import Resource
-from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
-from opentelemetry.instrumentation.redis import RedisInstrumentor
-import os
+from opentelemetry.trace import SpanContext, SpanKind, StatusCode, TraceFlags
+from .config import settings
+
+# Unsampled traces held until their server span ends (keep errors / slow requests)
+MAX_HELD_TRACES = 1000
+MAX_HELD_SPANS_PER_TRACE = 64
+
+_summarize_redis = False
+
+
+def parse_route_ratios(value: str) -> dict[str, float]:
+    """'/{short_id}=0.001,/links=1' -> {"/{short_id}": 0.001, "/links": 1.0}"""
+    ratios = {}
+    for item in value.split(","):
+        route, _, ratio = item.strip().rpartition("=")
+        if route:
+            ratios[route] = float(ratio)
+    return ratios
+
+
+class RouteRatioSampler(Sampler):
+    """
+    Parent-based: a span follows its parent's decision (a remote parent's sampled flag, or whether the
+    local parent is recorded). A root span is sampled with the ratio of its route (http.route, else the
+    span name) or TRACE_SAMPLE_RATIO. Unsampled server spans are RECORD_ONLY when `keep_unsampled_servers`,
+    so TailKeepProcessor can still export them.
+    """
+
+    def __init__(self, ratio: float, route_ratios: dict[str, float], keep_unsampled_servers: bool):
+        self.ratio = ratio
+        self.route_ratios = route_ratios
+        self.keep_unsampled_servers = keep_unsampled_servers
+
+    @staticmethod
+    def _bound(ratio: float) -> int:
+        # Same test as TraceIdRatioBased: the low 64 bits of the trace ID below ratio * 2^64
+        return round(max(0.0, min(1.0, ratio)) * (1 << 64))
+
+    def should_sample(self, parent_context: Context | None, trace_id: int, name: str,
+                      kind: SpanKind | None = None, attributes=None, links=None, trace_state=None) -> SamplingResult:
+        parent = trace.get_current_span(parent_context)
+        parent_span_context = parent.get_span_context()
+        if parent_span_context.is_valid:
+            state = parent_span_context.trace_state
+            if parent_span_context.trace_flags.sampled:
+                return SamplingResult(Decision.RECORD_AND_SAMPLE, attributes, state)
+            if not parent_span_context.is_remote and parent.is_recording():
+                return SamplingResult(Decision.RECORD_ONLY, attributes, state)
+            return SamplingResult(Decision.DROP, None, state)
+
+        route = (attributes or {}).get("http.route", name)
+        ratio = self.route_ratios.get(route, self.ratio)
+        if trace_id & 0xFFFFFFFFFFFFFFFF < self._bound(ratio):
+            return SamplingResult(Decision.RECORD_AND_SAMPLE, attributes)
+        if kind == SpanKind.SERVER and self.keep_unsampled_servers:
+            return SamplingResult(Decision.RECORD_ONLY, attributes)
+        return SamplingResult(Decision.DROP)
+
+    def get_description(self) -> str:
+        return f"RouteRatioSampler{{{self.ratio}, {self.route_ratios}}}"
+
+
+class TailKeepProcessor(SpanProcessor):
+    """
+    Passes sampled spans on to `exporting`. Recorded but unsampled spans are held per trace until the
+    local root ends: the whole trace is exported if that span failed or took at least `slow_ms`, else dropped.
+    """
+
+    def __init__(self, exporting: SpanProcessor, keep_errors: bool, slow_ms: float):
+        self.exporting = exporting
+        self.keep_errors = keep_errors
+        self.slow_ms = slow_ms
+        self._held: OrderedDict[int, list[ReadableSpan]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def on_end(self, span: ReadableSpan):
+        if span.context.trace_flags.sampled:
+            self.exporting.on_end(span)
+            return
+
+        trace_id = span.context.trace_id
+        is_local_root = span.parent is None or span.parent.is_remote
+        with self._lock:
+            if not is_local_root:
+                held = self._held.setdefault(trace_id, [])
+                if len(held) < MAX_HELD_SPANS_PER_TRACE:
+                    held.append(span)
+                # Traces whose root never ends (or never had one) must not pile up
+                while len(self._held) > MAX_HELD_TRACES:
+                    self._held.popitem(last=False)
+                return
+            held = self._held.pop(trace_id, [])
+
+        if self._keep(span):
+            for held_span in (*held, span):
+                self.exporting.on_end(_as_sampled(held_span))
+
+    def _keep(self, span: ReadableSpan) -> bool:
+        if self.keep_errors and span.status.status_code == StatusCode.ERROR:
+            return True
+        return bool(self.slow_ms) and (span.end_time - span.start_time) / 1e6 >= self.slow_ms
+
+    def shutdown(self):
+        self.exporting.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.exporting.force_flush(timeout_millis)
+
+
+def _as_sampled(span: ReadableSpan) -> ReadableSpan:
+    """A copy of the span flagged as sampled (the batch processor skips unsampled spans)."""
+    context = span.context
+    return ReadableSpan(
+        name=span.name,
+        context=SpanContext(context.trace_id, context.span_id, is_remote=False,
+                            trace_flags=TraceFlags(TraceFlags.SAMPLED), trace_state=context.trace_state),
+        parent=span.parent,
+        resource=span.resource,
+        attributes=span.attributes,
+        events=span.events,
+        links=span.links,
+        kind=span.kind,
+        status=span.status,
+        start_time=span.start_time,
+        end_time=span.end_time,
+        instrumentation_scope=span.instrumentation_scope,
+    )
+
+
+def record_redis_command(seconds: float):
+    """With TRACE_REDIS_COMMANDS off: adds a Redis command to the current (request) span's totals."""
+    if not _summarize_redis:
+        return
+    span = trace.get_current_span()
+    if span.is_recording():
+        attributes = span.attributes
+        span.set_attribute("redis.commands", attributes.get("redis.commands", 0) + 1)
+        span.set_attribute("redis.seconds", attributes.get("redis.seconds", 0.0) + seconds)
 
 
 def setup_tracing(service_name: str, app=None):
     """
     Sets up OpenTelemetry tracing for the service.
     """
+    global _summarize_redis
+    if not settings.OTEL_EXPORTER_OTLP_ENDPOINT:
+        print(f"Tracing disabled for {service_name} (no OTEL_EXPORTER_OTLP_ENDPOINT)")
+        return
+
+    # Imported here so a service without an endpoint doesn't load the exporter and instrumentations
+    from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+    from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+    from opentelemetry.instrumentation.redis import RedisInstrumentor
 
     # 1. Define the resource (service name)
     resource = Resource.create(attributes={
         "service.name": service_name
     })
 
-    # 2. Configure the Tracer Provider
-    tracer_provider = TracerProvider(resource=resource)
+    # 2. Configure the Tracer Provider with the sampler
+    keep_errors = settings.TRACE_KEEP_ERRORS
+    slow_ms = settings.TRACE_SLOW_REQUEST_MS
+    sampler = RouteRatioSampler(
+        settings.TRACE_SAMPLE_RATIO,
+        parse_route_ratios(settings.TRACE_ROUTE_SAMPLE_RATIOS),
+        keep_unsampled_servers=keep_errors or slow_ms > 0
+    )
+    tracer_provider = TracerProvider(resource=resource, sampler=sampler)
     trace.set_tracer_provider(tracer_provider)
 
     # 3. Configure the OTLP Exporter (sends traces to Jaeger)
     # It reads endpoint from OTEL_EXPORTER_OTLP_ENDPOINT env var
     otlp_exporter = OTLPSpanExporter()
 
-    # 4. Add the exporter to the provider
-    span_processor = BatchSpanProcessor(otlp_exporter)
-    tracer_provider.add_span_processor(span_processor)
+    # 4. Add the exporter to the provider, behind a bounded queue
+    span_processor = BatchSpanProcessor(
+        otlp_exporter,
+        max_queue_size=settings.TRACE_EXPORT_QUEUE_SIZE,
+        max_export_batch_size=min(settings.TRACE_EXPORT_BATCH_SIZE, settings.TRACE_EXPORT_QUEUE_SIZE),
+        export_timeout_millis=settings.TRACE_EXPORT_TIMEOUT_MS
+    )
+    tracer_provider.add_span_processor(TailKeepProcessor(span_processor, keep_errors, slow_ms))
 
-    # 5. Instrument FastAPI (if app is provided)
+    # 5. Instrument FastAPI (if app is provided): one span per request, no ASGI send/receive spans
     if app:
-        FastAPIInstrumentor.instrument_app(app, tracer_provider=tracer_provider)
+        FastAPIInstrumentor.instrument_app(
+            app,
+            tracer_provider=tracer_provider,
+            excluded_urls=settings.TRACE_EXCLUDED_URLS,
+            exclude_spans=["receive", "send"]
+        )
 
-    # 6. Instrument Redis (Auto-instrumentation)
-    RedisInstrumentor().instrument(tracer_provider=tracer_provider)
+    # 6. Instrument Redis: a span per command, or totals on the request span
+    if settings.TRACE_REDIS_COMMANDS:
+        RedisInstrumentor().instrument(tracer_provider=tracer_provider)
+    else:
+        _summarize_redis = True
 
-    print(f"Tracing initialized for {service_name}")
\ No newline at end of file
+    print(f"Tracing initialized for {service_name}")
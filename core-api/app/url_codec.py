@@ -0,0 +1,209 @@
+"""
+Optional compression of long destination URLs (LINK_COMPRESSION).
+
+URLs of at least LINK_COMPRESSION_MIN_LENGTH characters are stored as
+
+    ~<codec><dictionary id>:<base64 of the compressed bytes>
+
+with codec "z" (raw deflate) or "s" (zstd). Anything else is a plain URL (those never start
+with "~"), so both kinds coexist and the setting can be changed at any time.
+
+Tracking-parameter URLs are too short to compress well on their own; a dictionary trained on
+existing links supplies their common substrings:
+
+    python -m app.url_codec train [--samples 20000] [--dict-size 16384]
+
+Dictionaries are kept in Redis (LINK_COMPRESSION_DICTS_KEY, id -> base64), so the worker and
+every core-api process can decode any value, including those written with an older dictionary.
+"""
+import argparse
+import asyncio
+import base64
+import zlib
+import redis.asyncio as redis
+import zstandard
+from .config import settings, logger
+
+MARKER = "~"
+CODEC_TAGS = {"zlib": "z", "zstd": "s"}
+# The "current" field of the dictionaries hash holds the id new values are written with
+CURRENT_FIELD = "current"
+# A deflate preset dictionary is limited to the 32 KB window; the tail of a zstd dictionary is its content
+_ZLIB_WINDOW = 32 * 1024
+
+
+class UrlCodec:
+    def __init__(self, codec: str = "none", min_length: int = 512):
+        if codec != "none" and codec not in CODEC_TAGS:
+            raise ValueError(f"Unknown LINK_COMPRESSION '{codec}'")
+        self.codec = codec
+        self.min_length = min_length
+        self.dict_id = 0
+        # id -> raw dictionary bytes (0 = no dictionary)
+        self._dictionaries: dict[int, bytes | None] = {0: None}
+        self._zstd_compressors: dict[int, zstandard.ZstdCompressor] = {}
+        self._zstd_decompressors: dict[int, zstandard.ZstdDecompressor] = {}
+
+    def add_dictionary(self, dict_id: int, data: bytes, current: bool = False):
+        self._dictionaries[dict_id] = data
+        if current:
+            self.dict_id = dict_id
+
+    def has_dictionary(self, dict_id: int) -> bool:
+        return dict_id in self._dictionaries
+
+    def _zstd_dict(self, dict_id: int):
+        data = self._dictionaries[dict_id]
+        return zstandard.ZstdCompressionDict(data) if data else None
+
+    def _zlib_options(self, dict_id: int) -> dict:
+        dictionary = self._dictionaries[dict_id]
+        return {"zdict": dictionary[-_ZLIB_WINDOW:]} if dictionary else {}
+
+    def compress(self, url: str, codec: str, dict_id: int = 0) -> bytes:
+        raw = url.encode()
+        if codec == "zlib":
+            # Raw deflate (negative wbits): no header or checksum, the marker says what it is
+            compressor = zlib.compressobj(9, zlib.DEFLATED, -15, **self._zlib_options(dict_id))
+            return compressor.compress(raw) + compressor.flush()
+
+        compressor = self._zstd_compressors.get(dict_id)
+        if compressor is None:
+            compressor = zstandard.ZstdCompressor(
+                level=9, dict_data=self._zstd_dict(dict_id),
+                write_checksum=False, write_content_size=True, write_dict_id=False
+            )
+            self._zstd_compressors[dict_id] = compressor
+        return compressor.compress(raw)
+
+    def decompress(self, data: bytes, codec: str, dict_id: int = 0) -> str:
+        if codec == "zlib":
+            decompressor = zlib.decompressobj(-15, **self._zlib_options(dict_id))
+            return (decompressor.decompress(data) + decompressor.flush()).decode()
+
+        decompressor = self._zstd_decompressors.get(dict_id)
+        if decompressor is None:
+            decompressor = zstandard.ZstdDecompressor(dict_data=self._zstd_dict(dict_id))
+            self._zstd_decompressors[dict_id] = decompressor
+        return decompressor.decompress(data).decode()
+
+    def encode(self, url: str) -> str:
+        """The value to store for a URL: compressed if long enough and if that makes it smaller."""
+        if self.codec == "none" or len(url) < self.min_length:
+            return url
+        payload = base64.b64encode(self.compress(url, self.codec, self.dict_id)).decode()
+        value = f"{MARKER}{CODEC_TAGS[self.codec]}{self.dict_id}:{payload}"
+        return value if len(value) < len(url) else url
+
+    @staticmethod
+    def parse(value: str) -> tuple[str, int, bytes] | None:
+        """Stored value -> (codec, dictionary id, compressed bytes), or None for a plain URL."""
+        if not value.startswith(MARKER):
+            return None
+        header, payload = value[1:].split(":", 1)
+        codec = "zlib" if header[0] == CODEC_TAGS["zlib"] else "zstd"
+        return codec, int(header[1:]), base64.b64decode(payload)
+
+    def decode(self, value: str) -> str:
+        """Stored value -> URL. The dictionary it names must have been added (see decode_url)."""
+        parsed = self.parse(value)
+        if parsed is None:
+            return value
+        return self.decompress(parsed[2], parsed[0], parsed[1])
+
+
+url_codec = UrlCodec(settings.LINK_COMPRESSION, settings.LINK_COMPRESSION_MIN_LENGTH)
+
+
+async def _fetch_dictionary(db: redis.Redis, dict_id: int) -> bytes | None:
+    encoded = await db.hget(settings.LINK_COMPRESSION_DICTS_KEY, str(dict_id))
+    return base64.b64decode(encoded) if encoded else None
+
+
+async def decode_url(db: redis.Redis, value: str | None) -> str | None:
+    """Decodes a stored value, fetching its dictionary from Redis the first time it's seen."""
+    if not value or not value.startswith(MARKER):
+        return value
+    dict_id = url_codec.parse(value)[1]
+    if not url_codec.has_dictionary(dict_id):
+        data = await _fetch_dictionary(db, dict_id)
+        if data is None:
+            logger.error(f"URL compression dictionary {dict_id} is missing from '{settings.LINK_COMPRESSION_DICTS_KEY}'")
+            return None
+        url_codec.add_dictionary(dict_id, data)
+    return url_codec.decode(value)
+
+
+async def load_current_dictionary(db: redis.Redis):
+    """Startup: new values are compressed with the dictionary marked current, if there is one."""
+    if url_codec.codec == "none":
+        return
+    current = await db.hget(settings.LINK_COMPRESSION_DICTS_KEY, CURRENT_FIELD)
+    if current and (data := await _fetch_dictionary(db, int(current))):
+        url_codec.add_dictionary(int(current), data, current=True)
+        logger.info(f"URL compression: {url_codec.codec} with dictionary {current} ({len(data)} bytes).")
+    else:
+        logger.info(f"URL compression: {url_codec.codec} without a dictionary (python -m app.url_codec train).")
+
+
+async def sample_urls(db: redis.Redis, count: int, min_length: int) -> list[str]:
+    """Up to `count` stored URLs of at least min_length characters, in either storage layout."""
+    urls = []
+    async for key in db.scan_iter(match="link:*", count=1000):
+        value = await decode_url(db, await db.get(key))
+        if value and len(value) >= min_length:
+            urls.append(value)
+        if len(urls) >= count:
+            return urls
+    async for bucket in db.scan_iter(match="lb:*", count=1000):
+        for value in (await db.hgetall(bucket)).values():
+            value = await decode_url(db, value)
+            if value and len(value) >= min_length:
+                urls.append(value)
+        if len(urls) >= count:
+            break
+    return urls[:count]
+
+
+def train_dictionary(urls: list[str], dict_size: int) -> zstandard.ZstdCompressionDict:
+    return zstandard.train_dictionary(dict_size, [url.encode() for url in urls])
+
+
+async def train(samples: int, dict_size: int, min_length: int):
+    from .database import redis_client
+
+    await redis_client.connect()
+    client = await redis_client.get_client()
+    try:
+        urls = await sample_urls(client, samples, min_length)
+        if len(urls) < 100:
+            raise SystemExit(f"Only {len(urls)} URLs of {min_length}+ characters found; not enough to train on.")
+
+        dictionary = await asyncio.to_thread(train_dictionary, urls, dict_size)
+        dict_id = dictionary.dict_id()
+        # Old dictionaries stay: values written with them remain readable
+        await client.hset(settings.LINK_COMPRESSION_DICTS_KEY, mapping={
+            str(dict_id): base64.b64encode(dictionary.as_bytes()).decode(),
+            CURRENT_FIELD: dict_id,
+        })
+        print(f"Dictionary {dict_id} ({len(dictionary.as_bytes())} bytes) trained on {len(urls)} URLs.")
+        print("Restart core-api to start compressing new links with it.")
+    finally:
+        await redis_client.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the URL compression dictionary.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    train_parser = commands.add_parser("train", help="Train a dictionary on stored URLs and make it current")
+    train_parser.add_argument("--samples", type=int, default=20000)
+    train_parser.add_argument("--dict-size", type=int, default=16384)
+    train_parser.add_argument("--min-length", type=int, default=settings.LINK_COMPRESSION_MIN_LENGTH)
+    args = parser.parse_args()
+
+    if args.command == "train":
+        asyncio.run(train(args.samples, args.dict_size, args.min_length))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Memory used per link by each storage layout (see app/storage.py).
+
+Usage (from core-api/):
+    python -m benchmarks.link_storage_memory [--links 1000000] [--prefix-length 2] [--db 15] [--force]
+
+Writes the same synthetic links in both layouts into a scratch database, one layout at a
+time, and reports the used_memory growth per link and the encoding of the buckets.
+The database is flushed between runs, so it refuses to touch a non-empty one without --force.
+Bucketing pays off with tens to hundreds of links per bucket: pick --prefix-length accordingly.
+"""
+import argparse
+import asyncio
+import random
+import string
+import redis.asyncio as aioredis
+from app.config import settings
+from app.storage import BucketedLinkStore, StringLinkStore
+
+ALPHABET = string.ascii_letters + string.digits + "-_"
+
+
+def synthetic_links(count: int, id_length: int, url_length: int, seed: int = 42) -> list[tuple[str, str]]:
+    rng = random.Random(seed)
+    links = {}
+    while len(links) < count:
+        short_id = "".join(rng.choices(ALPHABET, k=id_length))
+        path = "".join(rng.choices(string.ascii_lowercase, k=max(1, url_length - len("https://example.com/"))))
+        links[short_id] = f"https://example.com/{path}"
+    return list(links.items())
+
+
+async def _used_memory(client) -> int:
+    return (await client.info("memory"))["used_memory"]
+
+
+async def measure(client, store, links: list, ttl: int | None, batch: int = 1000) -> dict:
+    await client.flushdb()
+    before = await _used_memory(client)
+    for start in range(0, len(links), batch):
+        async with client.pipeline(transaction=False) as pipe:
+            for short_id, long_url in links[start:start + batch]:
+                store.queue_set(pipe, short_id, long_url, ttl)
+            await pipe.execute()
+    after = await _used_memory(client)
+
+    result = {
+        "layout": store.layout,
+        "keys": await client.dbsize(),
+        "bytes": after - before,
+        "bytes_per_link": (after - before) / len(links),
+    }
+    if isinstance(store, BucketedLinkStore):
+        encodings = {}
+        async for bucket in client.scan_iter(match="lb:*", count=1000):
+            encoding = await client.object("encoding", bucket)
+            encodings[encoding] = encodings.get(encoding, 0) + 1
+        result["encodings"] = encodings
+    await client.flushdb()
+    return result
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Compare the memory used by the link storage layouts.")
+    parser.add_argument("--links", type=int, default=1000000)
+    parser.add_argument("--url-length", type=int, default=60)
+    parser.add_argument("--id-length", type=int, default=6, help="Length of the generated IDs (crud.py uses 6)")
+    parser.add_argument("--prefix-length", type=int, default=settings.LINK_BUCKET_PREFIX_LENGTH)
+    parser.add_argument("--ttl", type=int, default=None, help="Give every link an expiry (seconds)")
+    parser.add_argument("--host", default=settings.REDIS_HOST)
+    parser.add_argument("--port", type=int, default=settings.REDIS_PORT)
+    parser.add_argument("--db", type=int, default=15, help="Scratch database, flushed by the benchmark")
+    parser.add_argument("--force", action="store_true", help="Run even if the database isn't empty")
+    args = parser.parse_args()
+
+    client = aioredis.Redis(host=args.host, port=args.port, db=args.db, decode_responses=True)
+    try:
+        if await client.dbsize() and not args.force:
+            raise SystemExit(f"Database {args.db} is not empty; it would be flushed. Use --force or another --db.")
+
+        config = await client.config_get("hash-max-listpack-*")
+        print(f"{args.links} links, {args.id_length}-char IDs, ~{args.url_length}-char URLs, "
+              f"hash-max-listpack-entries={config.get('hash-max-listpack-entries')} "
+              f"hash-max-listpack-value={config.get('hash-max-listpack-value')}")
+
+        links = synthetic_links(args.links, args.id_length, args.url_length)
+        results = []
+        for store in (StringLinkStore(), BucketedLinkStore(args.prefix_length)):
+            result = await measure(client, store, links, args.ttl)
+            results.append(result)
+            line = (f"{result['layout']:>9}: {result['keys']:>8} keys  {result['bytes']:>12} bytes  "
+                    f"{result['bytes_per_link']:7.1f} bytes/link")
+            if "encodings" in result:
+                line += (f"  {len(links) / result['keys']:.0f} links/bucket,"
+                         f" buckets by encoding: {result['encodings']}")
+            print(line)
+
+        string_result, bucketed_result = results
+        saved = 1 - bucketed_result["bytes"] / string_result["bytes"] if string_result["bytes"] else 0
+        print(f"Bucketed layout saves {saved:.0%} of the link memory.")
+    finally:
+        await client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,221 @@
+"""
+Throughput and latency of a running core-api under a replayable traffic mix.
+
+Usage (from core-api/, next to the server: docker-compose exec core-api ...):
+    python -m benchmarks.load_test [--url http://localhost:8000] [--links 10000] [--rate 500] [--duration 30]
+                                   [--mix redirect=90,stats=5,history=3,create=2] [--zipf 1.1]
+                                   [--output results.json] [--baseline baseline.json] [--tolerance 0.15]
+
+Seeds --links links through crud.create_short_link (same Redis as the server, QR rendering lazy,
+expiring after --seed-ttl so the worker's sweeper cleans up), then sends requests on a fixed
+schedule: --rate per second for --duration seconds, drawn from --mix, with link popularity following
+a Zipf distribution. The same --seed replays the same traffic.
+
+Latency is measured from each request's scheduled time, so a server that falls behind shows it
+(no coordinated omission). Requests carry X-Forwarded-For from a pool of --clients addresses,
+which uvicorn trusts from 127.0.0.1: run it on the server's host or link creates hit the
+5-per-minute rate limit of a single client.
+
+Reports RPS, p50/p95/p99 and errors per endpoint. With --baseline, a p95/p99 slower or a throughput
+lower than the baseline by more than --tolerance (or more errors) fails the run (exit 1);
+--update-baseline writes the results there instead.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import httpx
+import jwt
+from app.config import settings
+from app.database import redis_client
+from app import crud
+
+# Zipf / percentile are shared with the other service's benchmark: <repo>/benchmarks, mounted at /benchmarks
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "benchmarks"))
+from workload import Zipf, percentile  # noqa: E402
+
+ENDPOINTS = ("redirect", "stats", "history", "create")
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"Unknown endpoint '{name}' (one of {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight)
+    return mix
+
+
+async def seed_links(count: int, ttl: int, concurrency: int = 50) -> list[str]:
+    settings.QR_MODE = "lazy"
+    db = await redis_client.get_client()
+    short_ids = []
+    for start in range(0, count, concurrency):
+        batch = range(start, min(count, start + concurrency))
+        short_ids += await asyncio.gather(*(
+            crud.create_short_link(db, f"https://example.com/load-test/{n}?ref=benchmark", expires_in=ttl)
+            for n in batch
+        ))
+    return short_ids
+
+
+def schedule(args, short_ids: list[str]) -> list[tuple[float, str, str, str]]:
+    """(offset in seconds, endpoint, short_id, client IP) for every request of the run."""
+    rng = random.Random(args.seed)
+    popularity = list(short_ids)
+    rng.shuffle(popularity)
+    zipf = Zipf(len(popularity), args.zipf)
+    names, weights = zip(*args.mix.items())
+    clients = [f"10.{n >> 16 & 255}.{n >> 8 & 255}.{n & 255}" for n in range(args.clients)]
+    return [
+        (i / args.rate, rng.choices(names, weights)[0], popularity[zipf.sample(rng)], rng.choice(clients))
+        for i in range(int(args.rate * args.duration))
+    ]
+
+
+async def send(client: httpx.AsyncClient, endpoint: str, short_id: str, ip: str, token: str) -> bool:
+    headers = {"X-Forwarded-For": ip}
+    if endpoint == "redirect":
+        response = await client.get(f"/{short_id}", headers=headers)
+        return response.status_code == 307
+    if endpoint == "stats":
+        response = await client.get(f"/{short_id}/stats", headers=headers)
+    elif endpoint == "history":
+        response = await client.get(f"/{short_id}/stats/history", headers=headers)
+    else:
+        headers["Authorization"] = f"Bearer {token}"
+        response = await client.post("/links", json={"long_url": f"https://example.com/new/{short_id}"},
+                                     headers=headers)
+    return response.status_code < 400
+
+
+async def run(args, plan: list) -> dict:
+    token = jwt.encode({"user_id": 1}, settings.JWT_SECRET_KEY.strip(), algorithm=settings.JWT_ALGORITHM)
+    latencies = {name: [] for name in args.mix}
+    errors = {name: 0 for name in args.mix}
+    in_flight = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        async def one(scheduled: float, endpoint: str, short_id: str, ip: str):
+            async with in_flight:
+                try:
+                    ok = await send(client, endpoint, short_id, ip, token)
+                except httpx.HTTPError:
+                    ok = False
+            latencies[endpoint].append(time.perf_counter() - scheduled)
+            if not ok:
+                errors[endpoint] += 1
+
+        started = time.perf_counter()
+        tasks = []
+        for offset, endpoint, short_id, ip in plan:
+            delay = started + offset - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(one(started + offset, endpoint, short_id, ip)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    results = {}
+    for name, values in latencies.items():
+        values.sort()
+        results[name] = {
+            "requests": len(values),
+            "rps": len(values) / elapsed,
+            "errors": errors[name],
+            "p50_ms": percentile(values, 0.50) * 1000,
+            "p95_ms": percentile(values, 0.95) * 1000,
+            "p99_ms": percentile(values, 0.99) * 1000,
+        }
+    total = sum(len(values) for values in latencies.values())
+    results["total"] = {"requests": total, "rps": total / elapsed, "errors": sum(errors.values())}
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Every way the results are worse than the baseline by more than the tolerance."""
+    regressions = []
+    for name, base in baseline.get("results", {}).items():
+        current = results.get(name)
+        if current is None:
+            continue
+        for metric in ("p95_ms", "p99_ms"):
+            if metric in base and current[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{name} {metric}: {current[metric]:.1f} > {base[metric]:.1f}")
+        if current["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{name} rps: {current['rps']:.0f} < {base['rps']:.0f}")
+        base_rate = base["errors"] / max(1, base["requests"])
+        current_rate = current["errors"] / max(1, current["requests"])
+        if current_rate > base_rate + 0.01:
+            regressions.append(f"{name} errors: {current_rate:.1%} > {base_rate:.1%}")
+    return regressions
+
+
+async def main_async(args) -> dict:
+    await redis_client.connect()
+    try:
+        started = time.monotonic()
+        short_ids = await seed_links(args.links, args.seed_ttl)
+        print(f"Seeded {len(short_ids)} links in {time.monotonic() - started:.1f}s.")
+    finally:
+        await redis_client.disconnect()
+
+    plan = schedule(args, short_ids)
+    print(f"Sending {len(plan)} requests at {args.rate}/s to {args.url} ...")
+    return await run(args, plan)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test core-api with a Zipf-distributed traffic mix.")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--links", type=int, default=10000)
+    parser.add_argument("--seed-ttl", type=int, default=3600, help="Seconds before the seeded links expire")
+    parser.add_argument("--rate", type=float, default=500, help="Requests per second")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("redirect=90,stats=5,history=3,create=2"))
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of link popularity")
+    parser.add_argument("--clients", type=int, default=5000, help="Distinct client IPs")
+    parser.add_argument("--concurrency", type=int, default=200, help="Max requests in flight")
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the results as JSON")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed regression (0.15 = 15%%)")
+    parser.add_argument("--update-baseline", action="store_true", help="Write the results to --baseline")
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+
+    print(f"{'endpoint':<10}{'requests':>10}{'rps':>9}{'errors':>8}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for name, result in results.items():
+        latency = "".join(f"{result[key]:>8.1f}ms" for key in ("p50_ms", "p95_ms", "p99_ms") if key in result)
+        print(f"{name:<10}{result['requests']:>10}{result['rps']:>9.0f}{result['errors']:>8}{latency}")
+
+    report = {
+        "config": {key: value for key, value in vars(args).items()
+                   if key not in ("output", "baseline", "update_baseline")},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline and args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}.")
+    elif args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("Regressions against the baseline:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("No regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
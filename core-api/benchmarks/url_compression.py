@@ -0,0 +1,117 @@
+"""
+Memory saved by URL compression against the decode time it adds to each redirect (see app/url_codec.py).
+
+Usage (from core-api/):
+    python -m benchmarks.url_compression [--urls 5000] [--dict-size 16384]
+    python -m benchmarks.url_compression --from-redis [--min-length 512]
+
+Uses synthetic 1-4 KB tracking URLs, or a sample of the stored ones with --from-redis.
+Dictionaries are trained on half of the URLs and measured on the other half.
+Stored sizes include the base64 text encoding.
+"""
+import argparse
+import asyncio
+import random
+import string
+import time
+from urllib.parse import quote, urlencode
+from app.config import settings
+from app.url_codec import UrlCodec, sample_urls, train_dictionary
+
+DOMAINS = ["shop.example.com", "www.example.org", "news.example.net", "landing.example.io"]
+PARAMETERS = [
+    "utm_source", "utm_medium", "utm_campaign", "utm_content", "utm_term", "gclid", "fbclid",
+    "msclkid", "mc_cid", "mc_eid", "_hsenc", "_hsmi", "ref", "affiliate_id", "click_id", "session",
+]
+
+
+def _token(rng: random.Random, length: int) -> str:
+    return "".join(rng.choices(string.ascii_letters + string.digits + "-_", k=length))
+
+
+def synthetic_urls(count: int, seed: int = 42) -> list[str]:
+    """Tracking-heavy URLs of roughly 1-4 KB: shared parameter names, random IDs, nested redirects."""
+    rng = random.Random(seed)
+    urls = []
+    for _ in range(count):
+        target = rng.randint(1024, 4096)
+        path = "/".join(_token(rng, rng.randint(4, 12)).lower() for _ in range(rng.randint(1, 4)))
+        url = f"https://{rng.choice(DOMAINS)}/{path}"
+        params = {}
+        while len(url) + len(urlencode(params)) < target:
+            name = rng.choice(PARAMETERS)
+            if rng.random() < 0.2:
+                # An encoded redirect URL inside a parameter
+                value = quote(f"https://{rng.choice(DOMAINS)}/r?id={_token(rng, 24)}&{name}={_token(rng, 16)}", safe="")
+            else:
+                value = _token(rng, rng.randint(8, 64))
+            params[f"{name}_{len(params)}" if name in params else name] = value
+        urls.append(f"{url}?{urlencode(params)}")
+    return urls
+
+
+def measure(codec: UrlCodec, urls: list[str]) -> dict:
+    started = time.perf_counter()
+    values = [codec.encode(url) for url in urls]
+    encode_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for value in values:
+        codec.decode(value)
+    decode_seconds = time.perf_counter() - started
+
+    assert [codec.decode(value) for value in values] == urls
+    return {
+        "stored_bytes": sum(len(value) for value in values),
+        "encode_us": encode_seconds / len(urls) * 1e6,
+        "decode_us": decode_seconds / len(urls) * 1e6,
+    }
+
+
+async def _load_from_redis(count: int, min_length: int) -> list[str]:
+    from app.database import redis_client
+
+    await redis_client.connect()
+    try:
+        return await sample_urls(await redis_client.get_client(), count, min_length)
+    finally:
+        await redis_client.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare URL compression settings.")
+    parser.add_argument("--urls", type=int, default=5000)
+    parser.add_argument("--dict-size", type=int, default=16384)
+    parser.add_argument("--min-length", type=int, default=settings.LINK_COMPRESSION_MIN_LENGTH)
+    parser.add_argument("--from-redis", action="store_true", help="Sample stored URLs instead of synthetic ones")
+    args = parser.parse_args()
+
+    if args.from_redis:
+        urls = asyncio.run(_load_from_redis(args.urls, args.min_length))
+    else:
+        urls = synthetic_urls(args.urls)
+    if len(urls) < 200:
+        raise SystemExit(f"Only {len(urls)} URLs to work with.")
+    random.Random(0).shuffle(urls)
+    training, evaluation = urls[:len(urls) // 2], urls[len(urls) // 2:]
+
+    dictionary = train_dictionary(training, args.dict_size)
+    plain_bytes = sum(len(url) for url in evaluation)
+    print(f"{len(evaluation)} URLs, {plain_bytes / len(evaluation):.0f} bytes on average; "
+          f"dictionary {dictionary.dict_id()} of {len(dictionary.as_bytes())} bytes.")
+    print(f"{'setting':<16}{'bytes/url':>10}{'saved':>8}{'encode':>12}{'decode':>12}")
+
+    for codec_name in ("zlib", "zstd"):
+        for with_dictionary in (False, True):
+            codec = UrlCodec(codec_name, args.min_length)
+            if with_dictionary:
+                codec.add_dictionary(dictionary.dict_id(), dictionary.as_bytes(), current=True)
+            result = measure(codec, evaluation)
+            label = f"{codec_name}{' + dict' if with_dictionary else ''}"
+            print(f"{label:<16}{result['stored_bytes'] / len(evaluation):>10.0f}"
+                  f"{1 - result['stored_bytes'] / plain_bytes:>8.0%}"
+                  f"{result['encode_us']:>10.1f}us{result['decode_us']:>10.1f}us")
+
+
+if __name__ == "__main__":
+    main()
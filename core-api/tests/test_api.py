@@ -1,7 +1,14 @@
+import asyncio
+import base64
+import os
+import time
 import pytest
+import redis.asyncio as aioredis
 from httpx import AsyncClient, ASGITransport
 from app.main import app
 from app.database import redis_client
+from app.config import settings
+from app import crud, qr
 
 
 @pytest.mark.asyncio
@@ -37,4 +44,587 @@ async def test_get_stats_not_found():
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://test") as ac:
         response = await ac.get("/non_existent_id/stats")
-        assert response.status_code == 404
\ No newline at end of file
+        assert response.status_code == 404
+
+@pytest.mark.asyncio
+async def test_lazy_qr_code_rendered_once(monkeypatch):
+    """
+    In lazy mode no QR job is queued (the link is still added to the Bloom filter);
+    the first /qr requests render the image once.
+    """
+    monkeypatch.setattr(settings, "QR_MODE", "lazy")
+    client = await redis_client.get_client()
+
+    short_id = await crud.create_short_link(client, "https://www.python.org/lazy-qr")
+    # Lazy links go into the Bloom filter like eager ones: no 404 before the first render
+    assert await client.bf().exists(settings.BLOOM_FILTER_KEY, short_id)
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        # Concurrent first requests share a single render
+        first, second = await asyncio.gather(
+            ac.get(f"/{short_id}/qr"),
+            ac.get(f"/{short_id}/qr"),
+        )
+
+    for response in (first, second):
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/png"
+        assert "max-age" in response.headers["cache-control"]
+
+    assert os.path.exists(qr.qr_file_path(short_id))
+    hash_data = await client.hgetall(f"data:{short_id}")
+    assert hash_data["qr_code_path"] == qr.qr_web_path(short_id)
+
+
+@pytest.mark.asyncio
+async def test_stats_unique_visitors_in_window():
+    """
+    Windowed uniques are answered from the worker's time-bucketed HLLs.
+    """
+    client = await redis_client.get_client()
+    short_id = await crud.create_short_link(client, "https://www.python.org/uv-window")
+    await client.bf().add("bf:short_links", short_id)
+
+    # Simulate the worker: 3 visitors this hour (hour + day buckets), 2 (one repeat) 3 days ago
+    this_hour_key = crud.uv_window_keys(short_id, "1h")[0]
+    day_keys = crud.uv_window_keys(short_id, "4d")
+    await client.pfadd(this_hour_key, "1.1.1.1", "2.2.2.2", "3.3.3.3")
+    await client.pfadd(day_keys[0], "1.1.1.1", "2.2.2.2", "3.3.3.3")
+    await client.pfadd(day_keys[-1], "1.1.1.1", "4.4.4.4")
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        day = (await ac.get(f"/{short_id}/stats", params={"window": "24h"})).json()
+        week = (await ac.get(f"/{short_id}/stats", params={"window": "7d"})).json()
+        too_long = await ac.get(f"/{short_id}/stats", params={"window": "400d"})
+
+    assert day["window"] == "24h"
+    assert day["window_unique_clicks"] == 3
+    assert week["window_unique_clicks"] == 4
+    assert too_long.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_stats_breakdown_sums_daily_counters():
+    """
+    Breakdowns add up the worker's per-day dimension hashes over the requested days.
+    """
+    client = await redis_client.get_client()
+    short_id = await crud.create_short_link(client, "https://www.python.org/breakdown")
+    await client.bf().add("bf:short_links", short_id)
+
+    # Simulate the worker: clicks today and two days ago
+    day_keys = [key.rsplit(":", 1)[1] for key in crud.uv_window_keys(short_id, "3d")]
+    await client.hset(f"bd:{short_id}:referrer:{day_keys[0]}", mapping={"google.com": 3, "direct": 1})
+    await client.hset(f"bd:{short_id}:referrer:{day_keys[2]}", mapping={"google.com": 2})
+    await client.hset(f"bd:{short_id}:device:{day_keys[0]}", mapping={"mobile": 4})
+    await client.hset(f"bd:{short_id}:device:{day_keys[2]}", mapping={"desktop": 2})
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        today = (await ac.get(f"/{short_id}/stats/breakdown", params={"days": 1})).json()
+        three_days = (await ac.get(f"/{short_id}/stats/breakdown", params={"days": 3})).json()
+        devices = (await ac.get(f"/{short_id}/stats/breakdown", params={"dimension": "device"})).json()
+        bad_dimension = await ac.get(f"/{short_id}/stats/breakdown", params={"dimension": "os"})
+
+    assert today["total_clicks"] == 4
+    assert today["dimensions"]["referrer"] == {"google.com": 3, "direct": 1}
+    assert three_days["dimensions"]["referrer"] == {"google.com": 5, "direct": 1}
+    assert three_days["dimensions"]["country"] == {}
+    assert devices["dimensions"] == {"device": {"mobile": 4, "desktop": 2}}
+    assert bad_dimension.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_expiring_link_is_registered_and_rejected_after_expiry():
+    """
+    A link created with expires_in has a TTL, is indexed for the sweeper, and 404s once expired.
+    """
+    client = await redis_client.get_client()
+    short_id = await crud.create_short_link(client, "https://www.python.org/expiring", expires_in=120)
+    await client.bf().add("bf:short_links", short_id)
+
+    assert 0 < await client.ttl(f"link:{short_id}") <= 120
+    assert await client.zscore(settings.LINK_EXPIRY_ZSET, short_id) is not None
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        stats = (await ac.get(f"/{short_id}/stats")).json()
+        assert stats["expires_at"] is not None
+
+        # Expiry (Redis drops link:{id}); the rest is left for the worker's sweeper
+        await client.delete(f"link:{short_id}", f"cache:stats:{short_id}")
+        assert (await ac.get(f"/{short_id}")).status_code == 404
+        assert (await ac.get(f"/{short_id}/stats")).status_code == 404
+
+    await client.zrem(settings.LINK_EXPIRY_ZSET, short_id)
+
+
+@pytest.mark.asyncio
+async def test_bucketed_link_storage_with_fallback(monkeypatch):
+    """
+    In the bucketed layout a link is a field of lb:{prefix}, and links still stored as
+    link:{id} (not migrated yet) keep resolving.
+    """
+    from app.storage import BucketedLinkStore
+    store = BucketedLinkStore(2)
+    monkeypatch.setattr(crud, "link_store", store)
+    monkeypatch.setattr(settings, "LINK_STORAGE_FALLBACK", True)
+    client = await redis_client.get_client()
+
+    short_id = await crud.create_short_link(client, "https://www.python.org/bucketed")
+    await client.bf().madd("bf:short_links", short_id, "legacy1")
+    bucket, field = store.locate(short_id)
+    assert bucket == f"lb:{short_id[:2]}"
+    assert await client.hget(bucket, field) == "https://www.python.org/bucketed"
+    assert not await client.exists(f"link:{short_id}")
+    assert await crud.get_long_url(client, short_id) == "https://www.python.org/bucketed"
+
+    await client.set("link:legacy1", "https://www.python.org/legacy")
+    assert await crud.get_long_url(client, "legacy1") == "https://www.python.org/legacy"
+    # Without the fallback (after the migration) the other layout isn't read
+    monkeypatch.setattr(settings, "LINK_STORAGE_FALLBACK", False)
+    assert await crud.get_long_url(client, "legacy1") is None
+
+    await client.hdel(bucket, field)
+    await client.delete("link:legacy1")
+
+
+@pytest.mark.asyncio
+async def test_link_migration_to_bucketed():
+    """link:{id} keys move into their lb:{prefix} buckets, TTLs included, and the old keys go."""
+    from app.link_migration import to_bucketed
+    from app.storage import BucketedLinkStore
+    store = BucketedLinkStore(2)
+    client = await redis_client.get_client()
+    short_ids = ["mig001", "mig002", "mih003"]
+    for short_id in short_ids:
+        await client.set(f"link:{short_id}", f"https://www.python.org/{short_id}")
+    await client.pexpire("link:mig002", 60000)
+
+    # Batches of 2: more than one flush
+    assert await to_bucketed(client, store, batch=2, dry_run=False, keep_source=False) >= len(short_ids)
+    for short_id in short_ids:
+        bucket, field = store.locate(short_id)
+        assert await client.hget(bucket, field) == f"https://www.python.org/{short_id}"
+        assert not await client.exists(f"link:{short_id}")
+    bucket, field = store.locate("mig002")
+    assert 0 < (await client.execute_command("HPTTL", bucket, "FIELDS", 1, field))[0] <= 60000
+
+    for short_id in short_ids:
+        await client.hdel(*store.locate(short_id))
+
+
+@pytest.mark.asyncio
+async def test_long_url_compressed_with_trained_dictionary(monkeypatch):
+    """
+    Long URLs are stored compressed with the current dictionary and decoded on lookup;
+    short ones are stored as-is.
+    """
+    from app.url_codec import url_codec, train_dictionary, load_current_dictionary
+    monkeypatch.setattr(url_codec, "codec", "zstd")
+    monkeypatch.setattr(url_codec, "min_length", 200)
+    monkeypatch.setattr(url_codec, "dict_id", 0)
+    client = await redis_client.get_client()
+
+    samples = [f"https://shop.example.com/p/{i}?utm_source=news&utm_medium=email&utm_campaign=spring{i % 7}"
+               f"&gclid={i * 7919:x}&session={i * 104729:x}" + "&ref=affiliate" * 10 for i in range(500)]
+    dictionary = train_dictionary(samples, 4096)
+    await client.hset(settings.LINK_COMPRESSION_DICTS_KEY, mapping={
+        str(dictionary.dict_id()): base64.b64encode(dictionary.as_bytes()).decode(),
+        "current": dictionary.dict_id(),
+    })
+    await load_current_dictionary(client)
+
+    long_url = samples[0].replace("/p/0?", "/p/new?")
+    short_id = await crud.create_short_link(client, long_url)
+    await client.bf().add("bf:short_links", short_id)
+    # Decoding fetches the dictionary from Redis, as another process would
+    url_codec._dictionaries.pop(dictionary.dict_id())
+
+    stored = await client.get(f"link:{short_id}")
+    assert stored.startswith(f"~s{dictionary.dict_id()}:") and len(stored) < len(long_url)
+    assert await crud.get_long_url(client, short_id) == long_url
+
+    short_url_id = await crud.create_short_link(client, "https://www.python.org/")
+    assert await client.get(f"link:{short_url_id}") == "https://www.python.org/"
+
+    await client.delete(settings.LINK_COMPRESSION_DICTS_KEY, f"link:{short_id}", f"link:{short_url_id}")
+
+
+@pytest.mark.asyncio
+async def test_new_link_is_added_to_bloom_filter_with_the_link():
+    """
+    create_short_link reserves/fills the filter itself (no QR job needed), and while the worker
+    rebuilds the filter the new ID also goes into the one being built.
+    """
+    from app.bloom import ensure_bloom_filter, REBUILD_TARGET_SUFFIX
+    client = await redis_client.get_client()
+    await ensure_bloom_filter(client)
+    info = await client.bf().info(settings.BLOOM_FILTER_KEY)
+    assert info.capacity == settings.BLOOM_CAPACITY
+
+    short_id = await crud.create_short_link(client, "https://www.python.org/bloom")
+    assert await client.bf().exists(settings.BLOOM_FILTER_KEY, short_id)
+    assert await crud.get_long_url(client, short_id) == "https://www.python.org/bloom"
+
+    next_key = f"{settings.BLOOM_FILTER_KEY}{REBUILD_TARGET_SUFFIX}"
+    await client.bf().create(next_key, 0.01, 1000)
+    rebuilding_id = await crud.create_short_link(client, "https://www.python.org/rebuild")
+    assert await client.bf().exists(next_key, rebuilding_id)
+
+    await client.delete(next_key, f"link:{short_id}", f"link:{rebuilding_id}")
+
+
+@pytest.mark.asyncio
+async def test_redirect_reads_use_replicas_with_read_your_writes(monkeypatch):
+    """
+    Links are read from a healthy replica, falling back to the primary for links this process
+    just created, links the replica doesn't have yet, and replica errors.
+    The "replica" is database 1 of the same server: it never receives the writes.
+    """
+    from app.database import Replica
+    client = await redis_client.get_client()
+    replica = Replica(settings.REDIS_HOST, settings.REDIS_PORT, db=1)
+    replica.healthy = True
+    monkeypatch.setattr(redis_client, "replicas", [replica])
+    long_url = "https://www.python.org/replicas"
+
+    short_id = await crud.create_short_link(client, long_url)
+    assert short_id in redis_client._recent_writes
+    assert await crud.get_long_url(client, short_id) == long_url
+
+    # Not a recent write any more: the replica misses it and the primary answers
+    redis_client._recent_writes.clear()
+    assert await crud.get_long_url(client, short_id) == long_url
+
+    # Without read-your-writes the replica's answer stands
+    monkeypatch.setattr(settings, "READ_YOUR_WRITES_SECONDS", 0)
+    assert await crud.get_long_url(client, short_id) is None
+
+    # An unreachable replica leaves the rotation
+    await replica.client.close()
+    replica.client = aioredis.Redis(host=settings.REDIS_HOST, port=1, retry=None)
+    assert await crud.get_long_url(client, short_id) == long_url
+    assert not replica.healthy
+
+    await replica.client.close()
+    await client.delete(f"link:{short_id}")
+
+
+@pytest.mark.asyncio
+async def test_readiness_and_hot_link_prefill(monkeypatch):
+    """
+    /health/ready follows the startup warmup; the hot link cache is prefilled from the leaderboard
+    and then answers redirects without Redis.
+    """
+    from app.hot_cache import hot_links
+    monkeypatch.setattr(hot_links, "size", 10)
+    client = await redis_client.get_client()
+    short_id = await crud.create_short_link(client, "https://www.python.org/hot")
+    await client.zadd(settings.LEADERBOARD_KEY, {short_id: 1000})
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        monkeypatch.setattr(app.state, "ready", False)
+        assert (await ac.get("/health/ready")).status_code == 503
+        monkeypatch.setattr(app.state, "ready", True)
+        assert (await ac.get("/health/ready")).json() == {"ready": True}
+
+    hot_links.clear()
+    assert await crud.prefill_hot_links(client, 5) == 1
+    await client.delete(f"link:{short_id}")
+    assert await crud.get_long_url(client, short_id) == "https://www.python.org/hot"
+
+    hot_links.clear()
+    await client.zrem(settings.LEADERBOARD_KEY, short_id)
+
+
+@pytest.mark.asyncio
+async def test_redis_latency_and_cache_metrics():
+    """Commands and call sites get latency samples; stats cache, Bloom filter and rate limit are counted."""
+    from prometheus_client import REGISTRY
+    from app.bloom import ensure_bloom_filter
+
+    def sample(name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    client = await redis_client.get_client()
+    await ensure_bloom_filter(client)
+    before = {
+        "get": sample("core_api_redis_command_seconds_count", command="GET"),
+        "create": sample("core_api_redis_call_seconds_count", call_site="create_short_link"),
+        "hit": sample("core_api_cache_lookups_total", cache="stats", result="hit"),
+        "miss": sample("core_api_cache_lookups_total", cache="stats", result="miss"),
+        "negative": sample("core_api_bloom_checks_total", result="negative"),
+        "pass_miss": sample("core_api_bloom_pass_misses_total"),
+        "rejected": sample("core_api_rate_limit_rejections_total"),
+    }
+
+    short_id = await crud.create_short_link(client, "https://www.python.org/metrics")
+    await crud.get_link_stats(client, short_id)
+    await crud.get_link_stats(client, short_id)
+    assert await crud.get_long_url(client, "missing-id") is None
+    for _ in range(3):
+        await redis_client.is_rate_limited("rate_limit:metrics-test", limit=2, window=60)
+
+    assert sample("core_api_redis_command_seconds_count", command="GET") > before["get"]
+    assert sample("core_api_redis_call_seconds_count", call_site="create_short_link") == before["create"] + 1
+    assert sample("core_api_cache_lookups_total", cache="stats", result="miss") == before["miss"] + 1
+    assert sample("core_api_cache_lookups_total", cache="stats", result="hit") == before["hit"] + 1
+    assert sample("core_api_bloom_checks_total", result="negative") == before["negative"] + 1
+    assert sample("core_api_rate_limit_rejections_total") == before["rejected"] + 1
+
+    # A deleted link stays in the filter
+    await client.delete(f"link:{short_id}", f"cache:stats:{short_id}", "rate_limit:metrics-test")
+    assert await crud.get_long_url(client, short_id) is None
+    assert sample("core_api_bloom_pass_misses_total") == before["pass_miss"] + 1
+
+
+def test_trace_sampling_keeps_errors_and_slow_requests():
+    """
+    Redirects lose the head-sampling draw at ratio 0; their traces are exported only when the request
+    failed or was slow, children included. Other routes use the default ratio.
+    """
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+    from opentelemetry.trace import SpanKind, Status, StatusCode
+    from app.tracing import RouteRatioSampler, TailKeepProcessor, parse_route_ratios
+
+    exporter = InMemorySpanExporter()
+    sampler = RouteRatioSampler(1.0, parse_route_ratios("/{short_id}=0"), keep_unsampled_servers=True)
+    provider = TracerProvider(sampler=sampler)
+    provider.add_span_processor(TailKeepProcessor(SimpleSpanProcessor(exporter), keep_errors=True, slow_ms=10000))
+    tracer = provider.get_tracer("test")
+
+    def request(route, fail=False):
+        with tracer.start_as_current_span("GET", kind=SpanKind.SERVER, attributes={"http.route": route}) as span:
+            with tracer.start_as_current_span("redis"):
+                pass
+            if fail:
+                span.set_status(Status(StatusCode.ERROR))
+
+    request("/{short_id}")
+    assert exporter.get_finished_spans() == ()
+
+    request("/{short_id}", fail=True)
+    spans = exporter.get_finished_spans()
+    assert [span.name for span in spans] == ["redis", "GET"]
+    assert all(span.context.trace_flags.sampled for span in spans)
+    assert spans[0].parent.span_id == spans[1].context.span_id
+
+    exporter.clear()
+    request("/links")
+    assert len(exporter.get_finished_spans()) == 2
+    provider.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_profile_endpoint_needs_the_token_and_is_rate_limited(monkeypatch):
+    """Hidden without PROFILER_TOKEN; with it, a short wall profile shows the suspended coroutines."""
+    async def idle_consumer():
+        await asyncio.sleep(30)
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        assert (await ac.get("/admin/profile")).status_code == 404
+
+        monkeypatch.setattr(settings, "PROFILER_TOKEN", "s3cret")
+        monkeypatch.setattr(settings, "PROFILER_COOLDOWN_SECONDS", 60)
+        assert (await ac.get("/admin/profile", headers={"Authorization": "Bearer wrong"})).status_code == 404
+
+        headers = {"Authorization": "Bearer s3cret"}
+        assert (await ac.get("/admin/profile?seconds=1000", headers=headers)).status_code == 400
+
+        task = asyncio.create_task(idle_consumer())
+        response = await ac.get("/admin/profile?seconds=0.2&interval_ms=5", headers=headers)
+        task.cancel()
+        assert response.status_code == 200
+        assert any("(awaiting);" in line and "idle_consumer" in line for line in response.text.splitlines())
+
+        # Cooling down
+        assert (await ac.get("/admin/profile?seconds=0.2&format=speedscope", headers=headers)).status_code == 429
+        monkeypatch.setattr(settings, "PROFILER_COOLDOWN_SECONDS", 0)
+        response = await ac.get("/admin/profile?seconds=0.2&mode=cpu&format=speedscope", headers=headers)
+        assert response.json()["profiles"][0]["type"] == "sampled"
+
+
+@pytest.mark.asyncio
+async def test_link_snapshot_serves_redirects_while_redis_is_down(monkeypatch, tmp_path):
+    """
+    The snapshot holds the leaderboard's links (not the expired ones once they expire) and the links
+    hot caches served, warms the hot link cache, and answers redirects, untracked, when Redis fails.
+    """
+    from redis.exceptions import ConnectionError as RedisConnectionError
+    from app.hot_cache import hot_links
+    from app.snapshot import LinkSnapshot, report_served, take_snapshot
+    client = await redis_client.get_client()
+    hot_id = await crud.create_short_link(client, "https://www.python.org/snapshot")
+    expiring_id = await crud.create_short_link(client, "https://www.python.org/expiring", expires_in=60)
+    cached_id = await crud.create_short_link(client, "https://www.python.org/cached")
+    await client.zadd(settings.LEADERBOARD_KEY, {hot_id: 500, expiring_id: 400})
+
+    # Hits on the hot cache never reach the leaderboard: each process reports them for the snapshot
+    monkeypatch.setattr(hot_links, "size", 10)
+    hot_links.clear()
+    assert await crud.get_long_url(client, cached_id) == "https://www.python.org/cached"
+    assert await crud.resolve_long_url(client, cached_id) == ("https://www.python.org/cached", "hot_cache")
+    await report_served(60)
+    assert hot_links.take_served(10) == []
+    assert await client.zscore(settings.SNAPSHOT_SERVED_KEY, cached_id) == 1
+
+    path = str(tmp_path / "hot_links.snap")
+    assert await take_snapshot(path, 10) >= 3
+    assert not await client.exists(settings.SNAPSHOT_SERVED_KEY)
+    snapshot = LinkSnapshot()
+    assert snapshot.load(path)
+    assert snapshot.get(hot_id) == "https://www.python.org/snapshot"
+    assert snapshot.get(expiring_id) == "https://www.python.org/expiring"
+    assert snapshot.get(cached_id) == "https://www.python.org/cached"
+    assert snapshot.get("nope") is None
+    assert snapshot.hottest(2) == [(hot_id, "https://www.python.org/snapshot"),
+                                   (expiring_id, "https://www.python.org/expiring")]
+    with monkeypatch.context() as patch:
+        later = time.time() + 120
+        patch.setattr("app.snapshot.time.time", lambda: later)
+        assert snapshot.get(expiring_id) is None
+
+    async def redis_down(*args, **kwargs):
+        raise RedisConnectionError("Connection refused")
+
+    tracked = []
+
+    async def track_link_click(db, short_id, *args):
+        tracked.append(short_id)
+
+    monkeypatch.setattr("app.crud.link_snapshot", snapshot)
+    monkeypatch.setattr(crud, "track_link_click", track_link_click)
+    hot_links.clear()
+    with monkeypatch.context() as patch:
+        patch.setattr(redis_client, "read", redis_down)
+        assert await crud.resolve_long_url(client, hot_id) == ("https://www.python.org/snapshot", "snapshot")
+        with pytest.raises(RedisConnectionError):
+            await crud.get_long_url(client, "nope")
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as ac:
+            response = await ac.get(f"/{hot_id}", follow_redirects=False)
+            assert response.status_code == 307
+            assert response.headers["location"] == "https://www.python.org/snapshot"
+    assert tracked == []
+
+    hot_links.clear()
+    assert await crud.prefill_hot_links(client, 5) == 3
+    assert hot_links.get(hot_id) == "https://www.python.org/snapshot"
+
+    hot_links.clear()
+    snapshot.close()
+    await client.zrem(settings.LEADERBOARD_KEY, hot_id, expiring_id)
+    await client.delete(f"link:{hot_id}", f"link:{expiring_id}", f"link:{cached_id}")
+
+
+@pytest.mark.asyncio
+async def test_redis_breaker_and_adaptive_limit(monkeypatch):
+    """
+    The concurrency limit grows with fast calls, backs off once per slow round trip and sheds beyond it.
+    Connection errors open the breaker: stats answer 503 at once, hot redirects still work untracked,
+    and a successful probe after the open period closes it.
+    """
+    from prometheus_client import REGISTRY
+    from redis.exceptions import ConnectionError as RedisConnectionError
+    from app.breaker import CLOSED, OPEN, RedisGuard, RedisUnavailable
+    from app.hot_cache import hot_links
+
+    def sample(name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    guard = RedisGuard(failures=2, open_seconds=60, initial_limit=4, min_limit=2, max_limit=8,
+                       target_ms=50, backoff=0.5, click_share=0.5)
+    for _ in range(3):
+        assert guard.admit() is False
+    guard.release(False, 0.001, False)
+    assert guard.limit == 4.25
+    guard.release(False, 0.2, False)
+    guard.release(False, 0.2, False)
+    assert guard.limit == 2.125
+    slots = [guard.admit(), guard.admit(), guard.admit()]
+    assert guard.inflight == 3
+    with pytest.raises(RedisUnavailable):
+        guard.admit()
+    # Clicks yield to the rest well before the limit
+    assert not guard.admits_clicks()
+    for probe in slots:
+        guard.release(probe, 0.001, None)
+    assert guard.inflight == 0 and guard.admits_clicks()
+
+    client = await redis_client.get_client()
+    short_id = await crud.create_short_link(client, "https://www.python.org/breaker")
+    monkeypatch.setattr(hot_links, "size", 10)
+    hot_links.clear()
+    assert await crud.get_long_url(client, short_id) == "https://www.python.org/breaker"
+    monkeypatch.setattr(client, "guard", guard)
+    monkeypatch.setattr(redis_client, "guard", guard)
+    monkeypatch.setattr("app.crud.redis_guard", guard)
+
+    async def redis_down():
+        raise RedisConnectionError("Connection refused")
+
+    shed_before = sample("core_api_redis_shed_total", reason="open")
+    clicks_before = sample("core_api_clicks_shed_total", reason="open")
+    for _ in range(2):
+        with pytest.raises(RedisConnectionError):
+            await guard.call(redis_down)
+    assert guard.state == OPEN
+    assert sample("core_api_redis_breaker_state") == 2
+    with pytest.raises(RedisUnavailable):
+        await client.get(f"link:{short_id}")
+    assert sample("core_api_redis_shed_total", reason="open") == shed_before + 1
+    # RedisClient methods pass it on instead of logging it as a Redis error and failing open
+    errors_before = sample("core_api_bloom_checks_total", result="error")
+    with pytest.raises(RedisUnavailable):
+        await redis_client.check_bloom_filter(settings.BLOOM_FILTER_KEY, short_id, client)
+    assert sample("core_api_bloom_checks_total", result="error") == errors_before
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        response = await ac.get(f"/{short_id}/stats")
+        assert response.status_code == 503
+        assert int(response.headers["retry-after"]) > 1
+        response = await ac.get(f"/{short_id}", follow_redirects=False)
+        assert response.status_code == 307
+    await crud.track_link_click(client, short_id, "127.0.0.1")
+    assert sample("core_api_clicks_shed_total", reason="open") == clicks_before + 1
+
+    # Open period over: the next command is the probe, and its success closes the breaker
+    monkeypatch.setattr(guard, "_opened_at", time.monotonic() - 61)
+    assert await client.get(f"link:{short_id}") is not None
+    assert guard.state == CLOSED and sample("core_api_redis_breaker_state") == 0
+    # Pipelines take a slot too
+    other_id = await crud.create_short_link(client, "https://www.python.org/breaker/2")
+    assert guard.inflight == 0
+
+    hot_links.clear()
+    await client.delete(f"link:{short_id}", f"link:{other_id}")
+
+
+@pytest.mark.asyncio
+async def test_consumer_lag_is_unknown_rather_than_the_pending_count(monkeypatch):
+    """Without Redis's lag, entries all undelivered give the stream length; otherwise the lag is unknown."""
+    client = await redis_client.get_client()
+    stream, group = f"test_lag:{time.time_ns()}", "test_group"
+    await client.xgroup_create(stream, group, id="0", mkstream=True)
+    for number in range(3):
+        await client.xadd(stream, {"n": number})
+    await client.xreadgroup(group, "consumer", {stream: ">"}, count=1)
+    assert await redis_client.get_consumer_lag(stream, group) == 2
+
+    async def groups_without_lag(name):
+        return [{"name": group, "pending": 1, "lag": None, "last-delivered-id": last_delivered}]
+
+    monkeypatch.setattr(client, "xinfo_groups", groups_without_lag)
+    last_delivered = "0-1"
+    assert await redis_client.get_consumer_lag(stream, group) == 3
+    last_delivered = (await client.xrange(stream, count=1))[0][0]
+    assert await redis_client.get_consumer_lag(stream, group) is None
+    await client.delete(stream)
@@ -0,0 +1,233 @@
+"""
+Columnar archive of raw analytics events.
+
+A separate consumer group on the analytics stream writes every event to
+
+    ARCHIVE_PATH/date=YYYY-MM-DD/hour=HH/part-<consumer>-<created_ms>.arrows
+
+as zstd-compressed Arrow IPC record batches. A batch is fsync'ed before its messages are
+ACKed, so an ACKed event is always on disk; a crash can only cause a batch to be written
+twice (the `id` column is the stream message ID, deduplicate on it if that matters).
+Once an hour is closed its file is compacted into a Parquet file next to it.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from .database import redis_client
+from .config import settings, logger
+from . import lifecycle, metrics
+
+ARCHIVE_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("ts", pa.timestamp("ms", tz="UTC")),
+    ("short_id", pa.string()),
+    ("w", pa.int32()),
+    ("ip", pa.string()),
+    ("ref", pa.string()),
+    ("ua", pa.string()),
+    ("lang", pa.string()),
+])
+# Event fields copied as-is (missing ones are stored as null)
+_TEXT_FIELDS = ("short_id", "ip", "ref", "ua", "lang")
+
+HOUR_MS = 3600 * 1000
+
+
+def _fsync_dir(path: str):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def partition_dir(hour_ms: int) -> str:
+    hour = datetime.fromtimestamp(hour_ms / 1000, tz=timezone.utc)
+    return os.path.join(settings.ARCHIVE_PATH, f"date={hour:%Y-%m-%d}", f"hour={hour:%H}")
+
+
+def to_record_batch(messages: list) -> pa.RecordBatch:
+    """[(message_id, message_data), ...] -> one record batch in ARCHIVE_SCHEMA."""
+    columns = {
+        "id": [message_id for message_id, _ in messages],
+        "ts": [int(message_id.split("-")[0]) for message_id, _ in messages],
+        "w": [int(data.get("w", 1)) for _, data in messages],
+    }
+    for field in _TEXT_FIELDS:
+        columns[field] = [data.get(field) for _, data in messages]
+    return pa.RecordBatch.from_pydict(columns, schema=ARCHIVE_SCHEMA)
+
+
+def compact_to_parquet(arrow_path: str) -> str:
+    """Rewrites a closed Arrow IPC file as Parquet (written aside, fsync'ed, then swapped in)."""
+    with pa.OSFile(arrow_path, "rb") as source:
+        table = ipc.open_stream(source).read_all()
+
+    parquet_path = arrow_path[:-len(".arrows")] + ".parquet"
+    tmp_path = f"{parquet_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pq.write_table(table, f, compression=settings.ARCHIVE_COMPRESSION)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, parquet_path)
+    _fsync_dir(os.path.dirname(parquet_path))
+    os.remove(arrow_path)
+    return parquet_path
+
+
+class HourlyArchive:
+    """
+    The Arrow IPC stream file of one hour partition, appended to one record batch at a time.
+    The stream format has no footer, so a file cut short by a crash is still readable
+    up to its last complete batch.
+    """
+
+    def __init__(self, hour_ms: int):
+        self.hour_ms = hour_ms
+        directory = partition_dir(hour_ms)
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"part-{settings.CONSUMER_NAME}-{int(time.time() * 1000)}.arrows")
+        self._file = open(self.path, "wb")
+        self._writer = ipc.new_stream(
+            self._file, ARCHIVE_SCHEMA,
+            options=ipc.IpcWriteOptions(compression=settings.ARCHIVE_COMPRESSION)
+        )
+        _fsync_dir(directory)
+
+    def append(self, batch: pa.RecordBatch):
+        self._writer.write_batch(batch)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> str:
+        self._writer.close()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        if settings.ARCHIVE_COMPACT_TO_PARQUET:
+            return compact_to_parquet(self.path)
+        return self.path
+
+
+class EventArchiver:
+    """
+    Consumer of the archive group. Memory stays bounded: at most ARCHIVE_FLUSH_ROWS events
+    are buffered, and an hour's file is closed ARCHIVE_LATE_SECONDS after the hour ends.
+    """
+
+    def __init__(self, stream_name: str, group_name: str):
+        self.stream_name = stream_name
+        self.group_name = group_name
+        self._buffer: list = []
+        self._buffer_started = 0.0
+        self._archives: dict[int, HourlyArchive] = {}
+        self._last_reclaim = time.monotonic()
+
+    async def run(self):
+        # A new archive group starts with the history still in the stream, not just new events
+        await redis_client.create_consumer_group(self.stream_name, self.group_name, start_id="0")
+        logger.info(f"Archiving '{self.stream_name}' as '{self.group_name}' into {settings.ARCHIVE_PATH}...")
+
+        # After a restart this consumer's own unACKed messages come first (XREADGROUP ... 0)
+        await self._drain_own_pending()
+
+        try:
+            while not lifecycle.is_stopping():
+                room = settings.ARCHIVE_FLUSH_ROWS - len(self._buffer)
+                messages = await redis_client.read_stream_group(
+                    self.stream_name, self.group_name, settings.CONSUMER_NAME,
+                    count=max(1, min(room, settings.STREAM_BATCH_SIZE)),
+                    block_ms=settings.STREAM_BLOCK_MS
+                )
+                self._add(messages or [])
+
+                if len(self._buffer) >= settings.ARCHIVE_FLUSH_ROWS or (
+                        self._buffer and time.monotonic() - self._buffer_started >= settings.ARCHIVE_FLUSH_SECONDS):
+                    await self.flush()
+
+                if time.monotonic() - self._last_reclaim >= settings.RECLAIM_INTERVAL_SECONDS:
+                    await self._reclaim_abandoned()
+                    await self._close_finished_hours()
+        finally:
+            # Shutdown: whatever was read is written and ACKed, then every file is closed
+            await self.flush()
+            await self._close_finished_hours(close_all=True)
+            logger.info(f"Archiver for '{self.stream_name}' drained and stopped.")
+
+    def _add(self, messages: list):
+        if messages and not self._buffer:
+            self._buffer_started = time.monotonic()
+        self._buffer.extend(messages)
+
+    async def _drain_own_pending(self):
+        while not lifecycle.is_stopping():
+            messages = await redis_client.read_stream_group(
+                self.stream_name, self.group_name, settings.CONSUMER_NAME,
+                count=settings.ARCHIVE_FLUSH_ROWS, start_id="0"
+            )
+            if not messages:
+                return
+            self._add(messages)
+            await self.flush()
+
+    async def _reclaim_abandoned(self):
+        """Takes over archive messages left pending by consumers that went away (XAUTOCLAIM)."""
+        self._last_reclaim = time.monotonic()
+        start_id = "0-0"
+        while len(self._buffer) < settings.ARCHIVE_FLUSH_ROWS:
+            start_id, messages = await redis_client.autoclaim_messages(
+                self.stream_name, self.group_name, settings.CONSUMER_NAME,
+                min_idle_ms=settings.RECLAIM_MIN_IDLE_MS,
+                start_id=start_id,
+                count=settings.RECLAIM_BATCH_SIZE
+            )
+            if messages:
+                metrics.RECLAIMED.labels(stream=self.stream_name).inc(len(messages))
+                self._add(messages)
+            if start_id == "0-0":
+                return
+
+    async def flush(self):
+        """Appends the buffer to the hour files, fsyncs them, and only then ACKs the messages."""
+        if not self._buffer:
+            return
+        messages, self._buffer = self._buffer, []
+
+        # Entries trimmed from the stream come back without data from a reclaim
+        live = [(message_id, data) for message_id, data in messages if data]
+
+        by_hour: dict[int, list] = {}
+        for message_id, data in live:
+            hour_ms = int(message_id.split("-")[0]) // HOUR_MS * HOUR_MS
+            by_hour.setdefault(hour_ms, []).append((message_id, data))
+
+        start = time.perf_counter()
+        for hour_ms, hour_messages in by_hour.items():
+            archive = self._archives.get(hour_ms)
+            if archive is None:
+                archive = await asyncio.to_thread(HourlyArchive, hour_ms)
+                self._archives[hour_ms] = archive
+            # Blocking write + fsync off the event loop
+            await asyncio.to_thread(archive.append, to_record_batch(hour_messages))
+
+        await redis_client.acknowledge_messages(
+            self.stream_name, self.group_name, *(message_id for message_id, _ in messages)
+        )
+        metrics.ARCHIVED_EVENTS.labels(stream=self.stream_name).inc(len(live))
+        metrics.ARCHIVE_FLUSH_SECONDS.observe(time.perf_counter() - start)
+
+    async def _close_finished_hours(self, close_all: bool = False):
+        now_ms = int(time.time() * 1000)
+        for hour_ms in list(self._archives):
+            if close_all or now_ms >= hour_ms + HOUR_MS + settings.ARCHIVE_LATE_SECONDS * 1000:
+                archive = self._archives.pop(hour_ms)
+                path = await asyncio.to_thread(archive.close)
+                logger.info(f"Archive for hour {partition_dir(hour_ms)} closed: {path}")
+
+
+async def run_archiver(stream_name: str, group_name: str):
+    await EventArchiver(stream_name, group_name).run()
@@ -0,0 +1,553 @@
+"""
+Rebuilds analytics aggregates (total_clicks, leaderboard, ts:clicks:*, uv:*) from raw click events.
+
+Usage:
+    python -m app.backfill [--source archive|stream] [--since YYYY-MM-DD] [--until YYYY-MM-DD]
+                           [--from-id 0-0] [--processes N] [--targets totals,leaderboard,ts,uv]
+                           [--dry-run | --diff] [--increment]
+
+This process reads events as Arrow record batches, either from the event archive or from the
+live stream starting at --from-id. It splits every batch by crc32(short_id) % N and hands the
+pieces to N aggregator processes. Each aggregator owns its short_ids: it deduplicates and
+group-bys its rows with Arrow and then writes its keys with pipelines.
+
+Without --increment the aggregates of every link seen are replaced, so the source must cover
+that link's whole history. Use --increment to replay a gap on top of existing counters.
+"""
+import argparse
+import asyncio
+import glob
+import multiprocessing
+import os
+import queue
+import re
+import time
+import zlib
+from datetime import datetime, timezone
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from .database import redis_client
+from .config import settings, logger
+from .archiver import to_record_batch
+from . import keys
+
+TARGETS = ("totals", "leaderboard", "ts", "uv")
+COLUMNS = ["id", "ts", "short_id", "w", "ip"]
+
+READ_BATCH_ROWS = 65536
+PIPELINE_CHUNK = 1000
+PROGRESS_INTERVAL_SECONDS = 2.0
+# How often a blocked reader checks that the aggregators are still alive
+LIVENESS_CHECK_SECONDS = 1.0
+# Partial aggregates are re-aggregated once this many have piled up
+COMPACT_EVERY = 32
+
+_PARTITION_RE = re.compile(r"date=(\d{4}-\d{2}-\d{2})/hour=(\d{2})/")
+
+
+# --- Reading ---
+def archive_partitions(since: str | None, until: str | None) -> list[list[str]]:
+    """Archive files grouped by hour partition, oldest first (dates are inclusive)."""
+    partitions: dict[tuple, list] = {}
+    for path in glob.glob(os.path.join(settings.ARCHIVE_PATH, "date=*", "hour=*", "part-*")):
+        match = _PARTITION_RE.search(path.replace(os.sep, "/"))
+        if not match or not path.endswith((".parquet", ".arrows")):
+            continue
+        date, hour = match.groups()
+        if (since and date < since) or (until and date > until):
+            continue
+        partitions.setdefault((date, hour), []).append(path)
+    return [sorted(partitions[key]) for key in sorted(partitions)]
+
+
+def read_archive_file(path: str):
+    if path.endswith(".parquet"):
+        yield from pq.ParquetFile(path).iter_batches(batch_size=READ_BATCH_ROWS, columns=COLUMNS)
+        return
+
+    # An hour still open (or cut short by a crash) is an Arrow IPC stream: read up to its last full batch
+    with pa.OSFile(path, "rb") as source:
+        reader = ipc.open_stream(source)
+        while True:
+            try:
+                batch = reader.read_next_batch()
+            except StopIteration:
+                return
+            except pa.ArrowInvalid:
+                logger.warning(f"'{path}' ends with an incomplete batch; reading what is complete.")
+                return
+            yield batch.select(COLUMNS)
+
+
+async def read_stream_batches(stream_name: str, from_id: str):
+    start = from_id
+    while True:
+        entries = await redis_client.read_stream_range(stream_name, start=start, count=READ_BATCH_ROWS)
+        if not entries:
+            return
+        yield to_record_batch(entries).select(COLUMNS)
+        start = f"({entries[-1][0]}"
+
+
+def split_by_shard(batch: pa.RecordBatch, shards: int) -> list[pa.RecordBatch]:
+    """Splits a batch into one piece per aggregator (crc32 of short_id, hashed once per distinct value)."""
+    batch = batch.filter(pc.is_valid(batch.column("short_id")))
+    encoded = pc.dictionary_encode(batch.column("short_id"))
+    value_shards = np.fromiter(
+        (zlib.crc32(value.encode()) % shards for value in encoded.dictionary.to_pylist()),
+        dtype=np.int64, count=len(encoded.dictionary)
+    )
+    row_shards = value_shards[encoded.indices.to_numpy(zero_copy_only=False)]
+    return [batch.filter(pa.array(row_shards == shard)) for shard in range(shards)]
+
+
+# --- Aggregation (one process per shard) ---
+def _sum_by(table: pa.Table, keys: list, value: str) -> pa.Table:
+    """GROUP BY keys, SUM(value) AS w_sum (columns named explicitly, whatever the pyarrow version)."""
+    grouped = table.group_by(keys).aggregate([(value, "sum")])
+    return pa.table({**{key: grouped.column(key) for key in keys}, "w_sum": grouped.column(f"{value}_sum")})
+
+
+def _distinct(table: pa.Table, keys: list) -> pa.Table:
+    return table.group_by(keys).aggregate([]).select(keys)
+
+
+class ShardAggregator:
+    """
+    Vectorized group-by over the events of one shard.
+    Raw rows are only kept until the end of their dedup scope (an archive hour partition,
+    which is where a crashed archiver can have written a batch twice).
+    """
+
+    def __init__(self, targets: set, now_ms: int):
+        self.targets = targets
+        self.events = 0
+        self.duplicates = 0
+        self._rows: list = []
+        self._partials: dict[str, list] = {"totals": [], "ts": [], "uv": [], "uv_day": [], "uv_hour": []}
+        # Nothing older than what the worker itself keeps is rebuilt
+        self._ts_cutoff = now_ms - settings.CLICKS_TS_RETENTION_MS
+        self._day_cutoff = now_ms - settings.UV_DAILY_TTL_SECONDS * 1000
+        self._hour_cutoff = now_ms - settings.UV_HOURLY_TTL_SECONDS * 1000
+
+    def add(self, batch: pa.RecordBatch):
+        if batch.num_rows:
+            self._rows.append(batch)
+
+    def seal(self):
+        """Deduplicates the rows of the finished scope and folds them into the partial aggregates."""
+        if not self._rows:
+            return
+        table = pa.Table.from_batches(self._rows)
+        self._rows = []
+
+        ids = table.column("id").to_numpy(zero_copy_only=False)
+        _, first = np.unique(ids, return_index=True)
+        if len(first) < table.num_rows:
+            self.duplicates += table.num_rows - len(first)
+            table = table.take(np.sort(first))
+        self.events += table.num_rows
+
+        table = table.set_column(
+            table.schema.get_field_index("w"), "w", pc.fill_null(table.column("w"), 1)
+        )
+        ts_ms = pc.cast(table.column("ts"), pa.int64())
+
+        if self.targets & {"totals", "leaderboard"}:
+            self._partials["totals"].append(_sum_by(table, ["short_id"], "w"))
+        if "ts" in self.targets:
+            recent = table.filter(pc.greater_equal(ts_ms, self._ts_cutoff))
+            self._partials["ts"].append(_sum_by(recent, ["short_id", "ts"], "w"))
+        if "uv" in self.targets:
+            visits = table.filter(pc.and_(pc.is_valid(table.column("ip")), pc.not_equal(table.column("ip"), "")))
+            visit_ms = pc.cast(visits.column("ts"), pa.int64())
+            self._partials["uv"].append(_distinct(visits, ["short_id", "ip"]))
+            for name, fmt, cutoff in (("uv_day", "%Y%m%d", self._day_cutoff),
+                                      ("uv_hour", "%Y%m%d%H", self._hour_cutoff)):
+                if name == "uv_hour" and not settings.UV_HOURLY_BUCKETS:
+                    continue
+                in_range = visits.filter(pc.greater_equal(visit_ms, cutoff))
+                bucketed = in_range.append_column("bucket", pc.strftime(in_range.column("ts"), format=fmt))
+                self._partials[name].append(_distinct(bucketed, ["short_id", "bucket", "ip"]))
+
+        for name, parts in self._partials.items():
+            if len(parts) >= COMPACT_EVERY:
+                self._partials[name] = [self._combine(name, parts)]
+
+    @staticmethod
+    def _combine(name: str, parts: list) -> pa.Table:
+        table = pa.concat_tables(parts)
+        if name == "totals":
+            return _sum_by(table, ["short_id"], "w_sum")
+        if name == "ts":
+            return _sum_by(table, ["short_id", "ts"], "w_sum")
+        return _distinct(table, table.column_names)
+
+    def result(self) -> dict[str, pa.Table]:
+        self.seal()
+        return {name: self._combine(name, parts) for name, parts in self._partials.items() if parts}
+
+
+# --- Writing ---
+def _grouped(table: pa.Table, *columns: str):
+    """Yields (short_id, {column: [values]}) from a table sorted by short_id."""
+    table = table.sort_by([("short_id", "ascending")])
+    short_ids = table.column("short_id").to_pylist()
+    values = {column: table.column(column).to_pylist() for column in columns}
+    start = 0
+    for end in range(1, len(short_ids) + 1):
+        if end == len(short_ids) or short_ids[end] != short_ids[start]:
+            yield short_ids[start], {column: values[column][start:end] for column in columns}
+            start = end
+
+
+class PipelineWriter:
+    """Queues commands and sends them PIPELINE_CHUNK at a time."""
+
+    def __init__(self, client):
+        self.client = client
+        self.pipe = client.pipeline(transaction=False)
+        self.queued = 0
+        self.commands = 0
+
+    async def add(self, *command):
+        self.pipe.execute_command(*command)
+        self.queued += 1
+        if self.queued >= PIPELINE_CHUNK:
+            await self.flush()
+
+    async def flush(self):
+        if self.queued:
+            await self.pipe.execute()
+            self.commands += self.queued
+            self.queued = 0
+
+
+async def write_aggregates(results: dict, targets: set, increment: bool, now_ms: int) -> int:
+    client = redis_client.client
+    writer = PipelineWriter(client)
+
+    totals = results.get("totals")
+    if totals is not None:
+        for short_id, clicks in zip(totals.column("short_id").to_pylist(), totals.column("w_sum").to_pylist()):
+            if "totals" in targets:
+                await writer.add("HINCRBY" if increment else "HSET", keys.data(short_id), "total_clicks", clicks)
+            if "leaderboard" in targets:
+                if increment:
+                    await writer.add("ZINCRBY", keys.leaderboard(short_id), clicks, short_id)
+                else:
+                    await writer.add("ZADD", keys.leaderboard(short_id), clicks, short_id)
+
+    if "ts" in results:
+        for short_id, rows in _grouped(results["ts"], "ts", "w_sum"):
+            key = keys.clicks_timeseries(short_id)
+            if not increment:
+                await writer.add("DEL", key)
+            for timestamp, clicks in zip(rows["ts"], rows["w_sum"]):
+                await writer.add("TS.ADD", key, int(timestamp.timestamp() * 1000), clicks,
+                                 "RETENTION", settings.CLICKS_TS_RETENTION_MS, "ON_DUPLICATE", "SUM")
+
+    if "uv" in results:
+        for short_id, rows in _grouped(results["uv"], "ip"):
+            await _write_hll(writer, keys.unique_visitors(short_id), rows["ip"], increment, None)
+
+    for name, bucket_key, fmt, ttl in (
+        ("uv_day", keys.unique_visitors_day, "%Y%m%d", settings.UV_DAILY_TTL_SECONDS),
+        ("uv_hour", keys.unique_visitors_hour, "%Y%m%d%H", settings.UV_HOURLY_TTL_SECONDS),
+    ):
+        if name not in results:
+            continue
+        for short_id, rows in _grouped(results[name], "bucket", "ip"):
+            by_bucket: dict[str, list] = {}
+            for bucket, ip in zip(rows["bucket"], rows["ip"]):
+                by_bucket.setdefault(bucket, []).append(ip)
+            for bucket, ips in by_bucket.items():
+                # Same lifetime the bucket would have had: TTL counted from its first click
+                started = datetime.strptime(bucket, fmt).replace(tzinfo=timezone.utc)
+                remaining = ttl - int(now_ms / 1000 - started.timestamp())
+                if remaining > 0:
+                    await _write_hll(writer, bucket_key(short_id, bucket), ips, increment, remaining)
+
+    await writer.flush()
+    return writer.commands
+
+
+async def _write_hll(writer: PipelineWriter, key: str, members: list, increment: bool, ttl: int | None):
+    if not increment:
+        await writer.add("DEL", key)
+    for start in range(0, len(members), PIPELINE_CHUNK):
+        await writer.add("PFADD", key, *members[start:start + PIPELINE_CHUNK])
+    if ttl is not None:
+        await writer.add("EXPIRE", key, ttl)
+
+
+async def diff_aggregates(results: dict, targets: set, sample: int = 10) -> dict:
+    """Compares rebuilt values with what Redis holds now. Nothing is written."""
+    client = redis_client.client
+    mismatches: dict[str, int] = {}
+    samples: list[str] = []
+
+    def report(target: str, key: str, expected, actual):
+        mismatches[target] = mismatches.get(target, 0) + 1
+        if len(samples) < sample:
+            samples.append(f"{target} {key}: rebuilt={expected} redis={actual}")
+
+    totals = results.get("totals")
+    if totals is not None:
+        short_ids = totals.column("short_id").to_pylist()
+        expected = totals.column("w_sum").to_pylist()
+        for start in range(0, len(short_ids), PIPELINE_CHUNK):
+            chunk = short_ids[start:start + PIPELINE_CHUNK]
+            async with client.pipeline(transaction=False) as pipe:
+                for short_id in chunk:
+                    pipe.hget(keys.data(short_id), "total_clicks")
+                    pipe.zscore(keys.leaderboard(short_id), short_id)
+                replies = await pipe.execute()
+            for i, short_id in enumerate(chunk):
+                clicks = expected[start + i]
+                current, score = replies[2 * i], replies[2 * i + 1]
+                if "totals" in targets and int(current or 0) != clicks:
+                    report("totals", keys.data(short_id), clicks, current)
+                if "leaderboard" in targets and int(score or 0) != clicks:
+                    report("leaderboard", short_id, clicks, score)
+
+    if "uv" in results:
+        counts = results["uv"].group_by("short_id").aggregate([("ip", "count")])
+        short_ids = counts.column("short_id").to_pylist()
+        expected = counts.column("ip_count").to_pylist()
+        for start in range(0, len(short_ids), PIPELINE_CHUNK):
+            chunk = short_ids[start:start + PIPELINE_CHUNK]
+            async with client.pipeline(transaction=False) as pipe:
+                for short_id in chunk:
+                    pipe.pfcount(keys.unique_visitors(short_id))
+                replies = await pipe.execute()
+            for i, short_id in enumerate(chunk):
+                exact = expected[start + i]
+                # HyperLogLog has a ~0.81% standard error: only flag clear differences
+                if abs(replies[i] - exact) > max(1, exact * 0.03):
+                    report("uv", keys.unique_visitors(short_id), exact, replies[i])
+
+    if "ts" in results:
+        sums = _sum_by(results["ts"], ["short_id"], "w_sum")
+        short_ids = sums.column("short_id").to_pylist()
+        expected = sums.column("w_sum").to_pylist()
+        for start in range(0, len(short_ids), PIPELINE_CHUNK):
+            chunk = short_ids[start:start + PIPELINE_CHUNK]
+            async with client.pipeline(transaction=False) as pipe:
+                for short_id in chunk:
+                    pipe.execute_command("TS.RANGE", keys.clicks_timeseries(short_id), "-", "+",
+                                         "AGGREGATION", "sum", 2 ** 62)
+                replies = await pipe.execute(raise_on_error=False)
+            for i, short_id in enumerate(chunk):
+                reply = replies[i]
+                actual = 0 if isinstance(reply, Exception) else int(sum(float(value) for _, value in reply))
+                if actual != expected[start + i]:
+                    report("ts", keys.clicks_timeseries(short_id), expected[start + i], actual)
+
+    return {"mismatches": mismatches, "samples": samples}
+
+
+def _aggregator_process(index: int, inbox, outbox, targets: set, mode: str, increment: bool, now_ms: int):
+    aggregator = ShardAggregator(targets, now_ms)
+    while True:
+        item = inbox.get()
+        if item is None:
+            break
+        if item == "seal":
+            aggregator.seal()
+        else:
+            aggregator.add(item)
+
+    started = time.perf_counter()
+    results = aggregator.result()
+    summary = {
+        "shard": index,
+        "events": aggregator.events,
+        "duplicates": aggregator.duplicates,
+        "links": results["totals"].num_rows if "totals" in results else 0,
+        "ts_points": results["ts"].num_rows if "ts" in results else 0,
+        "uv_members": sum(results[name].num_rows for name in ("uv", "uv_day", "uv_hour") if name in results),
+    }
+
+    async def apply():
+        await redis_client.connect()
+        try:
+            if mode == "diff":
+                summary.update(await diff_aggregates(results, targets))
+            else:
+                summary["commands"] = await write_aggregates(results, targets, increment, now_ms)
+        finally:
+            await redis_client.disconnect()
+
+    if mode != "dry-run":
+        asyncio.run(apply())
+    summary["seconds"] = round(time.perf_counter() - started, 2)
+    outbox.put(summary)
+
+
+# --- Driver ---
+class AggregatorDied(RuntimeError):
+    pass
+
+
+def _put(inbox, worker, item):
+    """Queues an item for an aggregator, waiting while its inbox is full; raises if the process has died."""
+    while True:
+        try:
+            inbox.put(item, timeout=LIVENESS_CHECK_SECONDS)
+            return
+        except queue.Full:
+            if not worker.is_alive():
+                raise AggregatorDied(f"Aggregator process {worker.name} exited with code {worker.exitcode}.")
+
+
+def _collect(outbox, workers) -> list[dict]:
+    """One summary per aggregator; stops waiting once one of them has died without reporting."""
+    summaries = []
+    while len(summaries) < len(workers):
+        try:
+            summaries.append(outbox.get(timeout=LIVENESS_CHECK_SECONDS))
+        except queue.Empty:
+            # A process that exited cleanly has flushed its summary already: an empty queue means it's lost
+            if any(not worker.is_alive() for worker in workers):
+                break
+    return summaries
+
+
+class Progress:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.events = 0
+        self._reported = self.started
+
+    def add(self, rows: int):
+        self.events += rows
+        now = time.monotonic()
+        if now - self._reported >= PROGRESS_INTERVAL_SECONDS:
+            self._reported = now
+            logger.info(f"Backfill: {self.events} events read ({self.rate():.0f} events/s).")
+
+    def rate(self) -> float:
+        return self.events / max(time.monotonic() - self.started, 1e-9)
+
+
+async def run_backfill(source: str, processes: int, targets: set, mode: str, increment: bool,
+                       since: str | None = None, until: str | None = None, from_id: str = "0-0") -> list[dict]:
+    now_ms = int(time.time() * 1000)
+    context = multiprocessing.get_context("spawn")
+    outbox = context.Queue()
+    # Bounded inboxes: the reader waits for slow aggregators instead of buffering the input
+    inboxes = [context.Queue(maxsize=8) for _ in range(processes)]
+    workers = [
+        context.Process(target=_aggregator_process, name=f"backfill-{index}",
+                        args=(index, inboxes[index], outbox, targets, mode, increment, now_ms))
+        for index in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+
+    progress = Progress()
+
+    def dispatch(batch: pa.RecordBatch):
+        progress.add(batch.num_rows)
+        for inbox, worker, piece in zip(inboxes, workers, split_by_shard(batch, processes)):
+            if piece.num_rows:
+                _put(inbox, worker, piece)
+
+    def seal():
+        for inbox, worker in zip(inboxes, workers):
+            _put(inbox, worker, "seal")
+
+    try:
+        if source == "archive":
+            for partition in archive_partitions(since, until):
+                for path in partition:
+                    for batch in read_archive_file(path):
+                        dispatch(batch)
+                # A duplicated batch can only be in the same hour partition
+                seal()
+        else:
+            await redis_client.connect()
+            try:
+                # Every shard of the stream (STREAM_SHARDS); a link's events are all in one of them
+                for stream_name in keys.streams(settings.ANALYTICS_STREAM_NAME):
+                    async for batch in read_stream_batches(stream_name, from_id):
+                        dispatch(batch)
+                        seal()
+            finally:
+                await redis_client.disconnect()
+        for inbox, worker in zip(inboxes, workers):
+            _put(inbox, worker, None)
+    except BaseException:
+        # An aggregator died or the input couldn't be read: don't let the others write partial aggregates
+        for worker in workers:
+            worker.terminate()
+            worker.join()
+        raise
+
+    logger.info(f"Backfill: read {progress.events} events at {progress.rate():.0f} events/s; aggregating...")
+    summaries = _collect(outbox, workers)
+    if len(summaries) < len(workers):
+        for worker in workers:
+            worker.terminate()
+    for worker in workers:
+        worker.join()
+    if len(summaries) < len(workers) or any(worker.exitcode for worker in workers):
+        raise RuntimeError("An aggregator process failed; nothing reported for its shard.")
+    return sorted(summaries, key=lambda summary: summary["shard"])
+
+
+def print_report(summaries: list[dict], mode: str, elapsed: float):
+    events = sum(summary["events"] for summary in summaries)
+    for summary in summaries:
+        line = (f"shard {summary['shard']}: {summary['events']} events ({summary['duplicates']} duplicates), "
+                f"{summary['links']} links, {summary['ts_points']} ts points, {summary['uv_members']} uv members")
+        if mode == "write":
+            line += f", {summary['commands']} commands in {summary['seconds']}s"
+        print(line)
+        for sample in summary.get("samples", []):
+            print(f"    {sample}")
+    if mode == "diff":
+        mismatches: dict[str, int] = {}
+        for summary in summaries:
+            for target, count in summary["mismatches"].items():
+                mismatches[target] = mismatches.get(target, 0) + count
+        print(f"Mismatches: {mismatches or 'none'}")
+    print(f"{events} events in {elapsed:.1f}s ({events / max(elapsed, 1e-9):.0f} events/s), mode={mode}.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild analytics aggregates from raw click events.")
+    parser.add_argument("--source", choices=["archive", "stream"], default="archive")
+    parser.add_argument("--since", help="First archive date to read (YYYY-MM-DD)")
+    parser.add_argument("--until", help="Last archive date to read (YYYY-MM-DD)")
+    parser.add_argument("--from-id", default="0-0", help="First stream ID to read (--source stream)")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--targets", default=",".join(TARGETS),
+                        help=f"Comma-separated subset of {', '.join(TARGETS)}")
+    modes = parser.add_mutually_exclusive_group()
+    modes.add_argument("--dry-run", action="store_true", help="Aggregate and report, write nothing")
+    modes.add_argument("--diff", action="store_true", help="Compare rebuilt values with Redis, write nothing")
+    parser.add_argument("--increment", action="store_true",
+                        help="Add to existing aggregates instead of replacing them")
+    args = parser.parse_args()
+
+    targets = set(args.targets.split(","))
+    unknown = targets - set(TARGETS)
+    if unknown:
+        parser.error(f"Unknown targets: {', '.join(sorted(unknown))}")
+    mode = "dry-run" if args.dry_run else "diff" if args.diff else "write"
+
+    started = time.monotonic()
+    summaries = asyncio.run(run_backfill(
+        args.source, max(1, args.processes), targets, mode, args.increment,
+        since=args.since, until=args.until, from_id=args.from_id
+    ))
+    print_report(summaries, mode, time.monotonic() - started)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Rebuilds of the Bloom filter of existing short_ids (BLOOM_FILTER_KEY, one per shard with BLOOM_SHARDS > 1).
+
+Entries can't be removed from a Bloom filter, so expired links would pass it forever. A rebuild
+reserves a fresh filter under the ":next" suffix, streams the live links into it with SCAN and
+swaps it in with RENAME, shard by shard. core-api inserts new IDs into ":next" as well whenever it exists
+(BF.INSERT ... NOCREATE, core-api/app/bloom.py), so links created during the SCAN are kept.
+
+    python -m app.bloom rebuild [--capacity N] [--error-rate F] [--expansion N]
+"""
+import argparse
+import asyncio
+import time
+from .database import redis_client
+from .config import settings, logger
+from . import keys, lifecycle
+
+# Set while a rebuild runs, so only one process rebuilds at a time
+REBUILD_MARKER_SUFFIX = ":rebuilding"
+# The filter being built; core-api adds new IDs to it while it exists
+REBUILD_TARGET_SUFFIX = ":next"
+# A rebuild that hasn't finished in this long is assumed dead and may be retried
+REBUILD_MARKER_TTL_SECONDS = 3600
+# Bucketed link storage (core-api storage.py): lb:{id prefix} -> {rest of id: url}
+BUCKET_KEY_PREFIX = "lb"
+
+
+def _next_key(key: str) -> str:
+    """The filter being built for a shard: "<shard>:next", in the shard's slot."""
+    return f"{key}{REBUILD_TARGET_SUFFIX}"
+
+
+async def live_short_ids():
+    """
+    Every live short_id, whichever layout stores it: link:{id} keys, then the fields of the
+    lb:{prefix} buckets. Both are scanned so a rebuild during a layout migration misses nothing.
+    """
+    async for key in redis_client.scan_keys("link:*", count=settings.SCAN_COUNT):
+        yield keys.short_id_from_key(key)
+    async for bucket in redis_client.scan_keys(f"{BUCKET_KEY_PREFIX}:*", count=settings.SCAN_COUNT):
+        prefix = bucket.split(":", 1)[1]
+        async for field in redis_client.scan_hash_fields(bucket, count=settings.SCAN_COUNT):
+            yield prefix + field
+
+
+async def rebuild_bloom_filter(capacity: int | None = None, error_rate: float | None = None,
+                               expansion: int | None = None) -> int | None:
+    """
+    Builds a fresh filter from the live links (SCAN) and swaps it in (RENAME).
+    Expired and deleted links drop out of it. Sizing defaults to the settings;
+    the capacity is split evenly between the shards.
+    Returns the number of links added, or None if another process is already rebuilding.
+    """
+    marker_key = f"{settings.BLOOM_FILTER_KEY}{REBUILD_MARKER_SUFFIX}"
+    if not await redis_client.set_if_absent(marker_key, str(int(time.time())), REBUILD_MARKER_TTL_SECONDS):
+        return None
+
+    shard_keys = keys.bloom_filters()
+    try:
+        shard_capacity = -(-(capacity or settings.BLOOM_CAPACITY) // len(shard_keys))
+        for key in shard_keys:
+            await redis_client.reserve_bloom_filter(
+                _next_key(key),
+                error_rate or settings.BLOOM_ERROR_RATE,
+                shard_capacity,
+                expansion or settings.BLOOM_EXPANSION
+            )
+
+        added = 0
+        batches: dict[str, list[str]] = {key: [] for key in shard_keys}
+        async for short_id in live_short_ids():
+            key = keys.bloom_filter(short_id)
+            batch = batches[key]
+            batch.append(short_id)
+            if len(batch) >= settings.SCAN_COUNT:
+                await redis_client.add_many_to_bloom_filter(_next_key(key), batch)
+                added += len(batch)
+                batch.clear()
+        for key, batch in batches.items():
+            await redis_client.add_many_to_bloom_filter(_next_key(key), batch)
+            added += len(batch)
+
+        # Links created during the SCAN were added to both filters by core-api
+        for key in shard_keys:
+            await redis_client.replace_key(_next_key(key), key)
+        await redis_client.client.delete(marker_key)
+        return added
+    except Exception:
+        await redis_client.client.delete(marker_key, *(_next_key(key) for key in shard_keys))
+        raise
+
+
+async def run_bloom_rebuilder():
+    """Periodically rebuilds the Bloom filter so expired links stop passing it."""
+    logger.info(f"Bloom filter rebuilder started (every {settings.BLOOM_REBUILD_INTERVAL_SECONDS}s).")
+
+    while not lifecycle.is_stopping():
+        await lifecycle.sleep(settings.BLOOM_REBUILD_INTERVAL_SECONDS)
+        if lifecycle.is_stopping():
+            break
+        try:
+            started = time.monotonic()
+            added = await rebuild_bloom_filter()
+            if added is not None:
+                logger.info(f"Bloom filter rebuilt with {added} links in {time.monotonic() - started:.1f}s.")
+        except Exception as e:
+            logger.error(f"Bloom filter rebuild failed: {e}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Manage the Bloom filter of existing short_ids.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    rebuild = commands.add_parser("rebuild", help="Rebuild the filter from the live links and swap it in")
+    rebuild.add_argument("--capacity", type=int, help=f"Default: BLOOM_CAPACITY ({settings.BLOOM_CAPACITY})")
+    rebuild.add_argument("--error-rate", type=float, help=f"Default: BLOOM_ERROR_RATE ({settings.BLOOM_ERROR_RATE})")
+    rebuild.add_argument("--expansion", type=int, help=f"Default: BLOOM_EXPANSION ({settings.BLOOM_EXPANSION})")
+    args = parser.parse_args()
+
+    await redis_client.connect()
+    try:
+        started = time.monotonic()
+        added = await rebuild_bloom_filter(args.capacity, args.error_rate, args.expansion)
+        if added is None:
+            raise SystemExit("A rebuild is already running.")
+        print(f"'{settings.BLOOM_FILTER_KEY}' rebuilt with {added} links in {time.monotonic() - started:.1f}s.")
+    finally:
+        await redis_client.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
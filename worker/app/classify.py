@@ -0,0 +1,70 @@
+import re
+from functools import lru_cache
+from urllib.parse import urlsplit
+from .config import settings
+
+# Click dimensions kept as per-link, per-day count hashes: bd:{short_id}:{dimension}:YYYYMMDD
+DIMENSIONS = ("referrer", "country", "device")
+
+UNKNOWN = "unknown"
+
+_BOT_RE = re.compile(r"bot|crawl|spider|slurp|curl|wget|python-|httpclient|headless|preview", re.I)
+_TABLET_RE = re.compile(r"ipad|tablet|kindle|silk|playbook", re.I)
+_MOBILE_RE = re.compile(r"mobi|iphone|ipod|android|windows phone|opera mini", re.I)
+_REGION_RE = re.compile(r"^[a-z]{2,3}[-_](?:[a-z]{4}[-_])?([a-z]{2})$", re.I)
+
+# Raw header values repeat heavily (a handful of browsers, referrers and locales),
+# so every classifier is memoized and a batch mostly costs dict lookups.
+
+
+@lru_cache(maxsize=settings.CLASSIFY_CACHE_SIZE)
+def referrer_domain(referrer: str) -> str:
+    """'https://www.google.com/search?q=x' -> 'google.com'; no Referer -> 'direct'."""
+    if not referrer:
+        return "direct"
+    try:
+        host = urlsplit(referrer).hostname
+    except ValueError:
+        host = None
+    if not host:
+        return "other"
+    return host[4:] if host.startswith("www.") else host
+
+
+@lru_cache(maxsize=settings.CLASSIFY_CACHE_SIZE)
+def device_type(user_agent: str) -> str:
+    """bot / tablet / mobile / desktop, from the User-Agent."""
+    if not user_agent:
+        return UNKNOWN
+    if _BOT_RE.search(user_agent):
+        return "bot"
+    if _TABLET_RE.search(user_agent):
+        return "tablet"
+    if _MOBILE_RE.search(user_agent):
+        # Android without "Mobile" is a tablet
+        if "android" in user_agent.lower() and "mobi" not in user_agent.lower():
+            return "tablet"
+        return "mobile"
+    return "desktop"
+
+
+@lru_cache(maxsize=settings.CLASSIFY_CACHE_SIZE)
+def country_code(accept_language: str) -> str:
+    """
+    Region of the preferred language: 'en-US,en;q=0.9' -> 'US'.
+    A proxy for the visitor's country (no GeoIP lookup in the worker).
+    """
+    if not accept_language:
+        return UNKNOWN
+    preferred = accept_language.split(",", 1)[0].split(";", 1)[0].strip()
+    match = _REGION_RE.match(preferred)
+    return match.group(1).upper() if match else UNKNOWN
+
+
+def classify_click(message_data: dict) -> dict:
+    """Maps the raw headers of a click event to one value per dimension."""
+    return {
+        "referrer": referrer_domain(message_data.get("ref", "")),
+        "country": country_code(message_data.get("lang", "")),
+        "device": device_type(message_data.get("ua", "")),
+    }
@@ -23,8 +23,135 @@ class Settings(BaseSettings):
     # ^^^ --- پایان اصلاح --- ^^^
 
     QR_CODE_CONSUMER_GROUP: str = "qr_code_processors"
+    DATA_HASH_KEY_PREFIX: str = "data"
     CONSUMER_NAME: str = Field(default_factory=socket.gethostname)  # این کاملاً درست است
 
+    # --- Redis Cluster (see keys.py; must match core-api) ---
+    # REDIS_HOST/REDIS_PORT is then any node of the cluster, and per-link keys get {short_id} hash tags
+    REDIS_CLUSTER: bool = False
+    # Global structures split into shards over the cluster; 1 = one plain key
+    LEADERBOARD_KEY: str = "leaderboard:top_links"
+    LEADERBOARD_SHARDS: int = 1
+    BLOOM_SHARDS: int = 1
+    STREAM_SHARDS: int = 1
+
+    # --- Analytics ---
+    # Raw click time series retention: 7 days
+    CLICKS_TS_RETENTION_MS: int = 604800000
+    # Processed message IDs are remembered per time bucket (width in ms of the ID timestamp)
+    # for ANALYTICS_DEDUP_TTL_SECONDS; this must exceed the longest redelivery delay
+    ANALYTICS_DEDUP_BUCKET_MS: int = 100
+    ANALYTICS_DEDUP_TTL_SECONDS: int = 3600
+    # Time-bucketed unique visitor HLLs: uv:{id}:d:YYYYMMDD and (optionally) uv:{id}:h:YYYYMMDDHH
+    # Must stay in sync with UV_MAX_WINDOW_DAYS / UV_HOURLY_BUCKETS in core-api
+    UV_DAILY_TTL_SECONDS: int = 91 * 24 * 3600
+    UV_HOURLY_BUCKETS: bool = True
+    UV_HOURLY_TTL_SECONDS: int = 49 * 3600
+    # Per-link, per-day click breakdowns (bd:{id}:{dimension}:YYYYMMDD), see classify.py
+    BREAKDOWN_TTL_SECONDS: int = 91 * 24 * 3600
+    # Distinct values kept per dimension and day; further new values are counted as "other"
+    BREAKDOWN_MAX_VALUES: int = 200
+    # Memoized header classifications (per process)
+    CLASSIFY_CACHE_SIZE: int = 8192
+
+    # --- Runtime (python -m app.worker) ---
+    # Number of consumer processes (0 = one per CPU)
+    WORKER_PROCESSES: int = 2
+    # Supervisor HTTP endpoint for /health and /metrics
+    WORKER_HTTP_HOST: str = "0.0.0.0"
+    WORKER_HTTP_PORT: int = 8001
+    # How long consumers get to finish and ACK their current batch after SIGTERM
+    WORKER_SHUTDOWN_TIMEOUT_SECONDS: int = 30
+    # A consumer whose loop hasn't completed a read in this long is reported unhealthy
+    WORKER_HEARTBEAT_TIMEOUT_SECONDS: int = 30
+    WORKER_RESTART_BACKOFF_MAX_SECONDS: int = 30
+    # XREADGROUP COUNT / BLOCK: a finite block lets consumers notice shutdown
+    STREAM_BATCH_SIZE: int = 50
+    STREAM_BLOCK_MS: int = 2000
+    # /metrics reads consumer-group state from Redis at most this often
+    STREAM_STATS_MIN_INTERVAL_SECONDS: float = 2.0
+
+    # --- Pending entry recovery (XAUTOCLAIM) ---
+    # A message pending longer than this is considered abandoned and is reclaimed
+    RECLAIM_MIN_IDLE_MS: int = 60000
+    RECLAIM_INTERVAL_SECONDS: int = 15
+    RECLAIM_BATCH_SIZE: int = 100
+    # After this many deliveries a message is moved to the dead-letter stream
+    MAX_DELIVERY_ATTEMPTS: int = 5
+    # Dead-letter stream name = <stream><suffix>, e.g. "analytics_jobs:dlq"
+    DEAD_LETTER_STREAM_SUFFIX: str = ":dlq"
+
+    # --- Event archive (columnar files for offline analysis, see archiver.py) ---
+    # A separate consumer group: the trimmer keeps events until they are archived too
+    ARCHIVE_ENABLED: bool = True
+    ARCHIVE_CONSUMER_GROUP: str = "analytics_archivers"
+    ARCHIVE_PATH: str = "/app/archive"
+    # A batch is written, fsync'ed and ACKed once it holds this many events or is this old
+    # (keep it well below RECLAIM_MIN_IDLE_MS so buffered events aren't reclaimed elsewhere)
+    ARCHIVE_FLUSH_ROWS: int = 5000
+    ARCHIVE_FLUSH_SECONDS: float = 5.0
+    # An hour's file stays open this long after the hour ends, for late (reclaimed) events
+    ARCHIVE_LATE_SECONDS: int = 300
+    ARCHIVE_COMPRESSION: str = "zstd"
+    # Closed hours are rewritten as Parquet
+    ARCHIVE_COMPACT_TO_PARQUET: bool = True
+
+    # --- Expired links (see sweeper.py) ---
+    # Written by core-api: short_id -> expiry (epoch seconds)
+    LINK_EXPIRY_ZSET: str = "links:expiry"
+    SWEEP_INTERVAL_SECONDS: int = 60
+    # Expired links cleaned up per pass; their keys are UNLINKed in pipelines of SWEEP_PIPELINE_SIZE
+    SWEEP_BATCH_SIZE: int = 100
+    SWEEP_PIPELINE_SIZE: int = 500
+
+    # --- Compressed long URLs (see url_codec.py) ---
+    # Written by core-api (python -m app.url_codec train): dictionary id -> base64
+    LINK_COMPRESSION_DICTS_KEY: str = "codec:url_dicts"
+
+    # --- Bloom filter of existing short_ids (see bloom.py) ---
+    BLOOM_FILTER_KEY: str = "bf:short_links"
+    # Entries can't be removed from a Bloom filter, so it is rebuilt from the live links (either storage layout)
+    BLOOM_REBUILD_INTERVAL_SECONDS: int = 24 * 3600
+    # Rebuilt filters are reserved with these (same settings as core-api)
+    BLOOM_ERROR_RATE: float = 0.001
+    BLOOM_CAPACITY: int = 1000000
+    BLOOM_EXPANSION: int = 2
+    SCAN_COUNT: int = 1000
+
+    # --- Stream trimming ---
+    # Entries acknowledged by every consumer group are evicted on this interval
+    STREAM_TRIM_INTERVAL_SECONDS: int = 30
+
+    # --- Tracing (see tracing.py) ---
+    # Empty: tracing is off and costs nothing (no provider, no instrumentation)
+    OTEL_EXPORTER_OTLP_ENDPOINT: str = ""
+    # The worker's spans are Redis commands, each the root of its own trace: sample a few
+    TRACE_SAMPLE_RATIO: float = 0.01
+    # False: no Redis spans at all, so tracing is not set up (there is no request span to total them on)
+    TRACE_REDIS_COMMANDS: bool = True
+    # Spans waiting for export; beyond this they are dropped
+    TRACE_EXPORT_QUEUE_SIZE: int = 2048
+    TRACE_EXPORT_BATCH_SIZE: int = 512
+    TRACE_EXPORT_TIMEOUT_MS: int = 10000
+
+    # --- Event loop monitor (see loopmon.py) ---
+    LOOP_MONITOR_ENABLED: bool = True
+    # How often the loop's lag is sampled
+    LOOP_MONITOR_INTERVAL_SECONDS: float = 0.25
+    # A loop that hasn't come back for this long is stalled: its running stack gets logged
+    LOOP_STALL_THRESHOLD_SECONDS: float = 0.1
+    # At most one stack per this many seconds (every stall is still counted)
+    LOOP_STALL_LOG_INTERVAL_SECONDS: float = 60
+
+    # --- Profiler endpoint (see profiler.py) ---
+    # Bearer token for the profiling endpoint; empty = the endpoint is disabled (404)
+    PROFILER_TOKEN: str = ""
+    PROFILER_MAX_SECONDS: float = 60
+    # One profile at a time per process, and at least this long between two
+    PROFILER_COOLDOWN_SECONDS: float = 60
+    # Default sampling interval
+    PROFILER_INTERVAL_MS: float = 10
+
 
 settings = Settings()
 
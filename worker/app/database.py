@@ -1,3 +1,4 @@
+import asyncio
 import redis.asyncio as aioredis  # <-- ۱. نام را به 'aioredis' تغییر دادیم تا تداخل نداشته باشد
 from redis.exceptions import ResponseError  # <-- ۲. کلاس خطا را مستقیماً وارد کردیم
 from .config import settings, logger
@@ -13,12 +14,20 @@ class RedisClient:
     async def connect(self):
         try:
             # VVV --- ۳. از 'aioredis' استفاده می‌کنیم --- VVV
-            self.client = aioredis.Redis(
-                host=self.host,
-                port=self.port,
-                db=self.db,
-                decode_responses=True
-            )
+            if settings.REDIS_CLUSTER:
+                # Any node will do: the client discovers the others and sends each key to its slot's node
+                self.client = aioredis.RedisCluster(
+                    host=self.host,
+                    port=self.port,
+                    decode_responses=True
+                )
+            else:
+                self.client = aioredis.Redis(
+                    host=self.host,
+                    port=self.port,
+                    db=self.db,
+                    decode_responses=True
+                )
             # ^^^ ----------------------------------- ^^^
             await self.client.ping()
             logger.info(f"Worker successfully connected to Redis at {self.host}")
@@ -39,10 +48,10 @@ class RedisClient:
             raise Exception("Worker could not connect to Redis")
         return self.client
 
-    async def create_consumer_group(self, stream_name: str, group_name: str):
+    async def create_consumer_group(self, stream_name: str, group_name: str, start_id: str = '$'):
         """گروه مصرف‌کننده را در صورت عدم وجود ایجاد می‌کند (XGROUP CREATE)."""
         try:
-            await self.client.xgroup_create(stream_name, group_name, id='$', mkstream=True)
+            await self.client.xgroup_create(stream_name, group_name, id=start_id, mkstream=True)
             logger.info(f"Consumer group '{group_name}' created for stream '{stream_name}'.")
         # VVV --- ۴. از 'ResponseError' به تنهایی استفاده می‌کنیم --- VVV
         except ResponseError as e:
@@ -53,27 +62,33 @@ class RedisClient:
                 logger.error(f"Error creating consumer group: {e}")
                 raise
 
-    async def read_stream_group(self, stream_name: str, group_name: str, consumer_name: str):
-        """یک پیام از استریم برای این مصرف‌کننده می‌خواند (XREADGROUP)."""
+    async def read_stream_group(self, stream_name: str, group_name: str, consumer_name: str,
+                                count: int = 1, block_ms: int = 2000, start_id: str = '>') -> list | None:
+        """
+        Reads up to `count` new messages for this consumer (XREADGROUP).
+        start_id '0' re-reads this consumer's own pending messages instead.
+        Blocks for at most block_ms so the caller can notice a shutdown request.
+        Returns [(message_id, message_data), ...] (empty on timeout), or None if the read failed.
+        """
         try:
             response = await self.client.xreadgroup(
                 group_name,
                 consumer_name,
-                {stream_name: '>'},
-                count=1,
-                block=0
+                {stream_name: start_id},
+                count=count,
+                block=block_ms
             )
 
             if response:
-                message_id = response[0][1][0][0]
-                message_data = response[0][1][0][1]
-                return message_id, message_data
+                return response[0][1]
 
-            return None, None
+            return []
 
         except Exception as e:
             logger.error(f"Error reading from stream group: {e}")
-            return None, None
+            # Back off so a Redis outage doesn't turn into a hot loop
+            await asyncio.sleep(1)
+            return None
 
     async def acknowledge_message(self, stream_name: str, group_name: str, message_id: str):
         """پیام پردازش شده را تأیید (Acknowledge) می‌کند (XACK)."""
@@ -83,6 +98,188 @@ class RedisClient:
         except Exception as e:
             logger.error(f"Error acknowledging message {message_id}: {e}")
 
+    async def acknowledge_messages(self, stream_name: str, group_name: str, *message_ids: str):
+        """Acknowledges a whole batch in one call (XACK id [id ...])."""
+        try:
+            await self.client.xack(stream_name, group_name, *message_ids)
+            logger.info(f"Acknowledged {len(message_ids)} messages in group {group_name}.")
+        except Exception as e:
+            logger.error(f"Error acknowledging {len(message_ids)} messages: {e}")
+
+    async def autoclaim_messages(self, stream_name: str, group_name: str, consumer_name: str,
+                                 min_idle_ms: int, start_id: str = "0-0", count: int = 100):
+        """
+        Takes ownership of messages idle in the PEL for longer than min_idle_ms (XAUTOCLAIM).
+        Returns (next_start_id, [(message_id, message_data), ...]).
+        """
+        try:
+            response = await self.client.xautoclaim(
+                stream_name, group_name, consumer_name,
+                min_idle_time=min_idle_ms, start_id=start_id, count=count
+            )
+            # Redis 7 also returns IDs that were trimmed from the stream (already removed from the PEL)
+            return response[0], response[1]
+        except Exception as e:
+            logger.error(f"Error auto-claiming from '{stream_name}': {e}")
+            return "0-0", []
+
+    async def get_delivery_counts(self, stream_name: str, group_name: str, consumer_name: str,
+                                  message_ids: list) -> dict | None:
+        """
+        Returns {message_id: times_delivered} for these pending entries of this consumer
+        (one XPENDING per ID, pipelined: a range could return other entries instead).
+        IDs no longer pending are left out. None if the counts couldn't be read.
+        """
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for message_id in message_ids:
+                    pipe.xpending_range(
+                        stream_name, group_name, min=message_id, max=message_id,
+                        count=1, consumername=consumer_name
+                    )
+                replies = await pipe.execute()
+            return {entry["message_id"]: entry["times_delivered"] for entries in replies for entry in entries}
+        except Exception as e:
+            logger.error(f"Error reading pending entries for '{stream_name}': {e}")
+            return None
+
+    async def get_stream_length(self, stream_name: str) -> int:
+        """Returns the number of entries in a stream (XLEN)."""
+        try:
+            return await self.client.xlen(stream_name)
+        except Exception as e:
+            logger.error(f"Error reading length of '{stream_name}': {e}")
+            return 0
+
+    async def add_to_stream(self, stream_name: str, fields: dict) -> str | None:
+        """Appends an entry to a stream (XADD)."""
+        try:
+            return await self.client.xadd(stream_name, fields)
+        except Exception as e:
+            logger.error(f"Error adding to stream '{stream_name}': {e}")
+            return None
+
+    async def read_stream_range(self, stream_name: str, start: str = "-", end: str = "+", count: int = 100) -> list:
+        """Reads entries from a stream without a consumer group (XRANGE)."""
+        try:
+            return await self.client.xrange(stream_name, min=start, max=end, count=count)
+        except Exception as e:
+            logger.error(f"Error reading range from '{stream_name}': {e}")
+            return []
+
+    async def delete_stream_messages(self, stream_name: str, *message_ids: str):
+        """Removes entries from a stream (XDEL)."""
+        try:
+            await self.client.xdel(stream_name, *message_ids)
+        except Exception as e:
+            logger.error(f"Error deleting messages from '{stream_name}': {e}")
+
+    async def get_group_info(self, stream_name: str) -> list:
+        """Returns the consumer groups of a stream with their progress (XINFO GROUPS)."""
+        try:
+            return await self.client.xinfo_groups(stream_name)
+        except ResponseError as e:
+            if "no such key" not in str(e):
+                logger.error(f"Error reading groups of '{stream_name}': {e}")
+            return []
+        except Exception as e:
+            logger.error(f"Error reading groups of '{stream_name}': {e}")
+            return []
+
+    async def get_pending_summary(self, stream_name: str, group_name: str) -> dict:
+        """Returns the XPENDING summary (pending count, min/max pending IDs)."""
+        try:
+            return await self.client.xpending(stream_name, group_name)
+        except Exception as e:
+            logger.error(f"Error reading PEL summary for '{stream_name}': {e}")
+            return {}
+
+    async def trim_stream_minid(self, stream_name: str, min_id: str) -> int:
+        """Evicts entries older than min_id (XTRIM MINID ~). Returns how many were removed."""
+        try:
+            return await self.client.xtrim(stream_name, minid=min_id, approximate=True)
+        except Exception as e:
+            logger.error(f"Error trimming stream '{stream_name}': {e}")
+            return 0
+
+    async def load_function_library(self, code: str):
+        """Loads (or replaces) a Redis Functions library (FUNCTION LOAD REPLACE)."""
+        await self.client.function_load(code, replace=True)
+        logger.info("Redis function library loaded.")
+
+    async def call_function(self, function_name: str, keys: list, args: list):
+        """Calls a Redis Function (FCALL). Errors propagate so the message is retried."""
+        return await self.client.fcall(function_name, len(keys), *keys, *args)
+
+    async def scan_keys(self, match: str, count: int = 1000):
+        """Iterates over the keys matching a pattern with SCAN (incremental, never blocks Redis)."""
+        async for key in self.client.scan_iter(match=match, count=count):
+            yield key
+
+    async def scan_hash_fields(self, hash_key: str, count: int = 1000):
+        """Iterates over the field names of a hash with HSCAN."""
+        async for field, _ in self.client.hscan_iter(hash_key, count=count):
+            yield field
+
+    async def get_expired_members(self, zset_key: str, max_score: float, count: int) -> list:
+        """Members with a score up to max_score, oldest first (ZRANGEBYSCORE ... LIMIT 0 count)."""
+        try:
+            return await self.client.zrangebyscore(zset_key, "-inf", max_score, start=0, num=count)
+        except Exception as e:
+            logger.error(f"Error reading expired members of '{zset_key}': {e}")
+            return []
+
+    async def remove_sorted_set_members(self, zset_key: str, *members: str):
+        try:
+            await self.client.zrem(zset_key, *members)
+        except Exception as e:
+            logger.error(f"Error removing {len(members)} members from '{zset_key}': {e}")
+
+    async def get_hash_fields_many(self, hash_keys: list, *fields: str) -> list:
+        """HMGET the same fields from many hashes in one round trip."""
+        async with self.client.pipeline(transaction=False) as pipe:
+            for hash_key in hash_keys:
+                pipe.hmget(hash_key, *fields)
+            return await pipe.execute()
+
+    async def unlink_keys(self, keys: list, chunk_size: int = 500) -> tuple[int, int]:
+        """
+        Deletes keys without blocking Redis (UNLINK frees memory in a background thread).
+        Each chunk first measures the keys with MEMORY USAGE, which also tells which ones exist.
+        Returns (keys removed, bytes reclaimed).
+        """
+        removed, reclaimed = 0, 0
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            async with self.client.pipeline(transaction=False) as pipe:
+                for key in chunk:
+                    pipe.memory_usage(key)
+                usages = await pipe.execute()
+
+            existing = [key for key, usage in zip(chunk, usages) if usage is not None]
+            if existing:
+                removed += await self.client.unlink(*existing)
+                reclaimed += sum(usage for usage in usages if usage is not None)
+        return removed, reclaimed
+
+    async def set_if_absent(self, key: str, value: str, ttl_seconds: int) -> bool:
+        """SET key value NX EX ttl: a simple cross-process lock. True if this caller set it."""
+        return bool(await self.client.set(key, value, nx=True, ex=ttl_seconds))
+
+    async def reserve_bloom_filter(self, key: str, error_rate: float, capacity: int, expansion: int = 2):
+        """Creates an empty Bloom filter (BF.RESERVE); an existing key is replaced."""
+        await self.client.delete(key)
+        await self.client.bf().create(key, error_rate, capacity, expansion=expansion)
+
+    async def add_many_to_bloom_filter(self, key: str, items: list):
+        """Adds many items in one command (BF.MADD)."""
+        if items:
+            await self.client.bf().madd(key, *items)
+
+    async def replace_key(self, source: str, destination: str):
+        """Atomically moves source over destination (RENAME; on a cluster both must share a slot)."""
+        await self.client.rename(source, destination)
+
     async def set_hash_field(self, hash_key: str, field: str, value: str):
         """
         یک فیلد را در یک هش تنظیم می‌کند (HSET).
@@ -93,6 +290,13 @@ class RedisClient:
         except Exception as e:
             logger.error(f"Error setting hash field '{field}' for key '{hash_key}': {e}")
 
+    async def get_hash_field(self, hash_key: str, field: str) -> str | None:
+        try:
+            return await self.client.hget(hash_key, field)
+        except Exception as e:
+            logger.error(f"Error reading hash field '{field}' of key '{hash_key}': {e}")
+            return None
+
     # VVV --- این متد جدید است (فاز ۴.۵) --- VVV
     async def increment_hash_field(self, hash_key: str, field: str, amount: int = 1):
         """
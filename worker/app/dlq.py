@@ -0,0 +1,69 @@
+"""
+Dead-letter stream tooling.
+
+Usage:
+    python -m app.dlq list analytics_jobs [--count 20]
+    python -m app.dlq replay analytics_jobs [--count 100]
+"""
+import argparse
+import asyncio
+from .database import redis_client
+from .config import logger
+from .reclaim import dead_letter_stream, DLQ_META_FIELDS
+
+
+async def list_dead_letters(stream_name: str, count: int):
+    entries = await redis_client.read_stream_range(dead_letter_stream(stream_name), count=count)
+    for message_id, message_data in entries:
+        print(f"{message_id} {message_data}")
+    print(f"{len(entries)} entries shown from '{dead_letter_stream(stream_name)}'.")
+
+
+async def replay_dead_letters(stream_name: str, count: int) -> int:
+    """
+    Moves up to `count` messages from the dead-letter stream back to their source stream.
+    Each message is re-added (new ID, fresh delivery count) before it is removed from the DLQ.
+    """
+    dlq_name = dead_letter_stream(stream_name)
+    replayed = 0
+
+    while replayed < count:
+        batch = await redis_client.read_stream_range(dlq_name, count=min(100, count - replayed))
+        if not batch:
+            break
+
+        for dlq_id, message_data in batch:
+            target_stream = message_data.get("dlq_source_stream", stream_name)
+            original = {k: v for k, v in message_data.items() if k not in DLQ_META_FIELDS}
+
+            new_id = await redis_client.add_to_stream(target_stream, original)
+            if new_id is None:
+                logger.error(f"Replay stopped: could not re-add {dlq_id} to '{target_stream}'.")
+                return replayed
+
+            await redis_client.delete_stream_messages(dlq_name, dlq_id)
+            replayed += 1
+
+    logger.info(f"Replayed {replayed} messages from '{dlq_name}'.")
+    return replayed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Inspect and replay dead-lettered stream messages.")
+    parser.add_argument("command", choices=["list", "replay"])
+    parser.add_argument("stream", help="Source stream name, e.g. analytics_jobs")
+    parser.add_argument("--count", type=int, default=100)
+    args = parser.parse_args()
+
+    await redis_client.connect()
+    try:
+        if args.command == "list":
+            await list_dead_letters(args.stream, args.count)
+        else:
+            await replay_dead_letters(args.stream, args.count)
+    finally:
+        await redis_client.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+#!lua name=shortlink_analytics
+
+-- Applies one click event atomically and idempotently (FCALL apply_click).
+--
+-- KEYS[1] data:{short_id}          (hash, total_clicks)
+-- KEYS[2] leaderboard:top_links    (sorted set), or KEYS[1] again to leave it out: on a cluster
+--         the leaderboard is in another slot and the caller updates it after this call
+-- KEYS[3] ts:clicks:{short_id}     (time series)
+-- KEYS[4] uv:{short_id}            (HyperLogLog)
+-- KEYS[5] analytics:dedup:<bucket> (set of processed message IDs for one time bucket; per link on a cluster)
+-- KEYS[6] uv:{short_id}:d:<YYYYMMDD>   (per-day HyperLogLog)
+-- KEYS[7] uv:{short_id}:h:<YYYYMMDDHH> (per-hour HyperLogLog)
+-- KEYS[8..] bd:{short_id}:<dimension>:<YYYYMMDD> (per-day breakdown hashes, one per dimension)
+--
+-- ARGV[1] stream message ID ("<ms>-<seq>")
+-- ARGV[2] short_id
+-- ARGV[3] weight (clicks represented by this event)
+-- ARGV[4] visitor IP ('' if unknown)
+-- ARGV[5] time series retention (ms)
+-- ARGV[6] dedup bucket width (ms)
+-- ARGV[7] dedup TTL (seconds)
+-- ARGV[8] per-day HLL TTL (seconds)
+-- ARGV[9] per-hour HLL TTL (seconds, 0 = hourly buckets disabled)
+-- ARGV[10] breakdown hash TTL (seconds)
+-- ARGV[11] max distinct values per breakdown hash (beyond it new values count as 'other')
+-- ARGV[12..] breakdown value for KEYS[8..], in the same order
+--
+-- Returns 1 if applied, 0 if this message ID was already applied (redelivery).
+
+-- Message IDs are stored as small integers where possible, so each bucket stays an intset
+-- (4 bytes per member) instead of a set of strings.
+local function dedup_member(message_id, bucket_ms)
+    local ms, seq = string.match(message_id, '^(%d+)-(%d+)$')
+    if ms == nil then
+        return message_id
+    end
+    seq = tonumber(seq)
+    if seq >= 65536 then
+        return message_id
+    end
+    return (tonumber(ms) % bucket_ms) * 65536 + seq
+end
+
+local function apply_click(keys, args)
+    local member = dedup_member(args[1], tonumber(args[6]))
+    if redis.call('SISMEMBER', keys[5], member) == 1 then
+        return 0
+    end
+
+    local weight = tonumber(args[3])
+    -- Scripts don't roll back on error, so the module command (the one most likely to fail)
+    -- runs first. SUM: two clicks in the same millisecond must not collide.
+    redis.call('TS.ADD', keys[3], '*', weight, 'RETENTION', args[5], 'ON_DUPLICATE', 'SUM')
+    redis.call('HINCRBY', keys[1], 'total_clicks', weight)
+    if keys[2] ~= keys[1] then
+        redis.call('ZINCRBY', keys[2], weight, args[2])
+    end
+    if args[4] ~= '' then
+        redis.call('PFADD', keys[4], args[4])
+        -- Time buckets expire on their own, so windowed unique counts stay bounded in memory
+        redis.call('PFADD', keys[6], args[4])
+        redis.call('EXPIRE', keys[6], args[8], 'NX')
+        if args[9] ~= '0' then
+            redis.call('PFADD', keys[7], args[4])
+            redis.call('EXPIRE', keys[7], args[9], 'NX')
+        end
+    end
+
+    local max_values = tonumber(args[11])
+    for i = 8, #keys do
+        local value = args[i + 4]
+        -- Bounded cardinality: a hash never grows past max_values (+ 'other')
+        if redis.call('HEXISTS', keys[i], value) == 0 and redis.call('HLEN', keys[i]) >= max_values then
+            value = 'other'
+        end
+        redis.call('HINCRBY', keys[i], value, weight)
+        redis.call('EXPIRE', keys[i], args[10], 'NX')
+    end
+
+    -- Recorded last: if any write above fails, the redelivery is not mistaken for a duplicate
+    redis.call('SADD', keys[5], member)
+    redis.call('EXPIRE', keys[5], args[7])
+    return 1
+end
+
+redis.register_function('apply_click', apply_click)
@@ -0,0 +1,80 @@
+import asyncio
+import json
+from .config import logger
+
+_REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 429: "Too Many Requests",
+    500: "Internal Server Error", 503: "Service Unavailable"
+}
+
+
+class HealthServer:
+    """
+    Minimal HTTP/1.1 server for the supervisor (health checks, metrics scrapes, profiles).
+    Routes are async callables taking (query, headers) and returning (status, content_type, body_bytes);
+    header names are lowercased.
+    """
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.routes = {}
+        self._server = None
+
+    def route(self, path: str):
+        def register(handler):
+            self.routes[path] = handler
+            return handler
+        return register
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info(f"Worker health server listening on {self.host}:{self.port}")
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            headers = {}
+            while (line := await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            parts = request_line.decode("latin-1").split()
+            if len(parts) < 2:
+                return
+            method, target = parts[0], parts[1]
+            path, _, query = target.partition("?")
+
+            handler = self.routes.get(path)
+            if handler is None:
+                status, content_type, body = 404, "application/json", b'{"detail": "Not Found"}'
+            elif method != "GET":
+                status, content_type, body = 405, "application/json", b'{"detail": "Method Not Allowed"}'
+            else:
+                try:
+                    status, content_type, body = await handler(query, headers)
+                except Exception as e:
+                    logger.error(f"Health server handler for {path} failed: {e}")
+                    status, content_type, body = 500, "application/json", b'{"detail": "Internal Server Error"}'
+
+            head = (
+                f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n"
+            )
+            writer.write(head.encode("latin-1") + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def json_response(status: int, payload) -> tuple[int, str, bytes]:
+    return status, "application/json", json.dumps(payload).encode()
@@ -0,0 +1,25 @@
+import asyncio
+import time
+
+# Set on SIGTERM: consumers finish their current batch, ACK it and exit
+shutdown_event = asyncio.Event()
+
+# Installed by the worker runtime: called as heartbeat_hook(stream_name) after every read
+heartbeat_hook = None
+
+
+def is_stopping() -> bool:
+    return shutdown_event.is_set()
+
+
+async def sleep(seconds: float):
+    """Sleeps for `seconds`, but wakes up immediately when shutdown starts."""
+    try:
+        await asyncio.wait_for(shutdown_event.wait(), timeout=seconds)
+    except asyncio.TimeoutError:
+        pass
+
+
+def heartbeat(stream_name: str):
+    if heartbeat_hook is not None:
+        heartbeat_hook(stream_name, time.time())
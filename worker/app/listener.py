@@ -1,8 +1,27 @@
 import asyncio
 import qrcode
 import os
+from datetime import datetime, timezone
 from .database import redis_client
 from .config import settings, logger
+from . import lifecycle, metrics
+from .classify import DIMENSIONS, classify_click
+from .reclaim import run_reclaimer
+from .trimmer import run_stream_trimmer
+from .archiver import run_archiver
+from .sweeper import run_link_sweeper
+from . import bloom, keys, url_codec
+
+
+# Redis Functions libraries: analytics.lua (FCALL apply_click)
+FUNCTIONS_DIR = os.path.join(os.path.dirname(__file__), "functions")
+
+
+async def load_functions():
+    for filename in sorted(os.listdir(FUNCTIONS_DIR)):
+        if filename.endswith(".lua"):
+            with open(os.path.join(FUNCTIONS_DIR, filename)) as f:
+                await redis_client.load_function_library(f.read())
 
 
 # --- Processor 1: QR Code Generation ---
@@ -10,7 +29,8 @@ async def process_qr_job(message_id: str, message_data: dict) -> bool:
     logger.info(f"--- PROCESSING QR JOB: {message_id} ---")
     try:
         short_id = message_data.get('short_id')
-        long_url = message_data.get('long_url')
+        # Long URLs may arrive compressed (LINK_COMPRESSION in core-api)
+        long_url = await url_codec.decode_url(message_data.get('long_url'))
 
         if not short_id or not long_url:
             return False
@@ -23,12 +43,11 @@ async def process_qr_job(message_id: str, message_data: dict) -> bool:
         img.save(save_path)
 
         # Save path to Redis Hash
-        hash_key = f"data:{short_id}"
+        hash_key = keys.data(short_id)
         web_path = f"/media/{filename}"
         await redis_client.set_hash_field(hash_key, "qr_code_path", web_path)
 
-        bf_key = "bf:short_links"
-        await redis_client.add_to_bloom_filter(bf_key, short_id)
+        # The Bloom filter entry is added by core-api when it creates the link
         logger.info(f"QR code generated for {short_id}")
         return True
     except Exception as e:
@@ -42,30 +61,60 @@ async def process_analytics_job(message_id: str, message_data: dict) -> bool:
     try:
         short_id = message_data.get('short_id')
         user_ip = message_data.get('ip')
+        # Weighted events come from core-api backpressure (buffered or sampled clicks)
+        weight = int(message_data.get('w', 1))
 
         if not short_id:
             return False
 
-        # 1. Increment counter in Hash (Existing)
-        hash_key = f"data:{short_id}"
-        await redis_client.increment_hash_field(hash_key, "total_clicks", 1)
-
-        # 2. Update Leaderboard (Existing)
-        leaderboard_key = "leaderboard:top_links"
-        await redis_client.update_leaderboard(leaderboard_key, short_id, 1)
-
-        # VVV --- 3. Add to TimeSeries (NEW Phase 8) --- VVV
-        # Key format: ts:clicks:{short_id}
-        ts_key = f"ts:clicks:{short_id}"
-
-        # Retention: Keep data for 7 days (7 * 24 * 60 * 60 * 1000 ms = 604800000 ms)
-        await redis_client.add_timeseries_point(ts_key, value=1, retention_ms=604800000)
-        # ^^^ ------------------------------------------ ^^^
-        if user_ip:
-            # Key format: uv:{short_id} (uv = Unique Visitors)
-            uv_key = f"uv:{short_id}"
-            await redis_client.add_to_hyperloglog(uv_key, user_ip)
-        logger.info(f"Analytics tracked for {short_id} (Hash, Leaderboard, TimeSeries).")
+        # Hash, Leaderboard, TimeSeries and HyperLogLog updated in ONE atomic call.
+        # The message ID is recorded too, so a redelivery (crash before XACK) is a no-op.
+        event_ms = int(message_id.split("-")[0])
+        dedup_bucket = event_ms // settings.ANALYTICS_DEDUP_BUCKET_MS
+        # Unique visitors are also counted per day / hour of the event (UTC)
+        event_time = datetime.fromtimestamp(event_ms / 1000, tz=timezone.utc)
+        data_key = keys.data(short_id)
+        # On a cluster every key of one call must be in the link's slot: the leaderboard is updated after it
+        leaderboard_key = keys.leaderboard(short_id)
+        function_keys = [
+            data_key,
+            data_key if settings.REDIS_CLUSTER else leaderboard_key,
+            keys.clicks_timeseries(short_id),
+            keys.unique_visitors(short_id),  # uv = Unique Visitors (all time)
+            keys.analytics_dedup(short_id, dedup_bucket),
+            keys.unique_visitors_day(short_id, f"{event_time:%Y%m%d}"),
+            keys.unique_visitors_hour(short_id, f"{event_time:%Y%m%d%H}"),
+        ]
+        # Referrer / country / device breakdowns of the event's day (headers classified here, not in core-api)
+        dimensions = classify_click(message_data)
+        function_keys.extend(keys.breakdown(short_id, name, f"{event_time:%Y%m%d}") for name in DIMENSIONS)
+
+        applied = await redis_client.call_function(
+            "apply_click",
+            keys=function_keys,
+            args=[
+                message_id,
+                short_id,
+                weight,
+                user_ip or "",
+                settings.CLICKS_TS_RETENTION_MS,
+                settings.ANALYTICS_DEDUP_BUCKET_MS,
+                settings.ANALYTICS_DEDUP_TTL_SECONDS,
+                settings.UV_DAILY_TTL_SECONDS,
+                settings.UV_HOURLY_TTL_SECONDS if settings.UV_HOURLY_BUCKETS else 0,
+                settings.BREAKDOWN_TTL_SECONDS,
+                settings.BREAKDOWN_MAX_VALUES,
+                *(dimensions[name] for name in DIMENSIONS),
+            ]
+        )
+
+        if applied and settings.REDIS_CLUSTER:
+            # Not atomic with the rest: a crash in between leaves the leaderboard short (app.backfill repairs it)
+            await redis_client.update_leaderboard(leaderboard_key, short_id, weight)
+        if applied:
+            logger.info(f"Analytics tracked for {short_id} (Hash, Leaderboard, TimeSeries, HLL, Breakdowns).")
+        else:
+            logger.info(f"Analytics job {message_id} already applied; skipping duplicate.")
         return True
     except Exception as e:
         logger.error(f"Analytics Job failed: {e}")
@@ -75,52 +124,85 @@ async def process_analytics_job(message_id: str, message_data: dict) -> bool:
 # --- Generic Consumer Loop ---
 async def consume_stream(stream_name: str, group_name: str, processor_func):
     """
-    Infinite loop to listen to a specific stream and pass messages to a processor function.
+    Reads batches from a stream and passes each message to a processor function,
+    until shutdown is requested. The batch in hand is always finished and ACKed first.
+    Only successful reads are heartbeats: while Redis fails, reads are retried and /health goes stale.
+    A processor that raises takes the process down so the supervisor restarts it.
     """
-    try:
-        # Create consumer group if not exists
-        await redis_client.create_consumer_group(stream_name, group_name)
-        logger.info(f"Listening on '{stream_name}' as '{group_name}'...")
-
-        while True:
-            # Read new messages
-            message_id, message_data = await redis_client.read_stream_group(
-                stream_name,
-                group_name,
-                settings.CONSUMER_NAME
-            )
-
-            if message_id and message_data:
-                # Process message
-                success = await processor_func(message_id, message_data)
-
-                if success:
-                    # Acknowledge message
-                    await redis_client.acknowledge_message(stream_name, group_name, message_id)
-    except Exception as e:
-        logger.error(f"Consumer loop for {stream_name} failed: {e}")
+    # Create consumer group if not exists
+    await redis_client.create_consumer_group(stream_name, group_name)
+    logger.info(f"Listening on '{stream_name}' as '{group_name}' ({settings.CONSUMER_NAME})...")
+
+    while not lifecycle.is_stopping():
+        # Read new messages
+        messages = await redis_client.read_stream_group(
+            stream_name,
+            group_name,
+            settings.CONSUMER_NAME,
+            count=settings.STREAM_BATCH_SIZE,
+            block_ms=settings.STREAM_BLOCK_MS
+        )
+        if messages is None:
+            continue
+        lifecycle.heartbeat(stream_name)
+        if messages:
+            metrics.BATCH_SIZE.labels(stream=stream_name).observe(len(messages))
+
+        processed_ids = []
+        for message_id, message_data in messages:
+            if await metrics.run_processor(processor_func, message_id, message_data):
+                processed_ids.append(message_id)
+            # Failed messages stay in the PEL for the reclaimer
+
+        if processed_ids:
+            await redis_client.acknowledge_messages(stream_name, group_name, *processed_ids)
+
+    logger.info(f"Consumer for '{stream_name}' drained and stopped.")
 
 
 # --- Main Entry Point ---
-async def listen_for_jobs():
+async def listen_for_jobs(run_maintenance: bool = True):
     """
-    Run all listeners concurrently.
+    Run all listeners concurrently until shutdown.
+    If any of them crashes, the others are asked to drain and the error is re-raised.
+    Maintenance jobs (stream trimming, expired link sweeping, Bloom rebuilds) only need one process.
     """
     # Ensure Redis connection
     await redis_client.get_client()
-
-    # Run tasks concurrently
-    await asyncio.gather(
-        # Listener 1: QR Code
-        consume_stream(
-            settings.QR_CODE_JOBS_STREAM,
-            settings.QR_CODE_CONSUMER_GROUP,
-            process_qr_job
-        ),
-        # Listener 2: Analytics
-        consume_stream(
-            settings.ANALYTICS_STREAM_NAME,
-            settings.ANALYTICS_CONSUMER_GROUP,
-            process_analytics_job
-        )
-    )
\ No newline at end of file
+    await load_functions()
+
+    # Each stream may be split into shards (STREAM_SHARDS): every shard gets its own consumer
+    qr_streams = keys.streams(settings.QR_CODE_JOBS_STREAM)
+    analytics_streams = keys.streams(settings.ANALYTICS_STREAM_NAME)
+
+    jobs = []
+    for stream_name in qr_streams:
+        jobs += [
+            # Listener 1: QR Code
+            consume_stream(stream_name, settings.QR_CODE_CONSUMER_GROUP, process_qr_job),
+            # Reclaimer: retry abandoned/failed messages, dead-letter poison ones
+            run_reclaimer(stream_name, settings.QR_CODE_CONSUMER_GROUP, process_qr_job),
+        ]
+    for stream_name in analytics_streams:
+        jobs += [
+            # Listener 2: Analytics
+            consume_stream(stream_name, settings.ANALYTICS_CONSUMER_GROUP, process_analytics_job),
+            run_reclaimer(stream_name, settings.ANALYTICS_CONSUMER_GROUP, process_analytics_job),
+        ]
+        if settings.ARCHIVE_ENABLED:
+            # Raw events to hourly columnar files, in their own consumer group
+            jobs.append(run_archiver(stream_name, settings.ARCHIVE_CONSUMER_GROUP))
+    if run_maintenance:
+        # Trim history every consumer group has acknowledged (one process is enough)
+        jobs.append(run_stream_trimmer(qr_streams + analytics_streams))
+        # Reclaim every key and file of expired links; rebuild the Bloom filter without them
+        jobs.append(run_link_sweeper())
+        jobs.append(bloom.run_bloom_rebuilder())
+
+    tasks = [asyncio.create_task(job) for job in jobs]
+    try:
+        await asyncio.gather(*tasks)
+    except Exception:
+        lifecycle.shutdown_event.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
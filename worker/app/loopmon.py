@@ -0,0 +1,91 @@
+"""
+Event loop lag and stall monitor (LOOP_MONITOR_* settings), cheap enough to leave on in production.
+
+A task sleeps LOOP_MONITOR_INTERVAL_SECONDS at a time and records how late it wakes up
+(EVENT_LOOP_LAG_SECONDS): the time callbacks queued behind a busy loop wait. A watchdog thread notices
+when the loop hasn't come back for LOOP_STALL_THRESHOLD_SECONDS, counts the stall and logs the stack of
+what the loop is running right now (a blocking call: rendering, sync I/O, a print...), at most once
+per LOOP_STALL_LOG_INTERVAL_SECONDS.
+
+core-api and the worker ship as separate images and each has its own copy of this file (and of
+profiler.py); keep the two identical.
+"""
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from .config import settings, logger
+from . import metrics
+
+
+class LoopMonitor:
+    def __init__(self, enabled: bool, interval: float, threshold: float, log_interval: float):
+        self.enabled = enabled
+        self.interval = interval
+        self.threshold = threshold
+        self.log_interval = log_interval
+        self._task: asyncio.Task | None = None
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._loop_thread_id: int | None = None
+        self._last_tick = 0.0
+        self._last_logged = float("-inf")
+
+    async def start(self):
+        if not self.enabled or self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._probe())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stop.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._thread.join(timeout=1)
+        self._thread = None
+
+    async def _probe(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            metrics.EVENT_LOOP_LAG_SECONDS.observe(max(0.0, now - expected))
+            self._last_tick = now
+
+    def _watch(self):
+        reported_tick = None
+        # Polls at half the threshold: a stall is seen at most 1.5x the threshold after it started
+        while not self._stop.wait(self.threshold / 2):
+            last_tick = self._last_tick
+            blocked_for = time.monotonic() - last_tick - self.interval
+            if blocked_for < self.threshold or reported_tick == last_tick:
+                continue
+            # One report per stall: the next one needs the probe to have run again
+            reported_tick = last_tick
+            metrics.EVENT_LOOP_STALLS.inc()
+            now = time.monotonic()
+            if now - self._last_logged < self.log_interval:
+                continue
+            self._last_logged = now
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "(not available)\n"
+            logger.warning(f"Event loop blocked for {blocked_for * 1000:.0f}ms so far, running:\n{stack.rstrip()}")
+
+
+loop_monitor = LoopMonitor(
+    settings.LOOP_MONITOR_ENABLED,
+    settings.LOOP_MONITOR_INTERVAL_SECONDS,
+    settings.LOOP_STALL_THRESHOLD_SECONDS,
+    settings.LOOP_STALL_LOG_INTERVAL_SECONDS
+)
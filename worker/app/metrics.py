@@ -0,0 +1,182 @@
+import os
+import time
+from prometheus_client import CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest, multiprocess
+from prometheus_client.core import GaugeMetricFamily
+from .database import redis_client
+from .config import settings
+from . import keys
+
+# Streams this worker consumes, as (stream, consumer group): every shard of each (STREAM_SHARDS)
+CONSUMED_STREAMS = [
+    *((name, settings.QR_CODE_CONSUMER_GROUP) for name in keys.streams(settings.QR_CODE_JOBS_STREAM)),
+    *((name, settings.ANALYTICS_CONSUMER_GROUP) for name in keys.streams(settings.ANALYTICS_STREAM_NAME)),
+]
+
+# --- Per-process metrics (aggregated across worker processes in multiprocess mode) ---
+RECLAIMED = Counter(
+    "worker_reclaimed_messages_total",
+    "Messages taken over from the PEL with XAUTOCLAIM and processed again",
+    ["stream"]
+)
+DEAD_LETTERED = Counter(
+    "worker_dead_lettered_messages_total",
+    "Messages moved to the dead-letter stream",
+    ["stream"]
+)
+
+
+PROCESSING_SECONDS = Histogram(
+    "worker_processing_seconds",
+    "Time spent in a processor function per message",
+    ["processor"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+MESSAGES_PROCESSED = Counter(
+    "worker_messages_processed_total",
+    "Messages handled by a processor, by outcome",
+    ["processor", "result"]
+)
+BATCH_SIZE = Histogram(
+    "worker_batch_size",
+    "Messages returned by one XREADGROUP call",
+    ["stream"],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500)
+)
+ERRORS = Counter(
+    "worker_errors_total",
+    "Processor failures and exceptions",
+    ["processor", "kind"]
+)
+
+ARCHIVED_EVENTS = Counter(
+    "worker_archived_events_total",
+    "Analytics events written to the columnar archive",
+    ["stream"]
+)
+ARCHIVE_FLUSH_SECONDS = Histogram(
+    "worker_archive_flush_seconds",
+    "Time to write and fsync one archive batch",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+
+
+SWEPT_LINKS = Counter(
+    "worker_swept_links_total",
+    "Expired links whose keys and files were removed"
+)
+RECLAIMED_BYTES = Counter(
+    "worker_reclaimed_bytes_total",
+    "Bytes freed by the expired link sweeper (Redis MEMORY USAGE, QR image files)",
+    ["kind"]
+)
+
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "worker_event_loop_lag_seconds",
+    "How late a consumer process's event loop runs a callback that is due",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+EVENT_LOOP_STALLS = Counter(
+    "worker_event_loop_stalls_total",
+    "Times a consumer process's event loop was blocked for longer than LOOP_STALL_THRESHOLD_SECONDS"
+)
+
+
+
+async def run_processor(processor_func, message_id: str, message_data: dict) -> bool:
+    """Calls a processor and records its latency and outcome."""
+    name = processor_func.__name__
+    start = time.perf_counter()
+    try:
+        success = await processor_func(message_id, message_data)
+    except Exception:
+        ERRORS.labels(processor=name, kind="exception").inc()
+        MESSAGES_PROCESSED.labels(processor=name, result="failed").inc()
+        raise
+    finally:
+        PROCESSING_SECONDS.labels(processor=name).observe(time.perf_counter() - start)
+
+    MESSAGES_PROCESSED.labels(processor=name, result="ok" if success else "failed").inc()
+    if not success:
+        ERRORS.labels(processor=name, kind="failed").inc()
+    return success
+
+
+class StreamStatsCollector:
+    """
+    Consumer-group state read from Redis by the supervisor.
+    One XINFO GROUPS + XLEN per stream, and at most once per
+    STREAM_STATS_MIN_INTERVAL_SECONDS, so a 5s scrape interval costs next to nothing.
+    """
+
+    def __init__(self):
+        self.groups: dict[str, list] = {}
+        self.lengths: dict[str, int] = {}
+        self._refreshed_at = 0.0
+
+    async def refresh(self):
+        now = time.monotonic()
+        if now - self._refreshed_at < settings.STREAM_STATS_MIN_INTERVAL_SECONDS:
+            return
+        self._refreshed_at = now
+
+        for stream_name, _ in CONSUMED_STREAMS:
+            self.groups[stream_name] = await redis_client.get_group_info(stream_name)
+            dlq_name = f"{stream_name}{settings.DEAD_LETTER_STREAM_SUFFIX}"
+            for name in (stream_name, dlq_name):
+                self.lengths[name] = await redis_client.get_stream_length(name)
+
+    def collect(self):
+        lag = GaugeMetricFamily(
+            "worker_stream_lag_messages",
+            "Entries in the stream not yet delivered to the consumer group (XINFO GROUPS lag)",
+            labels=["stream", "group"]
+        )
+        pending = GaugeMetricFamily(
+            "worker_stream_pending_messages",
+            "Size of the consumer group's Pending Entries List",
+            labels=["stream", "group"]
+        )
+        length = GaugeMetricFamily(
+            "worker_stream_length_messages",
+            "Entries currently stored in the stream (XLEN)",
+            labels=["stream"]
+        )
+        for stream_name, groups in self.groups.items():
+            for group in groups:
+                labels = [stream_name, group["name"]]
+                pending.add_metric(labels, group["pending"])
+                # lag is nil when Redis can't compute it (e.g. after XDEL); skip rather than report 0
+                if group.get("lag") is not None:
+                    lag.add_metric(labels, group["lag"])
+        for stream_name, value in self.lengths.items():
+            length.add_metric([stream_name], value)
+        yield lag
+        yield pending
+        yield length
+
+
+def build_registry(*collectors) -> CollectorRegistry:
+    """
+    Registry for one scrape: process metrics from every worker process + the given collectors.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = CollectorRegistry()
+        registry.register(_DefaultRegistryProxy())
+
+    for collector in collectors:
+        registry.register(collector)
+    return registry
+
+
+class _DefaultRegistryProxy:
+    """Single-process mode: expose the metrics registered in the default registry."""
+
+    def collect(self):
+        return REGISTRY.collect()
+
+
+def render(*collectors) -> bytes:
+    return generate_latest(build_registry(*collectors))
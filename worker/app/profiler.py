@@ -0,0 +1,243 @@
+"""
+On-demand sampling profiler of this process (PROFILER_* settings, off without PROFILER_TOKEN).
+
+A helper thread reads every other thread's stack (sys._current_frames) each interval:
+- "wall": every sample weighs the time since the previous one, idle or not.
+- "cpu": every sample weighs the CPU time the thread used since the previous one (its CPU clock).
+Asyncio-aware: frames of the event loop machinery are left out, so a coroutine's frames start at the
+task's coroutine, and in wall mode the tasks suspended in an await are sampled too, under "(awaiting)":
+where coroutines spend their time waiting, not only where the loop spends CPU. The loop lists those itself,
+between two callbacks (its task set is not safe to read from another thread), so a stalled loop delays them.
+
+Output is collapsed stacks ("a;b;c <microseconds>", for flamegraph.pl / speedscope) or a speedscope
+JSON document. One profile at a time per process, with PROFILER_COOLDOWN_SECONDS between them.
+"""
+import asyncio
+import concurrent.futures
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from .config import settings
+
+MODES = ("wall", "cpu")
+FORMATS = ("collapsed", "speedscope")
+
+_ASYNCIO_DIR = os.path.dirname(asyncio.__file__)
+_SKIPPED_FILES = (_ASYNCIO_DIR, threading.__file__)
+_CWD = os.getcwd() + os.sep
+
+_running = False
+_last_finished = float("-inf")
+
+
+def authorized(header: str | None) -> bool:
+    """Whether an Authorization header carries PROFILER_TOKEN (never, when the token is empty)."""
+    token = settings.PROFILER_TOKEN
+    if not token or not header:
+        return False
+    scheme, _, value = header.partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(value.strip().encode(), token.encode())
+
+
+def reserve() -> str | None:
+    """Claims the profiler for one run; returns why it can't run instead, if so. release() when done."""
+    global _running
+    if _running:
+        return "A profile is already running."
+    wait = _last_finished + settings.PROFILER_COOLDOWN_SECONDS - time.monotonic()
+    if wait > 0:
+        return f"Profiler cooling down, retry in {wait:.0f}s."
+    _running = True
+    return None
+
+
+def release():
+    global _running, _last_finished
+    _running = False
+    _last_finished = time.monotonic()
+
+
+def parse_request(query: dict) -> tuple[dict | None, str | None]:
+    """seconds / mode / format / interval_ms from a query string, as run() arguments, or an error."""
+    try:
+        seconds = float(query.get("seconds", 10))
+        interval_ms = float(query.get("interval_ms", settings.PROFILER_INTERVAL_MS))
+    except ValueError:
+        return None, "seconds and interval_ms must be numbers."
+    mode, output = query.get("mode", "wall"), query.get("format", "collapsed")
+    if not 0 < seconds <= settings.PROFILER_MAX_SECONDS:
+        return None, f"seconds must be in (0, {settings.PROFILER_MAX_SECONDS}]."
+    if not 1 <= interval_ms <= 1000:
+        return None, "interval_ms must be in [1, 1000]."
+    if mode not in MODES or output not in FORMATS:
+        return None, f"mode is one of {', '.join(MODES)}; format one of {', '.join(FORMATS)}."
+    return {"seconds": seconds, "mode": mode, "output": output, "interval": interval_ms / 1000}, None
+
+
+def _frame_key(code) -> tuple[str, str, int]:
+    """(function, file, first line): the app's files relative to it, others as package/module.py."""
+    filename = code.co_filename
+    if filename.startswith(_CWD):
+        filename = filename[len(_CWD):]
+    elif os.sep in filename:
+        filename = os.path.join(*filename.split(os.sep)[-2:])
+    return code.co_qualname, filename, code.co_firstlineno
+
+
+def _thread_stack(frame) -> list[tuple[str, str, int]]:
+    """Outermost first, without asyncio and threading internals."""
+    stack = []
+    while frame is not None:
+        if not frame.f_code.co_filename.startswith(_SKIPPED_FILES):
+            stack.append(_frame_key(frame.f_code))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _await_stack(coro) -> list[tuple[str, str, int]]:
+    """A suspended coroutine and what it awaits (asyncio.sleep, Queue.get...), down to the innermost one."""
+    stack = []
+    while coro is not None and len(stack) < 100:
+        code = getattr(coro, "cr_code", None) or getattr(coro, "gi_code", None)
+        if code is None:
+            # A future (behind its C iterator), a task or another awaitable: name it and stop
+            stack.append((f"({type(coro).__name__.removesuffix('Iter')})", "", 0))
+            break
+        stack.append(_frame_key(code))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return stack
+
+
+def _request_await_stacks(loop: asyncio.AbstractEventLoop, skip_task: asyncio.Task | None) -> concurrent.futures.Future:
+    """Has the loop list the await stacks of its tasks but skip_task; from another thread, without waiting."""
+    future = concurrent.futures.Future()
+
+    def snapshot():
+        # Between two callbacks no task is running: every one is suspended in an await
+        stacks = []
+        for task in asyncio.all_tasks(loop):
+            if task is not skip_task:
+                stack = _await_stack(task.get_coro())
+                if stack:
+                    stacks.append(stack)
+        future.set_result(stacks)
+
+    loop.call_soon_threadsafe(snapshot)
+    return future
+
+
+def sample(seconds: float, mode: str, interval: float, loop: asyncio.AbstractEventLoop | None = None,
+           loop_thread: int | None = None, skip_task: asyncio.Task | None = None) -> Counter:
+    """
+    Samples every thread but the calling one for `seconds` (blocking: run it off the event loop).
+    Returns stack (tuple of (function, file, line)) -> microseconds.
+    loop / loop_thread: the event loop whose suspended tasks are sampled too (wall mode), and its thread.
+    skip_task: a task left out of those (the one waiting for this profile).
+    """
+    me = threading.get_ident()
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    clocks = {}
+    weights = Counter()
+    last = time.perf_counter()
+    last_cpu = {}
+    deadline = last + seconds
+    # Await stacks requested from the loop, and the wall time they stand for once it answers
+    awaiting, awaiting_us = None, 0.0
+    while True:
+        time.sleep(interval)
+        now = time.perf_counter()
+        elapsed_us = (now - last) * 1e6
+        last = now
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            if mode == "cpu":
+                if ident not in clocks:
+                    try:
+                        clocks[ident] = time.pthread_getcpuclockid(ident)
+                    except (AttributeError, OSError):
+                        continue
+                cpu = time.clock_gettime(clocks[ident])
+                previous, last_cpu[ident] = last_cpu.get(ident), cpu
+                if previous is None or cpu <= previous:
+                    continue
+                weight = (cpu - previous) * 1e6
+            else:
+                weight = elapsed_us
+            root = (names.get(ident) or f"thread-{ident}", "", 0)
+            weights[(root, *_thread_stack(frame))] += weight
+
+        if mode == "wall" and loop is not None:
+            awaiting_us += elapsed_us
+            if awaiting is not None and awaiting.done():
+                root = (names.get(loop_thread) or "event loop", "", 0)
+                for stack in awaiting.result():
+                    weights[(root, ("(awaiting)", "", 0), *stack)] += awaiting_us
+                awaiting, awaiting_us = None, 0.0
+            if awaiting is None:
+                try:
+                    awaiting = _request_await_stacks(loop, skip_task)
+                except RuntimeError:
+                    # The loop is closed
+                    loop = None
+
+        if now >= deadline:
+            return weights
+
+
+def collapsed(weights: Counter) -> str:
+    """One "frame;frame;frame microseconds" line per stack (Brendan Gregg's folded format)."""
+    lines = []
+    for stack, weight in weights.most_common():
+        names = ";".join(
+            (f"{name} ({filename}:{line})" if filename else name).replace(";", ",") for name, filename, line in stack
+        )
+        lines.append(f"{names} {round(weight)}")
+    return "\n".join(lines) + "\n"
+
+
+def speedscope(weights: Counter, name: str) -> str:
+    """A speedscope.app document with one sampled profile."""
+    frames, index = [], {}
+    samples, sample_weights = [], []
+    for stack, weight in weights.most_common():
+        ids = []
+        for key in stack:
+            if key not in index:
+                index[key] = len(frames)
+                function, filename, line = key
+                frames.append({"name": function, **({"file": filename, "line": line} if filename else {})})
+            ids.append(index[key])
+        samples.append(ids)
+        sample_weights.append(round(weight))
+    return json.dumps({
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "microseconds",
+            "startValue": 0,
+            "endValue": sum(sample_weights),
+            "samples": samples,
+            "weights": sample_weights,
+        }],
+        "name": name,
+        "exporter": "app.profiler",
+    })
+
+
+async def run(seconds: float, mode: str, output: str, interval: float, name: str) -> tuple[str, str]:
+    """Profiles this process from a helper thread; returns (content type, body)."""
+    loop = asyncio.get_running_loop()
+    weights = await asyncio.to_thread(
+        sample, seconds, mode, interval, loop, threading.get_ident(), asyncio.current_task()
+    )
+    if output == "speedscope":
+        return "application/json", speedscope(weights, f"{name} ({mode}, {seconds:g}s)")
+    return "text/plain; charset=utf-8", collapsed(weights)
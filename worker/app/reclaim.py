@@ -0,0 +1,126 @@
+import time
+from .database import redis_client
+from .config import settings, logger
+from . import lifecycle, metrics
+
+# Fields added to a message when it is moved to the dead-letter stream
+DLQ_META_FIELDS = ("dlq_source_stream", "dlq_source_id", "dlq_group", "dlq_deliveries", "dlq_failed_at")
+
+
+def dead_letter_stream(stream_name: str) -> str:
+    return f"{stream_name}{settings.DEAD_LETTER_STREAM_SUFFIX}"
+
+
+async def move_to_dead_letter(stream_name: str, group_name: str, message_id: str,
+                              message_data: dict, deliveries: int) -> bool:
+    """
+    Copies a poison message to the dead-letter stream, then acknowledges the original.
+    The original is only ACKed once the DLQ copy is safely written.
+    """
+    dlq_entry = dict(message_data)
+    dlq_entry.update({
+        "dlq_source_stream": stream_name,
+        "dlq_source_id": message_id,
+        "dlq_group": group_name,
+        "dlq_deliveries": str(deliveries),
+        "dlq_failed_at": str(int(time.time() * 1000)),
+    })
+    dlq_id = await redis_client.add_to_stream(dead_letter_stream(stream_name), dlq_entry)
+    if dlq_id is None:
+        return False
+
+    await redis_client.acknowledge_message(stream_name, group_name, message_id)
+    logger.warning(
+        f"Message {message_id} from '{stream_name}' moved to dead-letter stream after {deliveries} deliveries."
+    )
+    return True
+
+
+async def _handle_claimed(stream_name: str, group_name: str, processor_func, messages: list) -> int:
+    """Retries (or dead-letters) one batch of claimed messages. Returns how many were retried."""
+    # Entries trimmed from the stream come back without data: nothing left to process
+    live = []
+    for message_id, message_data in messages:
+        if message_data:
+            live.append((message_id, message_data))
+        else:
+            await redis_client.acknowledge_message(stream_name, group_name, message_id)
+
+    if not live:
+        return 0
+
+    # The PEL delivery counter is our retry counter (XAUTOCLAIM increments it)
+    delivery_counts = await redis_client.get_delivery_counts(
+        stream_name, group_name, settings.CONSUMER_NAME, [message_id for message_id, _ in live]
+    )
+    if delivery_counts is None:
+        # Without the counts a poison message would be retried forever: leave the batch pending for the next sweep
+        return 0
+
+    retried = 0
+    for message_id, message_data in live:
+        deliveries = delivery_counts.get(message_id)
+        if deliveries is None:
+            # Acknowledged meanwhile (or claimed away): not ours to retry
+            continue
+
+        if deliveries > settings.MAX_DELIVERY_ATTEMPTS:
+            if await move_to_dead_letter(stream_name, group_name, message_id, message_data, deliveries):
+                metrics.DEAD_LETTERED.labels(stream=stream_name).inc()
+            continue
+
+        logger.info(f"Retrying message {message_id} from '{stream_name}' (delivery {deliveries}).")
+        retried += 1
+        success = await metrics.run_processor(processor_func, message_id, message_data)
+        if success:
+            await redis_client.acknowledge_message(stream_name, group_name, message_id)
+
+    metrics.RECLAIMED.labels(stream=stream_name).inc(retried)
+    return retried
+
+
+async def reclaim_once(stream_name: str, group_name: str, processor_func) -> int:
+    """
+    One full XAUTOCLAIM sweep over the PEL of a consumer group.
+    Returns the number of messages retried (dead-lettered ones not included).
+    """
+    reclaimed = 0
+    start_id = "0-0"
+
+    while True:
+        next_id, messages = await redis_client.autoclaim_messages(
+            stream_name, group_name, settings.CONSUMER_NAME,
+            min_idle_ms=settings.RECLAIM_MIN_IDLE_MS,
+            start_id=start_id,
+            count=settings.RECLAIM_BATCH_SIZE
+        )
+        if messages:
+            reclaimed += await _handle_claimed(stream_name, group_name, processor_func, messages)
+
+        # "0-0" means the whole PEL has been scanned
+        if next_id == "0-0":
+            break
+        start_id = next_id
+
+    return reclaimed
+
+
+async def run_reclaimer(stream_name: str, group_name: str, processor_func):
+    """
+    Periodically reclaims messages abandoned by dead consumers or failed processors.
+    """
+    logger.info(
+        f"Reclaimer started for '{stream_name}' "
+        f"(idle > {settings.RECLAIM_MIN_IDLE_MS}ms, max {settings.MAX_DELIVERY_ATTEMPTS} deliveries)."
+    )
+    await redis_client.create_consumer_group(stream_name, group_name)
+
+    while not lifecycle.is_stopping():
+        try:
+            reclaimed = await reclaim_once(stream_name, group_name, processor_func)
+            if reclaimed:
+                logger.info(f"Retried {reclaimed} pending messages from '{stream_name}'.")
+        except Exception as e:
+            logger.error(f"Reclaimer for {stream_name} failed: {e}")
+
+        await lifecycle.sleep(settings.RECLAIM_INTERVAL_SECONDS)
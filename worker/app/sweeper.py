@@ -0,0 +1,116 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from .database import redis_client
+from .config import settings, logger
+from .classify import DIMENSIONS
+from . import keys, lifecycle, metrics
+
+
+def link_keys(short_id: str, created_at: int | None, expires_at: int, now: int) -> list[str]:
+    """
+    Every key a link can have written. The link itself (link:{id}, or its field in a bucket)
+    expires in Redis; the rest is listed here.
+    Time buckets are enumerated between creation and expiry, limited to those whose TTL hasn't run out.
+    """
+    names = [
+        keys.link(short_id),
+        keys.data(short_id),
+        keys.unique_visitors(short_id),
+        keys.clicks_timeseries(short_id),
+        keys.stats_cache(short_id),
+    ]
+
+    first_day = max(created_at or 0, now - settings.UV_DAILY_TTL_SECONDS)
+    day = datetime.fromtimestamp(first_day, tz=timezone.utc).replace(hour=0, minute=0, second=0)
+    last = datetime.fromtimestamp(expires_at, tz=timezone.utc)
+    while day <= last:
+        names.append(keys.unique_visitors_day(short_id, f"{day:%Y%m%d}"))
+        names.extend(keys.breakdown(short_id, dimension, f"{day:%Y%m%d}") for dimension in DIMENSIONS)
+        day += timedelta(days=1)
+
+    if settings.UV_HOURLY_BUCKETS:
+        first_hour = max(created_at or 0, now - settings.UV_HOURLY_TTL_SECONDS)
+        hour = datetime.fromtimestamp(first_hour, tz=timezone.utc).replace(minute=0, second=0)
+        while hour <= last:
+            names.append(keys.unique_visitors_hour(short_id, f"{hour:%Y%m%d%H}"))
+            hour += timedelta(hours=1)
+    return names
+
+
+def _remove_qr_file(short_id: str) -> int:
+    path = os.path.join(settings.MEDIA_PATH, f"{short_id}.png")
+    try:
+        size = os.path.getsize(path)
+        os.remove(path)
+        return size
+    except FileNotFoundError:
+        return 0
+
+
+async def sweep_once() -> tuple[int, int, int]:
+    """
+    Cleans up one batch of expired links: their keys (UNLINK), leaderboard entry and QR image.
+    Returns (links swept, Redis bytes reclaimed, file bytes reclaimed).
+    """
+    now = int(time.time())
+    expired = await redis_client.get_expired_members(settings.LINK_EXPIRY_ZSET, now, settings.SWEEP_BATCH_SIZE)
+    if not expired:
+        return 0, 0, 0
+
+    data_keys = [keys.data(short_id) for short_id in expired]
+    timestamps = await redis_client.get_hash_fields_many(data_keys, "created_at", "expires_at")
+
+    expired_keys = []
+    by_leaderboard: dict[str, list[str]] = {}
+    for short_id, (created_at, expires_at) in zip(expired, timestamps):
+        by_leaderboard.setdefault(keys.leaderboard(short_id), []).append(short_id)
+        expired_keys.extend(link_keys(
+            short_id,
+            int(created_at) if created_at else None,
+            int(expires_at) if expires_at else now,
+            now
+        ))
+
+    _, redis_bytes = await redis_client.unlink_keys(expired_keys, settings.SWEEP_PIPELINE_SIZE)
+    for leaderboard_key, short_ids in by_leaderboard.items():
+        await redis_client.remove_sorted_set_members(leaderboard_key, *short_ids)
+
+    file_bytes = 0
+    for short_id in expired:
+        file_bytes += await asyncio.to_thread(_remove_qr_file, short_id)
+
+    # Removed from the index last: a sweep interrupted above is simply repeated
+    await redis_client.remove_sorted_set_members(settings.LINK_EXPIRY_ZSET, *expired)
+
+    metrics.SWEPT_LINKS.inc(len(expired))
+    metrics.RECLAIMED_BYTES.labels(kind="redis").inc(redis_bytes)
+    metrics.RECLAIMED_BYTES.labels(kind="media").inc(file_bytes)
+    return len(expired), redis_bytes, file_bytes
+
+
+async def run_link_sweeper():
+    """
+    Periodically removes everything that belonged to expired links.
+    Batches are swept back to back until the backlog is gone, then it waits for the next interval.
+    """
+    logger.info(f"Expired link sweeper started (every {settings.SWEEP_INTERVAL_SECONDS}s).")
+
+    while not lifecycle.is_stopping():
+        try:
+            swept = redis_bytes = file_bytes = 0
+            while not lifecycle.is_stopping():
+                links, batch_redis, batch_files = await sweep_once()
+                swept += links
+                redis_bytes += batch_redis
+                file_bytes += batch_files
+                if links < settings.SWEEP_BATCH_SIZE:
+                    break
+            if swept:
+                logger.info(f"Swept {swept} expired links: reclaimed {redis_bytes} bytes in Redis, "
+                            f"{file_bytes} bytes of QR images.")
+        except Exception as e:
+            logger.error(f"Expired link sweep failed: {e}")
+
+        await lifecycle.sleep(settings.SWEEP_INTERVAL_SECONDS)
@@ -1,40 +1,57 @@
+"""
+OpenTelemetry tracing of the worker's Redis commands (TRACE_* settings).
+
+- Off entirely (no provider, no instrumentation) without OTEL_EXPORTER_OTLP_ENDPOINT.
+- Every command is the root of its own trace, sampled by trace ID ratio (TRACE_SAMPLE_RATIO).
+- Bounded export queue: when the collector falls behind spans are dropped, not buffered without limit.
+
+The request-level sampling (per route, keeping failed and slow requests) lives in core-api's tracing.py:
+the worker serves no requests.
+"""
 from opentelemetry import trace
 from opentelemetry.sdk.trace import TracerProvider
 from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
 from opentelemetry.sdk.resources import Resource
-from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
-from opentelemetry.instrumentation.redis import RedisInstrumentor
-import os
+from .config import settings
 
 
-def setup_tracing(service_name: str, app=None):
+def setup_tracing(service_name: str):
     """
     Sets up OpenTelemetry tracing for the service.
     """
+    if not settings.OTEL_EXPORTER_OTLP_ENDPOINT or not settings.TRACE_REDIS_COMMANDS:
+        print(f"Tracing disabled for {service_name}")
+        return
+
+    # Imported here so a worker without an endpoint doesn't load the exporter and instrumentation
+    from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+    from opentelemetry.instrumentation.redis import RedisInstrumentor
 
     # 1. Define the resource (service name)
     resource = Resource.create(attributes={
         "service.name": service_name
     })
 
-    # 2. Configure the Tracer Provider
-    tracer_provider = TracerProvider(resource=resource)
+    # 2. Configure the Tracer Provider with the sampler
+    sampler = ParentBased(TraceIdRatioBased(settings.TRACE_SAMPLE_RATIO))
+    tracer_provider = TracerProvider(resource=resource, sampler=sampler)
     trace.set_tracer_provider(tracer_provider)
 
     # 3. Configure the OTLP Exporter (sends traces to Jaeger)
     # It reads endpoint from OTEL_EXPORTER_OTLP_ENDPOINT env var
     otlp_exporter = OTLPSpanExporter()
 
-    # 4. Add the exporter to the provider
-    span_processor = BatchSpanProcessor(otlp_exporter)
+    # 4. Add the exporter to the provider, behind a bounded queue
+    span_processor = BatchSpanProcessor(
+        otlp_exporter,
+        max_queue_size=settings.TRACE_EXPORT_QUEUE_SIZE,
+        max_export_batch_size=min(settings.TRACE_EXPORT_BATCH_SIZE, settings.TRACE_EXPORT_QUEUE_SIZE),
+        export_timeout_millis=settings.TRACE_EXPORT_TIMEOUT_MS
+    )
     tracer_provider.add_span_processor(span_processor)
 
-    # 5. Instrument FastAPI (if app is provided)
-    if app:
-        FastAPIInstrumentor.instrument_app(app, tracer_provider=tracer_provider)
-
-    # 6. Instrument Redis (Auto-instrumentation)
+    # 5. Instrument Redis: a span per command
     RedisInstrumentor().instrument(tracer_provider=tracer_provider)
 
-    print(f"Tracing initialized for {service_name}")
\ No newline at end of file
+    print(f"Tracing initialized for {service_name}")
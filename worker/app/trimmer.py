@@ -0,0 +1,62 @@
+from .database import redis_client
+from .config import settings, logger
+from . import lifecycle
+
+
+def _parse_id(message_id: str) -> tuple[int, int]:
+    ms, _, seq = message_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+async def safe_trim_point(stream_name: str) -> str | None:
+    """
+    Returns the oldest stream ID that some consumer group still needs.
+    Everything before it has been delivered AND acknowledged by every group.
+    """
+    groups = await redis_client.get_group_info(stream_name)
+    if not groups:
+        # No consumer groups: we can't tell what is safe, leave it to MAXLEN
+        return None
+
+    candidates = []
+    for group in groups:
+        if group["pending"]:
+            # Oldest entry this group has read but not ACKed yet
+            summary = await redis_client.get_pending_summary(stream_name, group["name"])
+            if not summary.get("min"):
+                return None
+            candidates.append(summary["min"])
+        else:
+            # Everything up to last-delivered-id is acknowledged
+            candidates.append(group["last-delivered-id"])
+
+    oldest = min(candidates, key=_parse_id)
+    if oldest == "0-0":
+        return None
+    return oldest
+
+
+async def trim_acknowledged(stream_name: str) -> int:
+    min_id = await safe_trim_point(stream_name)
+    if min_id is None:
+        return 0
+
+    removed = await redis_client.trim_stream_minid(stream_name, min_id)
+    if removed:
+        logger.info(f"Trimmed {removed} acknowledged entries from '{stream_name}' (MINID {min_id}).")
+    return removed
+
+
+async def run_stream_trimmer(stream_names: list[str]):
+    """
+    Periodically evicts stream history that all consumer groups have acknowledged.
+    MAXLEN on the producer side stays as a hard cap in case a group stops consuming.
+    """
+    while not lifecycle.is_stopping():
+        for stream_name in stream_names:
+            try:
+                await trim_acknowledged(stream_name)
+            except Exception as e:
+                logger.error(f"Stream trimmer for {stream_name} failed: {e}")
+
+        await lifecycle.sleep(settings.STREAM_TRIM_INTERVAL_SECONDS)
@@ -0,0 +1,53 @@
+"""
+Decoding of compressed long URLs, as written by core-api (core-api/app/url_codec.py).
+
+    ~<codec><dictionary id>:<base64 of the compressed bytes>
+
+codec "z" is raw deflate, "s" is zstd. Values without the "~" marker are plain URLs.
+Dictionaries are read from LINK_COMPRESSION_DICTS_KEY the first time a value needs one.
+"""
+import base64
+import zlib
+import zstandard
+from .database import redis_client
+from .config import settings, logger
+
+MARKER = "~"
+# A deflate preset dictionary is limited to the 32 KB window; the tail of a zstd dictionary is its content
+_ZLIB_WINDOW = 32 * 1024
+
+# id -> raw dictionary bytes (0 = no dictionary)
+_dictionaries: dict[int, bytes | None] = {0: None}
+_zstd_decompressors: dict[int, zstandard.ZstdDecompressor] = {}
+
+
+def _decompress(codec_tag: str, dict_id: int, data: bytes) -> str:
+    dictionary = _dictionaries[dict_id]
+    if codec_tag == "z":
+        options = {"zdict": dictionary[-_ZLIB_WINDOW:]} if dictionary else {}
+        decompressor = zlib.decompressobj(-15, **options)
+        return (decompressor.decompress(data) + decompressor.flush()).decode()
+
+    decompressor = _zstd_decompressors.get(dict_id)
+    if decompressor is None:
+        decompressor = zstandard.ZstdDecompressor(
+            dict_data=zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        )
+        _zstd_decompressors[dict_id] = decompressor
+    return decompressor.decompress(data).decode()
+
+
+async def decode_url(value: str | None) -> str | None:
+    """Stored value -> URL; None if it names a dictionary that doesn't exist."""
+    if not value or not value.startswith(MARKER):
+        return value
+    header, payload = value[1:].split(":", 1)
+    dict_id = int(header[1:])
+
+    if dict_id not in _dictionaries:
+        encoded = await redis_client.get_hash_field(settings.LINK_COMPRESSION_DICTS_KEY, str(dict_id))
+        if not encoded:
+            logger.error(f"URL compression dictionary {dict_id} is missing from '{settings.LINK_COMPRESSION_DICTS_KEY}'")
+            return None
+        _dictionaries[dict_id] = base64.b64decode(encoded)
+    return _decompress(header[0], dict_id, base64.b64decode(payload))
@@ -0,0 +1,323 @@
+"""
+Standalone worker runtime.
+
+    python -m app.worker
+
+A supervisor process keeps WORKER_PROCESSES consumer processes running, restarts the
+ones that crash, forwards SIGTERM for a graceful drain, and serves /health and /metrics.
+"""
+import asyncio
+import multiprocessing
+import os
+import queue
+import shutil
+import signal
+import sys
+import tempfile
+import time
+import uuid
+from urllib.parse import parse_qsl
+
+# Every process must write its metrics to the same directory, and prometheus_client
+# reads this variable at import time, so it is set before anything imports it.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "worker-metrics"))
+
+from prometheus_client import CONTENT_TYPE_LATEST, multiprocess  # noqa: E402
+from prometheus_client.core import GaugeMetricFamily  # noqa: E402
+from .config import settings, logger  # noqa: E402
+from .database import redis_client  # noqa: E402
+from .health import HealthServer, json_response  # noqa: E402
+from .listener import listen_for_jobs  # noqa: E402
+from .loopmon import loop_monitor  # noqa: E402
+from .tracing import setup_tracing  # noqa: E402
+from . import lifecycle, metrics, profiler  # noqa: E402
+
+
+def _run(coro):
+    """Runs the coroutine on uvloop when available (it is in the Docker image)."""
+    try:
+        import uvloop
+    except ImportError:
+        return asyncio.run(coro)
+    return uvloop.run(coro)
+
+
+def _heartbeat_slots(index: int) -> dict[str, int]:
+    width = len(metrics.CONSUMED_STREAMS)
+    return {stream: index * width + pos for pos, (stream, _) in enumerate(metrics.CONSUMED_STREAMS)}
+
+
+# --- Consumer process ---
+async def _serve_profiles(index: int, requests, results):
+    """Runs the profiles the supervisor asks for (GET /debug/profile) on this process."""
+    while not lifecycle.shutdown_event.is_set():
+        try:
+            request = await asyncio.to_thread(requests.get, True, 1)
+        except queue.Empty:
+            continue
+        request_id = request.pop("id")
+        try:
+            content_type, body = await profiler.run(**request, name=f"worker-{index}")
+            results.put((request_id, content_type, body))
+        except Exception as e:
+            logger.error(f"Profile of consumer process {index} failed: {e}")
+            results.put((request_id, None, str(e)))
+
+
+async def _consumer_main(index: int, heartbeats, profile_requests, profile_results) -> int:
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, lifecycle.shutdown_event.set)
+
+    slots = _heartbeat_slots(index)
+
+    def beat(stream_name: str, timestamp: float):
+        heartbeats[slots[stream_name]] = timestamp
+
+    lifecycle.heartbeat_hook = beat
+
+    setup_tracing("worker")
+    # Processors run on this loop: a blocking one (QR rendering, sync I/O) stalls every consumer
+    await loop_monitor.start()
+    profiles = asyncio.create_task(_serve_profiles(index, profile_requests, profile_results)) \
+        if settings.PROFILER_TOKEN else None
+    await redis_client.connect()
+    try:
+        # Trimming, sweeping and Bloom rebuilds only need one process per container
+        await listen_for_jobs(run_maintenance=(index == 0))
+        return 0
+    except Exception as e:
+        logger.exception(f"Consumer process {index} crashed: {e}")
+        return 1
+    finally:
+        if profiles:
+            profiles.cancel()
+        await redis_client.disconnect()
+        await loop_monitor.stop()
+
+
+def _consumer_process(index: int, heartbeats, profile_requests, profile_results):
+    # Each process is its own consumer in the groups, so PEL ownership stays unambiguous
+    settings.CONSUMER_NAME = f"{settings.CONSUMER_NAME}-{index}"
+    sys.exit(_run(_consumer_main(index, heartbeats, profile_requests, profile_results)))
+
+
+# --- Supervisor ---
+class Supervisor:
+    def __init__(self, processes: int):
+        self.processes = processes
+        self.ctx = multiprocessing.get_context("spawn")
+        self.heartbeats = self.ctx.Array("d", processes * len(metrics.CONSUMED_STREAMS), lock=False)
+        self.children: list = [None] * processes
+        self.started_at = [0.0] * processes
+        self.restart_at = [0.0] * processes
+        self.restarts = [0] * processes
+        self.stop_event = asyncio.Event()
+        self.stream_stats = metrics.StreamStatsCollector()
+        # Profile requests per consumer process (kept across restarts) and their results
+        self.profile_requests = [self.ctx.Queue() for _ in range(processes)]
+        self.profile_results = self.ctx.Queue()
+
+    def _spawn(self, index: int):
+        # A fresh process gets a full heartbeat window before it is reported as stuck
+        for slot in _heartbeat_slots(index).values():
+            self.heartbeats[slot] = time.time()
+
+        proc = self.ctx.Process(
+            target=_consumer_process,
+            args=(index, self.heartbeats, self.profile_requests[index], self.profile_results),
+            name=f"worker-consumer-{index}"
+        )
+        proc.start()
+        self.children[index] = proc
+        self.started_at[index] = time.time()
+        logger.info(f"Started consumer process {index} (pid {proc.pid}).")
+
+    def _reap_and_restart(self):
+        now = time.time()
+        for index, proc in enumerate(self.children):
+            if proc is not None and not proc.is_alive():
+                proc.join()
+                multiprocess.mark_process_dead(proc.pid)
+                self.children[index] = None
+
+                # Exponential backoff, reset once a process has stayed up for a minute
+                if now - self.started_at[index] > 60:
+                    self.restarts[index] = 0
+                delay = min(2 ** self.restarts[index], settings.WORKER_RESTART_BACKOFF_MAX_SECONDS)
+                self.restarts[index] += 1
+                self.restart_at[index] = now + delay
+                logger.error(
+                    f"Consumer process {index} (pid {proc.pid}) exited with code {proc.exitcode}; "
+                    f"restarting in {delay}s."
+                )
+
+            if self.children[index] is None and now >= self.restart_at[index]:
+                self._spawn(index)
+
+    def liveness(self) -> tuple[bool, list]:
+        now = time.time()
+        healthy = True
+        report = []
+        for index, proc in enumerate(self.children):
+            alive = proc is not None and proc.is_alive()
+            ages = {
+                stream: round(now - self.heartbeats[slot], 1)
+                for stream, slot in _heartbeat_slots(index).items()
+            }
+            ok = alive and all(age < settings.WORKER_HEARTBEAT_TIMEOUT_SECONDS for age in ages.values())
+            healthy = healthy and ok
+            report.append({
+                "index": index,
+                "pid": proc.pid if proc is not None else None,
+                "alive": alive,
+                "healthy": ok,
+                "restarts": self.restarts[index],
+                "heartbeat_age_seconds": ages,
+            })
+        return healthy, report
+
+    def collect(self):
+        """Liveness as metrics, so stuck consumers can be alerted on."""
+        up = GaugeMetricFamily(
+            "worker_consumer_up",
+            "1 if the consumer loop heartbeat is recent",
+            labels=["process", "stream"]
+        )
+        restarts = GaugeMetricFamily(
+            "worker_process_restarts",
+            "Consecutive restarts of a consumer process",
+            labels=["process"]
+        )
+        now = time.time()
+        for index, proc in enumerate(self.children):
+            alive = proc is not None and proc.is_alive()
+            for stream, slot in _heartbeat_slots(index).items():
+                fresh = now - self.heartbeats[slot] < settings.WORKER_HEARTBEAT_TIMEOUT_SECONDS
+                up.add_metric([str(index), stream], 1 if alive and fresh else 0)
+            restarts.add_metric([str(index)], self.restarts[index])
+        yield up
+        yield restarts
+
+    def _build_server(self) -> HealthServer:
+        server = HealthServer(settings.WORKER_HTTP_HOST, settings.WORKER_HTTP_PORT)
+
+        @server.route("/")
+        async def root(query: str, headers: dict):
+            healthy, _ = self.liveness()
+            message = "Worker is running and listening!" if healthy else "Worker is degraded."
+            return json_response(200, {"message": message})
+
+        @server.route("/health")
+        async def health(query: str, headers: dict):
+            healthy, report = self.liveness()
+            return json_response(200 if healthy else 503, {"healthy": healthy, "processes": report})
+
+        @server.route("/metrics")
+        async def metrics_endpoint(query: str, headers: dict):
+            await self.stream_stats.refresh()
+            return 200, CONTENT_TYPE_LATEST, metrics.render(self.stream_stats, self)
+
+        @server.route("/debug/profile")
+        async def profile_endpoint(query: str, headers: dict):
+            # Indistinguishable from a missing route unless the caller has PROFILER_TOKEN
+            if not profiler.authorized(headers.get("authorization")):
+                return json_response(404, {"detail": "Not Found"})
+            return await self.profile(dict(parse_qsl(query)))
+
+        return server
+
+    async def profile(self, query: dict) -> tuple[int, str, bytes]:
+        """Profiles consumer process `process` (default 0) with the query's options (see profiler.py)."""
+        options, error = profiler.parse_request(query)
+        index = query.get("process", "0")
+        if error is None and not (index.isdigit() and int(index) < self.processes):
+            error = f"process must be in [0, {self.processes - 1}]."
+        if error:
+            return json_response(400, {"detail": error})
+        index = int(index)
+        proc = self.children[index]
+        if proc is None or not proc.is_alive():
+            return json_response(503, {"detail": f"Consumer process {index} is not running."})
+        busy = profiler.reserve()
+        if busy:
+            return json_response(429, {"detail": busy})
+        try:
+            request_id = uuid.uuid4().hex
+            self.profile_requests[index].put({"id": request_id, **options})
+            deadline = time.monotonic() + options["seconds"] + 15
+            while (timeout := deadline - time.monotonic()) > 0:
+                try:
+                    result_id, content_type, body = await asyncio.to_thread(self.profile_results.get, True, timeout)
+                except queue.Empty:
+                    break
+                # A result of an earlier request that timed out: ignore it
+                if result_id != request_id:
+                    continue
+                if content_type is None:
+                    return json_response(500, {"detail": body})
+                return 200, content_type, body.encode()
+            return json_response(503, {"detail": f"Consumer process {index} did not answer in time."})
+        finally:
+            profiler.release()
+
+    async def _shutdown(self):
+        logger.info("Shutting down: asking consumer processes to drain...")
+        for proc in self.children:
+            if proc is not None and proc.is_alive():
+                proc.terminate()  # SIGTERM -> graceful drain
+
+        deadline = time.time() + settings.WORKER_SHUTDOWN_TIMEOUT_SECONDS
+        while time.time() < deadline and any(p is not None and p.is_alive() for p in self.children):
+            await asyncio.sleep(0.2)
+
+        for index, proc in enumerate(self.children):
+            if proc is None:
+                continue
+            if proc.is_alive():
+                logger.warning(f"Consumer process {index} did not drain in time; killing it.")
+                proc.kill()
+            proc.join()
+        logger.info("All consumer processes stopped.")
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.stop_event.set)
+
+        # Used only for consumer-group metrics; consumers have their own connections
+        await redis_client.connect()
+        server = self._build_server()
+        await server.start()
+
+        for index in range(self.processes):
+            self._spawn(index)
+
+        while not self.stop_event.is_set():
+            self._reap_and_restart()
+            try:
+                await asyncio.wait_for(self.stop_event.wait(), timeout=1)
+            except asyncio.TimeoutError:
+                pass
+
+        await self._shutdown()
+        await server.stop()
+        await redis_client.disconnect()
+
+
+def _reset_metrics_dir():
+    """Metric files of a previous run would otherwise be summed into ours."""
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def main():
+    _reset_metrics_dir()
+    processes = settings.WORKER_PROCESSES or os.cpu_count() or 1
+    logger.info(f"Starting worker supervisor with {processes} consumer processes.")
+    _run(Supervisor(processes).run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Events per second one worker process gets through, and what each event costs in Redis.
+
+Usage (from worker/):
+    python -m benchmarks.stream_throughput [--stream analytics|qr] [--events 100000] [--links 10000]
+                                           [--zipf 1.1] [--rate N] [--consumers 1] [--batch-size 50]
+                                           [--db 15] [--force] [--profile worker.prof]
+
+Fills the stream with synthetic events (clicks spread over --links links with Zipf-distributed
+popularity, or one QR job per link), then runs listener.consume_stream with the real processor
+until the consumer group has drained it. Without --rate the whole backlog is loaded first and the
+lag percentiles show how long the backlog took to clear; with --rate events are produced at that
+rate during the run and the lag is the end-to-end delay at that load.
+
+Reports events/s, lag (message ID time to processed) percentiles and Redis commands per event
+(INFO commandstats, which counts the commands run inside apply_click too).
+--profile writes cProfile stats of the consuming phase: `python -m pstats worker.prof`, snakeviz, or
+`flameprof worker.prof > flame.svg` / `flameprof --format=log` for flamegraph.pl.
+
+Runs in a scratch database that is flushed before and after, so it refuses a non-empty one without
+--force. Not available with REDIS_CLUSTER (a single database only).
+"""
+import argparse
+import asyncio
+import cProfile
+import functools
+import os
+import pstats
+import random
+import sys
+import tempfile
+import time
+from app.config import settings
+from app.database import redis_client
+from app import lifecycle, listener
+
+# Zipf / percentile are shared with the other service's benchmark: <repo>/benchmarks, mounted at /benchmarks
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "benchmarks"))
+from workload import Zipf, percentile  # noqa: E402
+
+REFERRERS = ["", "https://www.google.com/search?q=x", "https://t.co/abc", "https://news.ycombinator.com/"]
+USER_AGENTS = [
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) Mobile/15E148",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/126.0 Safari/537.36",
+    "Mozilla/5.0 (Linux; Android 14; SM-X710) AppleWebKit/537.36 Safari/537.36",
+]
+LANGUAGES = ["en-US,en;q=0.9", "de-DE,de;q=0.8", "fa-IR,fa;q=0.9", ""]
+# Our own monitoring, not part of the cost of an event
+IGNORED_COMMANDS = {"info", "xinfo|groups", "xinfo", "ping", "flushdb", "dbsize"}
+
+
+def synthetic_events(args) -> list[dict]:
+    rng = random.Random(args.seed)
+    short_ids = [f"b{n:07d}" for n in range(args.links)]
+    if args.stream == "qr":
+        return [{"short_id": short_id, "long_url": f"https://example.com/{short_id}?ref=benchmark"}
+                for short_id in short_ids[:args.events]]
+
+    zipf = Zipf(len(short_ids), args.zipf)
+    return [
+        {
+            "short_id": short_ids[zipf.sample(rng)],
+            "ip": f"10.0.{rng.randrange(256)}.{rng.randrange(256)}",
+            "ref": rng.choice(REFERRERS),
+            "ua": rng.choice(USER_AGENTS),
+            "lang": rng.choice(LANGUAGES),
+        }
+        for _ in range(args.events)
+    ]
+
+
+async def produce(stream_name: str, events: list[dict], rate: float | None, chunk: int = 500):
+    """XADDs the events, all at once or spread over time at `rate` per second."""
+    client = redis_client.client
+    started = time.perf_counter()
+    step = chunk if rate is None else max(1, int(rate / 100))
+    for start in range(0, len(events), step):
+        if rate is not None:
+            delay = started + start / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        async with client.pipeline(transaction=False) as pipe:
+            for event in events[start:start + step]:
+                pipe.xadd(stream_name, event)
+            await pipe.execute()
+
+
+async def command_calls() -> dict[str, int]:
+    try:
+        stats = await redis_client.client.info("commandstats")
+    except Exception:
+        return {}
+    return {name.removeprefix("cmdstat_"): value["calls"] for name, value in stats.items()
+            if name.removeprefix("cmdstat_") not in IGNORED_COMMANDS}
+
+
+async def wait_until_drained(stream_name: str, group_name: str, produced: asyncio.Task, expected: int,
+                             failures: list):
+    """Until every event was read and only failed ones (left in the PEL for the reclaimer) are pending."""
+    while True:
+        await asyncio.sleep(0.2)
+        if not produced.done():
+            continue
+        groups = await redis_client.client.xinfo_groups(stream_name)
+        group = next((group for group in groups if group["name"] == group_name), None)
+        if group and (group.get("entries-read") or 0) >= expected and group["pending"] <= len(failures):
+            return
+
+
+async def run(args) -> dict:
+    if args.stream == "qr":
+        stream_name, group_name, processor = (
+            settings.QR_CODE_JOBS_STREAM, settings.QR_CODE_CONSUMER_GROUP, listener.process_qr_job
+        )
+        settings.MEDIA_PATH = tempfile.mkdtemp(prefix="qr-benchmark-")
+    else:
+        stream_name, group_name, processor = (
+            settings.ANALYTICS_STREAM_NAME, settings.ANALYTICS_CONSUMER_GROUP, listener.process_analytics_job
+        )
+    settings.STREAM_BATCH_SIZE = args.batch_size
+    settings.STREAM_BLOCK_MS = 100
+
+    client = redis_client.client
+    await client.flushdb()
+    await listener.load_functions()
+    await redis_client.create_consumer_group(stream_name, group_name, start_id="0")
+
+    events = synthetic_events(args)
+    if args.rate is None:
+        started = time.perf_counter()
+        await produce(stream_name, events, None)
+        print(f"Loaded {len(events)} events in {time.perf_counter() - started:.1f}s.")
+
+    lags_ms = []
+    failures = []
+
+    @functools.wraps(processor)
+    async def timed_processor(message_id: str, message_data: dict) -> bool:
+        ok = await processor(message_id, message_data)
+        lags_ms.append(time.time() * 1000 - int(message_id.split("-")[0]))
+        if not ok:
+            failures.append(message_id)
+        return ok
+
+    calls_before = await command_calls()
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    started = time.perf_counter()
+
+    produced = asyncio.create_task(produce(stream_name, events, args.rate) if args.rate else asyncio.sleep(0))
+    consumers = [asyncio.create_task(listener.consume_stream(stream_name, group_name, timed_processor))
+                 for _ in range(args.consumers)]
+    await wait_until_drained(stream_name, group_name, produced, len(events), failures)
+    elapsed = time.perf_counter() - started
+    lifecycle.shutdown_event.set()
+    await asyncio.gather(*consumers)
+
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+    calls_after = await command_calls()
+    await client.flushdb()
+
+    commands = {name: calls - calls_before.get(name, 0) for name, calls in calls_after.items()}
+    commands = {name: calls for name, calls in commands.items() if calls > 0}
+    lags_ms.sort()
+    return {
+        "events": len(lags_ms),
+        "failed": len(failures),
+        "seconds": elapsed,
+        "events_per_second": len(lags_ms) / elapsed,
+        "lag_ms": {f"p{int(q * 100)}": percentile(lags_ms, q) for q in (0.5, 0.95, 0.99)},
+        "commands_per_event": sum(commands.values()) / max(1, len(lags_ms)) if commands else None,
+        "commands": dict(sorted(commands.items(), key=lambda item: item[1], reverse=True)),
+    }
+
+
+async def main_async(args) -> dict:
+    if settings.REDIS_CLUSTER:
+        raise SystemExit("Needs a scratch database: not available with REDIS_CLUSTER.")
+    redis_client.db = args.db
+    await redis_client.connect()
+    if redis_client.client is None:
+        raise SystemExit("Could not connect to Redis.")
+    try:
+        if await redis_client.client.dbsize() and not args.force:
+            raise SystemExit(f"Database {args.db} is not empty; it gets flushed, so pass --force.")
+        return await run(args)
+    finally:
+        await redis_client.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how fast the worker drains a stream.")
+    parser.add_argument("--stream", choices=("analytics", "qr"), default="analytics")
+    parser.add_argument("--events", type=int, default=100000)
+    parser.add_argument("--links", type=int, default=10000, help="Distinct short_ids (QR: one job each)")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of link popularity")
+    parser.add_argument("--rate", type=float, help="Produce events at this rate during the run")
+    parser.add_argument("--consumers", type=int, default=1, help="consume_stream loops in this process")
+    parser.add_argument("--batch-size", type=int, default=settings.STREAM_BATCH_SIZE)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", type=int, default=15)
+    parser.add_argument("--force", action="store_true")
+    parser.add_argument("--profile", help="Write cProfile stats of the consuming phase to this file")
+    args = parser.parse_args()
+    if args.stream == "qr":
+        args.events = min(args.events, args.links)
+
+    result = asyncio.run(main_async(args))
+
+    print(f"{result['events']} {args.stream} events in {result['seconds']:.1f}s: "
+          f"{result['events_per_second']:.0f} events/s with {args.consumers} consumer(s), batches of {args.batch_size}.")
+    if result["failed"]:
+        print(f"{result['failed']} events failed (see the log).")
+    print("Lag (ms): " + ", ".join(f"{name} {value:.0f}" for name, value in result["lag_ms"].items()))
+    if result["commands_per_event"] is not None:
+        top = ", ".join(f"{name} {calls / result['events']:.2f}" for name, calls in list(result["commands"].items())[:8])
+        print(f"Redis commands per event: {result['commands_per_event']:.2f} ({top})")
+    if args.profile:
+        pstats.Stats(args.profile).sort_stats("cumulative").print_stats(20)
+        print(f"Profile written to {args.profile}.")
+
+
+if __name__ == "__main__":
+    main()
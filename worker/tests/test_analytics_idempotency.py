@@ -0,0 +1,68 @@
+import uuid
+from datetime import datetime, timezone
+import pytest
+from app.config import settings
+from app.database import redis_client
+from app import listener, reclaim
+
+
+class WorkerKilled(BaseException):
+    """Stands in for SIGKILL: nothing after the crash point runs, including XACK."""
+
+
+@pytest.mark.asyncio
+async def test_redelivered_batch_keeps_counts_exact(monkeypatch):
+    """
+    The worker dies mid-batch after applying part of it but before XACK.
+    After the batch is reclaimed and redelivered, every counter must be exact.
+    """
+    monkeypatch.setattr(settings, "RECLAIM_MIN_IDLE_MS", 0)
+    monkeypatch.setattr(settings, "STREAM_BATCH_SIZE", 50)
+    monkeypatch.setattr(settings, "STREAM_BLOCK_MS", 100)
+
+    await redis_client.connect()
+    client = redis_client.client
+    await listener.load_functions()
+
+    run_id = uuid.uuid4().hex[:8]
+    stream, group = f"test_analytics:{run_id}", "test_processors"
+    short_id = f"t{run_id}"
+    total_events = 40
+
+    await redis_client.create_consumer_group(stream, group)
+    for i in range(total_events):
+        await client.xadd(stream, {"short_id": short_id, "ip": f"10.0.0.{i % 10}", "ua": "Mozilla/5.0 (iPhone) Mobile"})
+
+    # 1. The worker applies 25 messages of the batch, then is killed
+    applied = 0
+
+    async def crashing_processor(message_id, message_data):
+        nonlocal applied
+        if applied == 25:
+            raise WorkerKilled()
+        applied += 1
+        return await listener.process_analytics_job(message_id, message_data)
+
+    with pytest.raises(WorkerKilled):
+        await listener.consume_stream(stream, group, crashing_processor)
+
+    assert (await client.xpending(stream, group))["pending"] == total_events
+
+    # 2. After restart the whole batch is reclaimed and redelivered
+    reclaimed = await reclaim.reclaim_once(stream, group, listener.process_analytics_job)
+    assert reclaimed == total_events
+    assert (await client.xpending(stream, group))["pending"] == 0
+
+    # 3. Redelivered messages were no-ops: counts are exact
+    device_key = f"bd:{short_id}:device:{datetime.now(timezone.utc):%Y%m%d}"
+    try:
+        assert int(await client.hget(f"data:{short_id}", "total_clicks")) == total_events
+        assert await client.zscore("leaderboard:top_links", short_id) == total_events
+        points = await client.ts().range(f"ts:clicks:{short_id}", "-", "+")
+        assert sum(value for _, value in points) == total_events
+        assert await client.pfcount(f"uv:{short_id}") == 10
+        assert int(await client.hget(device_key, "mobile")) == total_events
+    finally:
+        await client.delete(stream, f"data:{short_id}", f"ts:clicks:{short_id}", f"uv:{short_id}", device_key)
+        await client.zrem("leaderboard:top_links", short_id)
+        await redis_client.disconnect()
@@ -0,0 +1,53 @@
+import asyncio
+import uuid
+import pyarrow.dataset as ds
+import pytest
+from app.config import settings
+from app.database import redis_client
+from app import archiver, lifecycle
+
+
+@pytest.mark.asyncio
+async def test_archived_events_are_on_disk_before_ack(monkeypatch, tmp_path):
+    """
+    Every event ends up exactly once in the hour-partitioned archive, and nothing
+    is left pending once the archiver has drained.
+    """
+    monkeypatch.setattr(settings, "ARCHIVE_PATH", str(tmp_path))
+    monkeypatch.setattr(settings, "ARCHIVE_FLUSH_ROWS", 10)
+    monkeypatch.setattr(settings, "STREAM_BLOCK_MS", 100)
+
+    await redis_client.connect()
+    client = redis_client.client
+
+    run_id = uuid.uuid4().hex[:8]
+    stream, group = f"test_archive:{run_id}", "test_archivers"
+    total_events = 25
+    for i in range(total_events):
+        await client.xadd(stream, {"short_id": f"s{i % 3}", "ip": f"10.0.0.{i}", "w": "2"})
+
+    task = asyncio.create_task(archiver.run_archiver(stream, group))
+    try:
+        # Wait until everything has been read and ACKed
+        for _ in range(100):
+            await asyncio.sleep(0.05)
+            groups = await redis_client.get_group_info(stream)
+            if groups and groups[0]["lag"] == 0 and groups[0]["pending"] == 0:
+                break
+        lifecycle.shutdown_event.set()
+        await task
+
+        # The shutdown closed (and compacted) the hour file
+        files = list(tmp_path.rglob("*.parquet"))
+        assert files and not list(tmp_path.rglob("*.arrows"))
+        assert files[0].parent.name.startswith("hour=")
+
+        table = ds.dataset(str(tmp_path), format="parquet", partitioning="hive").to_table()
+        assert table.num_rows == total_events
+        assert len(set(table.column("id").to_pylist())) == total_events
+        assert sum(table.column("w").to_pylist()) == 2 * total_events
+        assert table.column("ref").null_count == total_events
+    finally:
+        lifecycle.shutdown_event.clear()
+        await client.delete(stream)
+        await redis_client.disconnect()
@@ -0,0 +1,28 @@
+from app.classify import classify_click, country_code, device_type, referrer_domain
+
+
+def test_referrer_domain():
+    assert referrer_domain("https://www.google.com/search?q=x") == "google.com"
+    assert referrer_domain("https://t.co/abc") == "t.co"
+    assert referrer_domain("") == "direct"
+    assert referrer_domain("not a url") == "other"
+
+
+def test_device_type():
+    assert device_type("Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) Mobile/15E148") == "mobile"
+    assert device_type("Mozilla/5.0 (Linux; Android 14; SM-X710) AppleWebKit/537.36 Safari/537.36") == "tablet"
+    assert device_type("Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/126.0 Safari/537.36") == "desktop"
+    assert device_type("Googlebot/2.1 (+http://www.google.com/bot.html)") == "bot"
+    assert device_type("") == "unknown"
+
+
+def test_country_code():
+    assert country_code("en-US,en;q=0.9") == "US"
+    assert country_code("fa-IR") == "IR"
+    assert country_code("zh-Hant-TW,zh;q=0.8") == "TW"
+    assert country_code("de") == "unknown"
+    assert country_code("") == "unknown"
+
+
+def test_classify_click_without_headers():
+    assert classify_click({"short_id": "abc"}) == {"referrer": "direct", "country": "unknown", "device": "unknown"}
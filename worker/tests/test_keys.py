@@ -0,0 +1,31 @@
+from redis.crc import key_slot
+from app.classify import DIMENSIONS
+from app.config import settings
+from app.sweeper import link_keys
+from app import keys
+
+
+def test_link_keys_share_a_slot_on_a_cluster(monkeypatch):
+    """Everything apply_click and the sweeper touch for one link must hash to the same slot."""
+    monkeypatch.setattr(settings, "REDIS_CLUSTER", True)
+    short_id = "abc123"
+    names = link_keys(short_id, created_at=1_700_000_000, expires_at=1_700_200_000, now=1_700_100_000)
+    names += [keys.analytics_dedup(short_id, 17), *(keys.breakdown(short_id, name, "20240101") for name in DIMENSIONS)]
+
+    assert keys.link(short_id) == "link:{abc123}"
+    assert {key_slot(name.encode()) for name in names} == {key_slot(b"abc123")}
+    assert keys.short_id_from_key(keys.link(short_id)) == short_id
+
+
+def test_plain_keys_and_shards(monkeypatch):
+    assert keys.link("abc123") == "link:abc123"
+    assert keys.leaderboard("abc123") == settings.LEADERBOARD_KEY
+
+    monkeypatch.setattr(settings, "LEADERBOARD_SHARDS", 4)
+    monkeypatch.setattr(settings, "STREAM_SHARDS", 4)
+    assert keys.leaderboards() == [f"{settings.LEADERBOARD_KEY}:{{{n}}}" for n in range(4)]
+    # A link always maps to the same shard, and shard n of every structure shares a slot
+    for short_id in ("abc123", "zz9", "Q1w2E3"):
+        leaderboard = keys.leaderboard(short_id)
+        assert leaderboard in keys.leaderboards()
+        assert key_slot(leaderboard.encode()) == key_slot(keys.stream("analytics_jobs", short_id).encode())
@@ -0,0 +1,33 @@
+import asyncio
+import logging
+import time
+import pytest
+from prometheus_client import REGISTRY
+from app.loopmon import LoopMonitor
+
+
+def blocking_render():
+    time.sleep(0.3)
+
+
+@pytest.mark.asyncio
+async def test_stall_is_counted_and_its_stack_logged_once(caplog):
+    """A blocking call is caught while it runs: counted per stall, its stack logged at most once per interval."""
+    monitor = LoopMonitor(enabled=True, interval=0.02, threshold=0.1, log_interval=60)
+    stalls = REGISTRY.get_sample_value("worker_event_loop_stalls_total")
+    caplog.set_level(logging.WARNING)
+    await monitor.start()
+    try:
+        await asyncio.sleep(0.1)
+        blocking_render()
+        await asyncio.sleep(0.1)
+        blocking_render()
+        await asyncio.sleep(0.1)
+    finally:
+        await monitor.stop()
+
+    assert REGISTRY.get_sample_value("worker_event_loop_stalls_total") - stalls == 2
+    logged = [record.getMessage() for record in caplog.records if "Event loop blocked" in record.getMessage()]
+    assert len(logged) == 1
+    assert "blocking_render" in logged[0]
+    assert REGISTRY.get_sample_value("worker_event_loop_lag_seconds_count") > 0
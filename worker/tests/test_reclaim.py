@@ -0,0 +1,59 @@
+import uuid
+import pytest
+from app.config import settings
+from app.database import redis_client
+from app import reclaim
+
+
+@pytest.mark.asyncio
+async def test_abandoned_messages_are_retried_then_dead_lettered(monkeypatch):
+    """
+    Messages a dead consumer left pending are retried; one that keeps failing goes to the dead-letter
+    stream once it has been delivered more than MAX_DELIVERY_ATTEMPTS times. Without delivery counts
+    nothing is retried (a poison message would otherwise loop forever).
+    """
+    monkeypatch.setattr(settings, "RECLAIM_MIN_IDLE_MS", 0)
+    monkeypatch.setattr(settings, "MAX_DELIVERY_ATTEMPTS", 3)
+    await redis_client.connect()
+    client = redis_client.client
+
+    run_id = uuid.uuid4().hex[:8]
+    stream, group = f"test_reclaim:{run_id}", "test_processors"
+    await redis_client.create_consumer_group(stream, group, start_id="0")
+    good_id = await client.xadd(stream, {"kind": "good"})
+    poison_id = await client.xadd(stream, {"kind": "poison"})
+    # Delivered once to a consumer that died before acknowledging
+    await client.xreadgroup(group, "dead-consumer", {stream: ">"}, count=10)
+
+    processed = []
+
+    async def process(message_id, message_data):
+        processed.append(message_id)
+        return message_data["kind"] == "good"
+
+    try:
+        with monkeypatch.context() as patch:
+            async def unreadable(*args, **kwargs):
+                return None
+            patch.setattr(redis_client, "get_delivery_counts", unreadable)
+            assert await reclaim.reclaim_once(stream, group, process) == 0
+            assert processed == []
+
+        # Third delivery each (the skipped sweep claimed them too): both retried, the good one acknowledged
+        assert await reclaim.reclaim_once(stream, group, process) == 2
+        assert sorted(processed) == sorted([good_id, poison_id])
+        pending = await client.xpending_range(stream, group, min="-", max="+", count=10)
+        assert [entry["message_id"] for entry in pending] == [poison_id]
+
+        # Fourth delivery: the poison message is dead-lettered, not retried
+        processed.clear()
+        assert await reclaim.reclaim_once(stream, group, process) == 0
+        assert processed == []
+        assert (await client.xpending(stream, group))["pending"] == 0
+        [(_, dead)] = await client.xrange(reclaim.dead_letter_stream(stream))
+        assert dead["kind"] == "poison"
+        assert dead["dlq_source_id"] == poison_id
+        assert int(dead["dlq_deliveries"]) > settings.MAX_DELIVERY_ATTEMPTS
+    finally:
+        await client.delete(stream, reclaim.dead_letter_stream(stream))
+        await redis_client.disconnect()
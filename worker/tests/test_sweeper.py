@@ -0,0 +1,102 @@
+import time
+import uuid
+import pytest
+from app.config import settings
+from app.database import redis_client
+from redis.exceptions import ResponseError
+from app import bloom, sweeper
+
+
+@pytest.mark.asyncio
+async def test_expired_link_is_swept_completely(monkeypatch, tmp_path):
+    """
+    Every key and the QR image of an expired link are removed; a live link is left alone.
+    """
+    monkeypatch.setattr(settings, "MEDIA_PATH", str(tmp_path))
+    monkeypatch.setattr(settings, "LINK_EXPIRY_ZSET", f"test_links:expiry:{uuid.uuid4().hex[:8]}")
+    await redis_client.connect()
+    client = redis_client.client
+
+    run_id = uuid.uuid4().hex[:8]
+    expired_id, live_id = f"e{run_id}", f"l{run_id}"
+    now = int(time.time())
+    created_at, expires_at = now - 3 * 86400, now - 60
+
+    keys = sweeper.link_keys(expired_id, created_at, expires_at, now)
+    await client.hset(f"data:{expired_id}", mapping={"total_clicks": 5, "created_at": created_at, "expires_at": expires_at})
+    await client.pfadd(f"uv:{expired_id}", "1.1.1.1")
+    day_key = next(key for key in keys if ":d:" in key)
+    await client.pfadd(day_key, "1.1.1.1")
+    await client.hset(next(key for key in keys if key.startswith("bd:")), "direct", 5)
+    await client.zadd("leaderboard:top_links", {expired_id: 5, live_id: 3})
+    await client.zadd(settings.LINK_EXPIRY_ZSET, {expired_id: expires_at, live_id: now + 3600})
+    await client.set(f"link:{live_id}", "https://example.com", ex=3600)
+    (tmp_path / f"{expired_id}.png").write_bytes(b"\x89PNG" + b"0" * 100)
+
+    try:
+        swept, redis_bytes, file_bytes = await sweeper.sweep_once()
+
+        assert swept == 1
+        assert redis_bytes > 0 and file_bytes == 104
+        assert await client.exists(*keys) == 0
+        assert not (tmp_path / f"{expired_id}.png").exists()
+        assert await client.zscore("leaderboard:top_links", expired_id) is None
+        assert await client.zscore("leaderboard:top_links", live_id) == 3
+        assert await client.zrange(settings.LINK_EXPIRY_ZSET, 0, -1) == [live_id]
+    finally:
+        await client.delete(settings.LINK_EXPIRY_ZSET, f"link:{live_id}")
+        await client.zrem("leaderboard:top_links", live_id)
+        await redis_client.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_bloom_rebuild_drops_expired_links(monkeypatch):
+    """
+    The rebuilt filter holds the live links (in either storage layout), not the removed ones,
+    and links added while the rebuild runs are kept.
+    """
+    run_id = uuid.uuid4().hex[:8]
+    monkeypatch.setattr(settings, "BLOOM_FILTER_KEY", f"test_bf:{run_id}")
+    monkeypatch.setattr(settings, "BLOOM_CAPACITY", 1000)
+    await redis_client.connect()
+    client = redis_client.client
+
+    async def create_link(short_id):
+        # The inserts core-api's create_short_link makes (core-api/app/bloom.py)
+        await client.execute_command("BF.INSERT", settings.BLOOM_FILTER_KEY, "ITEMS", short_id)
+        try:
+            await client.execute_command(
+                "BF.INSERT", f"{settings.BLOOM_FILTER_KEY}{bloom.REBUILD_TARGET_SUFFIX}", "NOCREATE", "ITEMS", short_id
+            )
+        except ResponseError:
+            pass
+
+    live_id, gone_id, late_id = f"l{run_id}", f"g{run_id}", f"n{run_id}"
+    await client.set(f"link:{live_id}", "https://example.com")
+    # Bucketed layout: lb:{id prefix} -> {rest of id: url}
+    bucket_prefix = f"b{run_id}"
+    await client.hset(f"{bloom.BUCKET_KEY_PREFIX}:{bucket_prefix}", "x", "https://example.com")
+    for short_id in (live_id, gone_id):
+        await create_link(short_id)
+
+    scan_keys = redis_client.scan_keys
+
+    async def scan_with_concurrent_create(match, count=1000):
+        # A link is created (and added to the filter) in the middle of the rebuild
+        await create_link(late_id)
+        async for key in scan_keys(match, count):
+            yield key
+
+    monkeypatch.setattr(redis_client, "scan_keys", scan_with_concurrent_create)
+    try:
+        assert await bloom.rebuild_bloom_filter() >= 1
+
+        bf = client.bf()
+        assert await bf.exists(settings.BLOOM_FILTER_KEY, live_id)
+        assert await bf.exists(settings.BLOOM_FILTER_KEY, f"{bucket_prefix}x")
+        assert await bf.exists(settings.BLOOM_FILTER_KEY, late_id)
+        assert not await bf.exists(settings.BLOOM_FILTER_KEY, gone_id)
+        assert not await client.exists(f"{settings.BLOOM_FILTER_KEY}{bloom.REBUILD_MARKER_SUFFIX}")
+    finally:
+        await client.delete(f"link:{live_id}", f"{bloom.BUCKET_KEY_PREFIX}:{bucket_prefix}", settings.BLOOM_FILTER_KEY)
+        await redis_client.disconnect()
@@ -0,0 +1,40 @@
+import base64
+import uuid
+import zlib
+import pytest
+import zstandard
+from app.database import redis_client
+from app.config import settings
+from app import url_codec
+
+URL = "https://shop.example.com/p/1?utm_source=news&utm_medium=email&utm_campaign=spring" + "&ref=affiliate" * 40
+
+
+@pytest.mark.asyncio
+async def test_plain_and_compressed_urls_are_decoded(monkeypatch):
+    """Values written by core-api: plain, raw deflate, and zstd with a dictionary kept in Redis."""
+    monkeypatch.setattr(settings, "LINK_COMPRESSION_DICTS_KEY", f"test_dicts:{uuid.uuid4().hex[:8]}")
+    await redis_client.connect()
+    client = redis_client.client
+
+    dictionary = zstandard.train_dictionary(
+        4096, [URL.replace("p/1", f"p/{i}").encode() + f"&gclid={i * 7919:x}".encode() for i in range(500)]
+    )
+    await client.hset(settings.LINK_COMPRESSION_DICTS_KEY, str(dictionary.dict_id()),
+                      base64.b64encode(dictionary.as_bytes()).decode())
+    try:
+        assert await url_codec.decode_url(URL) == URL
+
+        deflate = zlib.compressobj(9, zlib.DEFLATED, -15)
+        payload = base64.b64encode(deflate.compress(URL.encode()) + deflate.flush()).decode()
+        assert await url_codec.decode_url(f"~z0:{payload}") == URL
+
+        compressed = zstandard.ZstdCompressor(dict_data=dictionary, write_dict_id=False).compress(URL.encode())
+        value = f"~s{dictionary.dict_id()}:{base64.b64encode(compressed).decode()}"
+        assert await url_codec.decode_url(value) == URL
+
+        # A dictionary nobody stored: the job fails instead of rendering garbage
+        assert await url_codec.decode_url(f"~s1:{base64.b64encode(compressed).decode()}") is None
+    finally:
+        await client.delete(settings.LINK_COMPRESSION_DICTS_KEY)
+        await redis_client.disconnect()
@@ -0,0 +1,60 @@
+import asyncio
+import time
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+from app.config import settings
+from app.database import redis_client
+from app import lifecycle, listener, metrics
+from app.worker import Supervisor, _heartbeat_slots
+
+
+class AliveProcess:
+    pid = 1
+
+    def is_alive(self):
+        return True
+
+
+@pytest.mark.asyncio
+async def test_failing_reads_let_the_health_check_go_stale(monkeypatch):
+    """A consumer whose reads fail is reported unhealthy; it recovers with the first successful read."""
+    monkeypatch.setattr(settings, "STREAM_BLOCK_MS", 50)
+    await redis_client.connect()
+    stream_name, group_name = metrics.CONSUMED_STREAMS[0]
+
+    supervisor = Supervisor(1)
+    supervisor.children[0] = AliveProcess()
+    slots = _heartbeat_slots(0)
+    stale = time.time() - settings.WORKER_HEARTBEAT_TIMEOUT_SECONDS - 1
+    for slot in slots.values():
+        supervisor.heartbeats[slot] = stale
+
+    def beat(name, timestamp):
+        supervisor.heartbeats[slots[name]] = timestamp
+
+    monkeypatch.setattr(lifecycle, "heartbeat_hook", beat)
+
+    async def redis_down(*args, **kwargs):
+        raise RedisConnectionError("Connection refused")
+
+    async def processor(message_id, message_data):
+        return True
+
+    with monkeypatch.context() as patch:
+        patch.setattr(redis_client.client, "xreadgroup", redis_down)
+        consumer = asyncio.create_task(listener.consume_stream(stream_name, group_name, processor))
+        # Past the first failed read and its 1s back-off
+        await asyncio.sleep(1.5)
+        healthy, report = supervisor.liveness()
+        assert not healthy
+        assert report[0]["heartbeat_age_seconds"][stream_name] > settings.WORKER_HEARTBEAT_TIMEOUT_SECONDS
+
+    try:
+        # The read in flight fails (1s back-off), the next one succeeds
+        await asyncio.sleep(1.3)
+        assert supervisor.heartbeats[slots[stream_name]] > stale + settings.WORKER_HEARTBEAT_TIMEOUT_SECONDS
+    finally:
+        lifecycle.shutdown_event.set()
+        await consumer
+        lifecycle.shutdown_event.clear()
+        await redis_client.disconnect()